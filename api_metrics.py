@@ -0,0 +1,121 @@
+import bisect
+import json
+import threading
+import time
+
+# Mốc (giây) của histogram độ trễ, gần với mặc định của Prometheus
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _label_key(labels):
+    return tuple(sorted((labels or {}).items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """Counter và histogram theo nhãn, an toàn đa luồng; xuất ra JSON hoặc dạng text của Prometheus"""
+
+    def __init__(self, prefix="youtube"):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._counters = {}  # name -> {label_key: value}
+        self._histograms = {}  # name -> {label_key: Histogram}
+        self._help = {}
+        self.started = time.time()
+
+    def describe(self, name, text):
+        self._help[name] = text
+
+    def inc(self, name, labels=None, value=1):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name, value, labels=None):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram()
+            histogram.observe(value)
+
+    def counter(self, name, labels=None):
+        with self._lock:
+            return self._counters.get(name, {}).get(_label_key(labels), 0)
+
+    def snapshot(self):
+        """Dict có thể ghi ra JSON: counters, histogram (count/sum/buckets) theo từng bộ nhãn"""
+        with self._lock:
+            counters = {
+                name: [{"labels": dict(key), "value": value} for key, value in series.items()]
+                for name, series in self._counters.items()
+            }
+            histograms = {
+                name: [
+                    {
+                        "labels": dict(key),
+                        "count": h.count,
+                        "sum": round(h.sum, 6),
+                        "buckets": {str(le): c for le, c in zip(LATENCY_BUCKETS + ("+Inf",), h.counts)},
+                    }
+                    for key, h in series.items()
+                ]
+                for name, series in self._histograms.items()
+            }
+        return {"started": self.started, "time": time.time(), "counters": counters, "histograms": histograms}
+
+    def to_json(self, indent=2):
+        return json.dumps(self.snapshot(), ensure_ascii=False, indent=indent)
+
+    def to_prometheus(self):
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                full = f"{self.prefix}_{name}"
+                if name in self._help:
+                    lines.append(f"# HELP {full} {self._help[name]}")
+                lines.append(f"# TYPE {full} counter")
+                for key, value in series.items():
+                    lines.append(f"{full}{_format_labels(key)} {value}")
+            for name, series in sorted(self._histograms.items()):
+                full = f"{self.prefix}_{name}"
+                if name in self._help:
+                    lines.append(f"# HELP {full} {self._help[name]}")
+                lines.append(f"# TYPE {full} histogram")
+                for key, h in series.items():
+                    cumulative = 0
+                    for le, count in zip(LATENCY_BUCKETS + ("+Inf",), h.counts):
+                        cumulative += count
+                        lines.append(f"{full}_bucket{_format_labels(key, [('le', le)])} {cumulative}")
+                    lines.append(f"{full}_sum{_format_labels(key)} {h.sum:.6f}")
+                    lines.append(f"{full}_count{_format_labels(key)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Ghi ra file: .prom/.txt dạng Prometheus, còn lại là JSON"""
+        text = self.to_prometheus() if path.endswith((".prom", ".txt")) else self.to_json()
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
@@ -0,0 +1,323 @@
+import hashlib
+import logging
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+logger = logging.getLogger(__name__)
+
+# Chi phí quota (đơn vị) của từng lệnh YouTube Data API v3, theo methodId của googleapiclient
+UNIT_COSTS = {
+    "youtube.channels.list": 1,
+    "youtube.playlistItems.list": 1,
+    "youtube.videos.list": 1,
+    "youtube.playlists.list": 1,
+    "youtube.search.list": 100,
+}
+DEFAULT_COST = 1
+
+# Lý do lỗi (error.errors[].reason) khiến lệnh được chuyển sang key khác
+QUOTA_REASONS = ("quotaExceeded", "dailyLimitExceeded")
+RATE_LIMIT_REASONS = ("rateLimitExceeded", "userRateLimitExceeded")
+KEY_ROTATION_REASONS = QUOTA_REASONS + RATE_LIMIT_REASONS
+RATE_LIMIT_COOLDOWN = 60  # giây, nhân đôi sau mỗi lần bị giới hạn liên tiếp
+MAX_RATE_LIMIT_COOLDOWN = 900
+
+try:
+    from zoneinfo import ZoneInfo
+
+    # Quota ngày của YouTube được đặt lại lúc 0h giờ Thái Bình Dương
+    QUOTA_TZ = ZoneInfo("America/Los_Angeles")
+except Exception:
+    QUOTA_TZ = timezone(timedelta(hours=-8))  # Windows không có tzdata
+
+
+class QuotaExceeded(Exception):
+    pass
+
+
+def quota_day(now=None):
+    return datetime.fromtimestamp(now or time.time(), QUOTA_TZ).strftime("%Y-%m-%d")
+
+
+def next_quota_reset(now=None):
+    """Epoch của lần đặt lại quota tiếp theo (0h giờ Thái Bình Dương)"""
+    current = datetime.fromtimestamp(now or time.time(), QUOTA_TZ)
+    midnight = current.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+    return midnight.timestamp()
+
+
+def key_id(api_key):
+    # Định danh ngắn để ghi log/lưu trạng thái mà không lộ API key
+    return hashlib.sha1(api_key.encode("utf-8")).hexdigest()[:8]
+
+
+class RateLimiter:
+    """Token bucket dùng chung cho mọi luồng gọi API: tối đa rate lệnh/giây, cho phép dồn burst lệnh"""
+
+    def __init__(self, rate=10.0, burst=10):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.rate:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class QuotaBudget:
+    """Ngân sách quota theo ngày, chia sẻ giữa các luồng và lưu lại qua các lần chạy (bảng state của CacheStore).
+
+    charge() được gọi trước mỗi lệnh API; vượt ngân sách thì ném QuotaExceeded thay vì để server trả 403.
+    Số đã dùng chỉ được đếm trong bộ nhớ; KeyPool.flush() lấy pending_state() để ghi xuống đĩa.
+    """
+
+    def __init__(self, daily_limit=10000, store=None, name=None):
+        self.daily_limit = daily_limit
+        self.store = store
+        self.name = name  # Phân biệt ngân sách của từng API key trong store
+        self._lock = threading.Lock()
+        self._day = None
+        self._dirty = False  # used đã đổi từ lần flush trước
+        self.used = 0
+
+    def _key(self):
+        return f"quota_{self.name}" if self.name else "quota"
+
+    def _roll_day(self):
+        day = quota_day()
+        if day == self._day:
+            return
+        self._day = day
+        self.used = 0
+        self._dirty = False
+        if self.store is not None:
+            try:
+                data = self.store.get_state(self._key())
+                if data and data.get("day") == day:
+                    self.used = data["used"]
+            except Exception as e:
+                logger.error(f"Lỗi khi đọc quota đã dùng: {str(e)}")
+
+    def cost(self, method_id):
+        return UNIT_COSTS.get(method_id, DEFAULT_COST)
+
+    def charge(self, method_id):
+        cost = self.cost(method_id)
+        with self._lock:
+            self._roll_day()
+            if self.daily_limit and self.used + cost > self.daily_limit:
+                raise QuotaExceeded(
+                    f"Hết quota ngày {self._day}: đã dùng {self.used}/{self.daily_limit}, {method_id} cần {cost}"
+                )
+            self.used += cost
+            self._dirty = True
+        return cost
+
+    def pending_state(self):
+        """(key, value) cần ghi xuống store nếu used đã đổi từ lần lấy trước, ngược lại None"""
+        with self._lock:
+            if self.store is None or not self._dirty:
+                return None
+            self._dirty = False
+            return self._key(), {"day": self._day, "used": self.used}
+
+    def mark_dirty(self):
+        with self._lock:
+            self._dirty = True
+
+    def remaining(self):
+        with self._lock:
+            self._roll_day()
+            return max(0, self.daily_limit - self.used) if self.daily_limit else None
+
+    def used_today(self):
+        with self._lock:
+            self._roll_day()
+            return self.used
+
+
+class ApiKey:
+    __slots__ = ("key", "id", "budget", "limiter", "in_flight", "cooldown_until", "reason", "strikes")
+
+    def __init__(self, key, budget, limiter):
+        self.key = key
+        self.id = key_id(key)
+        self.budget = budget
+        self.limiter = limiter
+        self.in_flight = 0
+        self.cooldown_until = 0.0
+        self.reason = None
+        self.strikes = 0
+
+
+class KeyPool:
+    """Nhiều API key (mỗi key một project) dùng chung cho mọi luồng.
+
+    Mỗi key có ngân sách quota ngày và rate limiter riêng. acquire() chọn key đang ít lệnh chạy nhất
+    (hòa thì key còn nhiều quota hơn), nên các luồng song song được rải đều trên các key. Key bị server
+    báo hết quota được nghỉ tới lần đặt lại quota, key bị giới hạn tốc độ nghỉ ngắn; trạng thái nghỉ được
+    lưu trong store để lần chạy sau không gọi lại key đã hết quota. Có cùng giao diện used/remaining()/
+    daily_limit như QuotaBudget (tính trên cả pool).
+
+    Quota đã dùng được ghi xuống store tối đa mỗi flush_interval giây (ngoài lock của pool) và khi gọi
+    flush(), nên các luồng fetch không phải chờ nhau ghi đĩa ở mỗi lệnh API.
+    """
+
+    def __init__(self, keys, daily_limit=10000, store=None, rate=10.0, flush_interval=5.0):
+        keys = list(dict.fromkeys(k for k in keys if k))
+        if not keys:
+            raise ValueError("Cần ít nhất một YouTube API key")
+        self.per_key_limit = daily_limit
+        self.store = store
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self.keys = [
+            ApiKey(k, QuotaBudget(daily_limit, store, name=key_id(k)), RateLimiter(rate, burst=max(1, int(rate))))
+            for k in keys
+        ]
+        self._load_cooldowns()
+
+    def _cooldown_key(self, api_key):
+        return f"key_cooldown_{api_key.id}"
+
+    def _load_cooldowns(self):
+        if self.store is None:
+            return
+        for api_key in self.keys:
+            try:
+                data = self.store.get_state(self._cooldown_key(api_key))
+            except Exception as e:
+                logger.error(f"Lỗi khi đọc trạng thái key {api_key.id}: {str(e)}")
+                continue
+            if data and data.get("until", 0) > time.time():
+                api_key.cooldown_until = data["until"]
+                api_key.reason = data.get("reason")
+                logger.info(f"Key {api_key.id} đang nghỉ ({api_key.reason}) tới {time.ctime(api_key.cooldown_until)}")
+
+    @property
+    def daily_limit(self):
+        return self.per_key_limit * len(self.keys)
+
+    @property
+    def used(self):
+        return sum(api_key.budget.used_today() for api_key in self.keys)
+
+    def remaining(self):
+        """Quota còn lại của các key không bị nghỉ; None nếu không giới hạn"""
+        if not self.per_key_limit:
+            return None if self._available() else 0
+        return sum(api_key.budget.remaining() for api_key in self._available())
+
+    def _available(self, now=None):
+        now = now or time.time()
+        return [api_key for api_key in self.keys if api_key.cooldown_until <= now]
+
+    def acquire(self, method_id, max_wait=MAX_RATE_LIMIT_COOLDOWN):
+        """Chọn key cho một lệnh, trừ quota của key đó và chờ rate limiter của nó; trả về (ApiKey, cost).
+
+        Nếu mọi key đang nghỉ vì giới hạn tốc độ thì chờ key nghỉ ngắn nhất (tối đa max_wait giây);
+        ném QuotaExceeded khi không còn key nào dùng được trong ngày.
+        """
+        cost = UNIT_COSTS.get(method_id, DEFAULT_COST)
+        while True:
+            with self._lock:
+                now = time.time()
+                candidates = sorted(
+                    self._available(now),
+                    key=lambda k: (k.in_flight, -(k.budget.remaining() if self.per_key_limit else 0)),
+                )
+                for api_key in candidates:
+                    try:
+                        api_key.budget.charge(method_id)
+                    except QuotaExceeded:
+                        continue
+                    api_key.in_flight += 1
+                    break
+                else:
+                    api_key = None
+                    resume_at = min((k.cooldown_until for k in self.keys
+                                     if k.reason in RATE_LIMIT_REASONS and k.cooldown_until > now), default=None)
+            if api_key is not None:
+                api_key.limiter.acquire()
+                return api_key, cost
+            if resume_at is None or resume_at - now > max_wait:
+                raise QuotaExceeded(
+                    f"Hết quota ngày {quota_day()} trên cả {len(self.keys)} API key "
+                    f"(đã dùng {self.used}/{self.daily_limit}), {method_id} cần {cost}"
+                )
+            time.sleep(max(0.05, resume_at - now))
+
+    def release(self, api_key, ok=True):
+        with self._lock:
+            api_key.in_flight -= 1
+            if ok:
+                api_key.strikes = 0
+        if self.store is not None and time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush(wait=False)
+
+    def flush(self, wait=True):
+        """Ghi quota đã dùng của mọi key xuống store trong một transaction; wait=False bỏ qua nếu luồng khác đang ghi"""
+        if self.store is None or not self._flush_lock.acquire(blocking=wait):
+            return
+        try:
+            self._last_flush = time.monotonic()
+            pending = [(api_key, api_key.budget.pending_state()) for api_key in self.keys]
+            pending = [(api_key, item) for api_key, item in pending if item]
+            if not pending:
+                return
+            try:
+                self.store.set_states([item for _, item in pending])
+            except Exception as e:
+                for api_key, _ in pending:
+                    api_key.budget.mark_dirty()
+                logger.error(f"Lỗi khi lưu quota đã dùng: {str(e)}")
+        finally:
+            self._flush_lock.release()
+
+    def penalize(self, api_key, reason):
+        """Cho key nghỉ sau khi server trả quotaExceeded/rateLimitExceeded; lưu lại qua các lần chạy"""
+        now = time.time()
+        with self._lock:
+            if reason in QUOTA_REASONS:
+                until = next_quota_reset(now)
+            else:
+                until = now + min(RATE_LIMIT_COOLDOWN * 2 ** api_key.strikes, MAX_RATE_LIMIT_COOLDOWN)
+                api_key.strikes += 1
+            if until <= api_key.cooldown_until:
+                return
+            api_key.cooldown_until = until
+            api_key.reason = reason
+        logger.warning(f"Key {api_key.id} tạm nghỉ tới {time.ctime(until)} do {reason}")
+        if self.store is not None:
+            try:
+                self.store.set_states([(self._cooldown_key(api_key), {"until": until, "reason": reason})])
+            except Exception as e:
+                logger.error(f"Lỗi khi lưu trạng thái key {api_key.id}: {str(e)}")
+
+    def status(self):
+        now = time.time()
+        return [
+            {
+                "key": api_key.id,
+                "used": api_key.budget.used_today(),
+                "in_flight": api_key.in_flight,
+                "cooldown_until": api_key.cooldown_until if api_key.cooldown_until > now else None,
+                "reason": api_key.reason if api_key.cooldown_until > now else None,
+            }
+            for api_key in self.keys
+        ]
@@ -0,0 +1,155 @@
+"""Benchmark đường fetch của YouTubeAPIWrapper trên API giả (fake_youtube), không tốn quota thật.
+
+    python benchmarks/fetch.py                       # kênh 10k video, không độ trễ
+    python benchmarks/fetch.py --videos 2000 --latency 0.08 --jitter 0.03 --error-rate 0.01
+    python benchmarks/fetch.py --json bench.json
+
+Các kịch bản chạy nối tiếp trên cùng một file cache:
+    cold        cache trống: tải toàn bộ playlist và viewCount
+    warm        chạy lại ngay: mọi thứ lấy từ cache
+    revalidate  cache đã hết hạn, kênh không đổi: trang đầu trả 304
+    refresh     cache đã hết hạn, kênh có video mới: chỉ tải phần mới, viewCount tải lại
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_youtube import FakeYouTube  # noqa: E402
+from youtube_api import YouTubeAPIWrapper  # noqa: E402
+
+SCENARIOS = ("cold", "warm", "revalidate", "refresh")
+
+
+def _process_io():
+    # Số byte đọc/ghi qua syscall của cả tiến trình (Linux); None nếu không hỗ trợ
+    try:
+        with open("/proc/self/io", "r") as f:
+            values = dict(line.split(": ") for line in f.read().splitlines())
+        return int(values["rchar"]), int(values["wchar"])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def _cache_files_size(cache_path):
+    return sum(os.path.getsize(p) for p in (cache_path, cache_path + "-wal") if os.path.exists(p))
+
+
+def _age_cache(cache_path, seconds):
+    """Lùi timestamp mọi entry để mô phỏng cache đã hết hạn (giữ nguyên dữ liệu và ETag)"""
+    conn = sqlite3.connect(cache_path)
+    with conn:
+        conn.execute("UPDATE cache SET timestamp = timestamp - ?", (seconds,))
+    conn.close()
+
+
+def run_scenario(name, api, fake, channel_id, measure_memory):
+    fake.reset_stats()
+    io_before = _process_io()
+    if measure_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    items = api.fetch_all_videos(channel_id)
+    listed = time.perf_counter()
+    stats = api.get_video_stats([item["videoId"] for item in items])
+    finished = time.perf_counter()
+    peak = None
+    if measure_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    io_after = _process_io()
+    server = fake.stats()
+    return {
+        "scenario": name,
+        "videos": len(items),
+        "view_counts": len(stats),
+        "wall_s": round(finished - started, 3),
+        "list_s": round(listed - started, 3),
+        "stats_s": round(finished - listed, 3),
+        "api_requests": server["requests"],
+        "round_trips": server["round_trips"],
+        "response_bytes": server["response_bytes"],
+        "api_by_endpoint": server["by_endpoint"],
+        "cache_read_bytes": io_after[0] - io_before[0] if io_before and io_after else None,
+        "cache_write_bytes": io_after[1] - io_before[1] if io_before and io_after else None,
+        "cache_file_bytes": _cache_files_size(api.cache.db_path),
+        "peak_memory_bytes": peak,
+    }
+
+
+def run(args):
+    workdir = tempfile.mkdtemp(prefix="ytfetch-bench-")
+    cache_path = os.path.join(workdir, "youtube_cache.db")
+    try:
+        fake = FakeYouTube(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                           daily_quota=args.quota, seed=args.seed)
+        channel_id = fake.add_channel(args.videos)
+        keys = [f"fake-key-{i}" for i in range(max(1, args.keys))]
+        api = YouTubeAPIWrapper(keys, daily_quota=args.quota or 0, requests_per_second=args.qps,
+                                client=fake, cache_path=cache_path, legacy_cache_json=None)
+        results = []
+        for name in SCENARIOS:
+            if name in ("revalidate", "refresh"):
+                # Quá TTL của danh sách (24h) và viewCount (1h), chưa tới lần đồng bộ toàn bộ định kỳ (7 ngày)
+                _age_cache(cache_path, 2 * 86400)
+            if name == "refresh":
+                fake.upload(channel_id, args.new_videos)
+            result = run_scenario(name, api, fake, channel_id, not args.no_memory)
+            results.append(result)
+            print(_format_row(result), file=sys.stderr)
+        api.close()
+        return {
+            "config": {k: getattr(args, k) for k in ("videos", "new_videos", "latency", "jitter", "error_rate",
+                                                     "quota", "keys", "qps", "seed")},
+            "python": sys.version.split()[0],
+            "results": results,
+            "metrics": api.get_metrics()["counters"],
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _format_row(r):
+    mb = 1024 * 1024
+    io = (f"đọc {r['cache_read_bytes'] / mb:.1f}MB ghi {r['cache_write_bytes'] / mb:.1f}MB"
+          if r["cache_read_bytes"] is not None else "I/O: n/a")
+    memory = f"peak {r['peak_memory_bytes'] / mb:.1f}MB" if r["peak_memory_bytes"] is not None else ""
+    return (f"{r['scenario']:<10} {r['wall_s']:>7.2f}s  {r['api_requests']:>5} request ({r['round_trips']} HTTP, {r['response_bytes'] / mb:.1f}MB)  "
+            f"{r['videos']} video  {io}  cache {r['cache_file_bytes'] / mb:.1f}MB  {memory}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark đường fetch trên YouTube API giả")
+    parser.add_argument("--videos", type=int, default=10000, help="Số video của kênh giả")
+    parser.add_argument("--new-videos", type=int, default=20, help="Số video mới cho kịch bản refresh")
+    parser.add_argument("--latency", type=float, default=0.0, help="Độ trễ mỗi request (giây)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Dao động độ trễ (± giây)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Tỉ lệ lỗi 503 ngẫu nhiên")
+    parser.add_argument("--quota", type=int, default=None, help="Quota ngày của mỗi key (mặc định không giới hạn)")
+    parser.add_argument("--keys", type=int, default=1, help="Số API key trong pool")
+    parser.add_argument("--qps", type=float, default=0, help="Giới hạn request/giây của wrapper (0 = không giới hạn)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-memory", action="store_true", help="Không đo bộ nhớ (tracemalloc làm chậm)")
+    parser.add_argument("--json", help="Ghi kết quả ra file JSON")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    report = run(args)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Đo thời gian khởi động của ứng dụng.
+
+    python benchmarks/startup.py            # mở cửa sổ N lần, đo lúc cửa sổ hiện và lúc sẵn sàng
+    python benchmarks/startup.py --imports  # chỉ đo thời gian import main (chạy được khi không có màn hình)
+    python benchmarks/startup.py --exe dist/main.exe
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORT_PROBE = (
+    "import time; t = time.perf_counter(); import main; "
+    "import json, sys; print(json.dumps({'import_ms': (time.perf_counter() - t) * 1000, "
+    "'heavy': sorted(m for m in ('yt_dlp', 'PIL', 'requests', 'googleapiclient.discovery', 'httplib2', 'dotenv') "
+    "if m in sys.modules)}))"
+)
+
+
+def run_once(cmd):
+    proc = subprocess.run(cmd, cwd=ROOT, capture_output=True, text=True, timeout=120)
+    for line in reversed(proc.stdout.splitlines()):
+        if line.startswith("{"):
+            return json.loads(line)
+    raise Exception(f"Không đọc được kết quả ({proc.returncode}): {proc.stderr.strip()[-500:]}")
+
+
+def summarize(samples, key):
+    values = [s[key] for s in samples if key in s]
+    if not values:
+        return None
+    return {"median": round(statistics.median(values), 1), "min": round(min(values), 1), "max": round(max(values), 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Đo thời gian khởi động")
+    parser.add_argument("-n", "--runs", type=int, default=5, help="Số lần chạy")
+    parser.add_argument("--imports", action="store_true", help="Chỉ đo thời gian import, không mở cửa sổ")
+    parser.add_argument("--exe", help="Đo bản .exe đã đóng gói thay vì main.py")
+    args = parser.parse_args()
+
+    if args.imports:
+        cmd = [sys.executable, "-c", IMPORT_PROBE]
+        keys = ("import_ms",)
+    else:
+        cmd = [args.exe] if args.exe else [sys.executable, "main.py"]
+        cmd.append("--benchmark-startup")
+        keys = ("window_ms", "ready_ms")
+
+    samples = [run_once(cmd) for _ in range(args.runs)]
+    result = {key: summarize(samples, key) for key in keys}
+    if args.imports:
+        result["heavy_modules_loaded"] = samples[-1].get("heavy", [])
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class CacheStore:
+    """Cache key/value lưu trong SQLite: đọc/ghi theo từng key, TTL và giới hạn dung lượng (LRU)"""
+
+    def __init__(self, db_path, ttl=86400, max_bytes=200 * 1024 * 1024, legacy_json=None, on_evict=None):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.on_evict = on_evict  # on_evict(key) được gọi cho mỗi entry bị xóa do LRU
+        self._lock = threading.RLock()
+        # Một kết nối dùng chung cho luồng GUI, luồng fetch và các luồng tải, bảo vệ bằng lock
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, data TEXT NOT NULL, etag TEXT, "
+            "timestamp REAL NOT NULL, ttl REAL, accessed REAL NOT NULL, size INTEGER NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_accessed ON cache(accessed)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        # Trạng thái cần giữ (quota đã dùng, key đang nghỉ): không có TTL và không bị LRU xóa
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT NOT NULL, updated REAL NOT NULL)"
+        )
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+        if legacy_json:
+            self._migrate_json(legacy_json)
+
+    def _is_fresh(self, timestamp, ttl):
+        return time.time() - timestamp < (self.ttl if ttl is None else ttl)
+
+    def get_entry(self, key):
+        """Trả về dict {data, etag, timestamp, fresh, size} kể cả khi đã hết hạn, hoặc None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data, etag, timestamp, ttl, size FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE cache SET accessed = ? WHERE key = ?", (time.time(), key))
+        data, etag, timestamp, ttl, size = row
+        return {
+            "data": json.loads(data),
+            "etag": etag,
+            "timestamp": timestamp,
+            "fresh": self._is_fresh(timestamp, ttl),
+            "size": size,
+        }
+
+    def get(self, key):
+        entry = self.get_entry(key)
+        if entry is None or not entry["fresh"]:
+            return None, None
+        return entry["data"], entry["etag"]
+
+    def get_entries(self, keys):
+        """Đọc nhiều key trong ít truy vấn; trả về dict key -> entry (chỉ các key có trong cache)"""
+        result = {}
+        rows = []
+        now = time.time()
+        with self._lock:
+            # Một transaction cho cả lượt đọc: cập nhật accessed của từng key không thành một commit WAL riêng
+            self._conn.execute("BEGIN")
+            try:
+                for i in range(0, len(keys), 500):
+                    chunk = keys[i:i + 500]
+                    placeholders = ",".join("?" * len(chunk))
+                    rows += self._conn.execute(
+                        f"SELECT key, data, etag, timestamp, ttl, size FROM cache WHERE key IN ({placeholders})",
+                        chunk,
+                    ).fetchall()
+                    self._conn.execute(
+                        f"UPDATE cache SET accessed = ? WHERE key IN ({placeholders})", (now, *chunk)
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        for key, data, etag, timestamp, ttl, size in rows:
+            result[key] = {
+                "data": json.loads(data),
+                "etag": etag,
+                "timestamp": timestamp,
+                "fresh": self._is_fresh(timestamp, ttl),
+                "size": size,
+            }
+        return result
+
+    def set_many(self, items, ttl=None):
+        """Ghi nhiều (key, data, etag) trong một transaction"""
+        now = time.time()
+        rows = []
+        for key, data, etag in items:
+            payload = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+            rows.append((key, payload, etag, now, ttl, now, len(payload.encode("utf-8"))))
+        if not rows:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                for row in rows:
+                    old = self._conn.execute("SELECT size FROM cache WHERE key = ?", (row[0],)).fetchone()
+                    self._total_bytes -= old[0] if old else 0
+                    self._total_bytes += row[6]
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO cache (key, data, etag, timestamp, ttl, accessed, size) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+                raise
+            self._evict()
+
+    def set(self, key, data, etag=None, ttl=None, size=None):
+        payload = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+        if size is None:
+            size = len(payload.encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM cache WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, data, etag, timestamp, ttl, accessed, size) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, payload, etag, now, ttl, now, size),
+            )
+            self._total_bytes += size - (old[0] if old else 0)
+            self._evict()
+
+    def touch(self, key, etag=None):
+        """Gia hạn TTL cho entry (ví dụ khi server trả về 304 Not Modified)"""
+        now = time.time()
+        with self._lock:
+            if etag is None:
+                self._conn.execute(
+                    "UPDATE cache SET timestamp = ?, accessed = ? WHERE key = ?", (now, now, key)
+                )
+            else:
+                self._conn.execute(
+                    "UPDATE cache SET timestamp = ?, accessed = ?, etag = ? WHERE key = ?",
+                    (now, now, etag, key),
+                )
+
+    def update_data(self, key, data):
+        """Ghi lại dữ liệu của entry, giữ nguyên timestamp và ETag (ví dụ khi đổi định dạng lưu).
+
+        Trả về kích thước mới, hoặc None nếu key không có trong cache.
+        """
+        payload = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+        size = len(payload.encode("utf-8"))
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM cache WHERE key = ?", (key,)).fetchone()
+            if old is None:
+                return None
+            self._conn.execute("UPDATE cache SET data = ?, size = ? WHERE key = ?", (payload, size, key))
+            self._total_bytes += size - old[0]
+        return size
+
+    def get_state(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set_states(self, items):
+        """Ghi nhiều (key, value) vào bảng state trong một transaction"""
+        now = time.time()
+        rows = [(key, json.dumps(value, separators=(",", ":")), now) for key, value in items]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany("INSERT OR REPLACE INTO state (key, value, updated) VALUES (?, ?, ?)", rows)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def delete(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT size FROM cache WHERE key = ?", (key,)).fetchone()
+            if row:
+                self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                self._total_bytes -= row[0]
+
+    def _evict(self):
+        if not self.max_bytes or self._total_bytes <= self.max_bytes:
+            return
+        # Xóa các entry ít được truy cập gần đây nhất, xuống 90% giới hạn để không phải dọn liên tục
+        target = self.max_bytes * 0.9
+        rows = self._conn.execute("SELECT key, size FROM cache ORDER BY accessed ASC").fetchall()
+        evicted = []
+        for key, size in rows:
+            if self._total_bytes <= target:
+                break
+            evicted.append((key,))
+            self._total_bytes -= size
+        self._conn.executemany("DELETE FROM cache WHERE key = ?", evicted)
+        logger.info(f"Đã xóa {len(evicted)} entry cache cũ (LRU)")
+        if self.on_evict:
+            for (key,) in evicted:
+                try:
+                    self.on_evict(key)
+                except Exception as e:
+                    logger.error(f"Lỗi khi dọn entry cache {key}: {str(e)}")
+
+    def _migrate_json(self, json_path):
+        with self._lock:
+            done = self._conn.execute("SELECT value FROM meta WHERE key = 'migrated_json'").fetchone()
+            if done or not os.path.exists(json_path):
+                return
+            try:
+                with open(json_path, "r", encoding="utf-8") as f:
+                    legacy = json.load(f)
+                now = time.time()
+                rows = []
+                for key, entry in legacy.items():
+                    payload = json.dumps(entry.get("data"), ensure_ascii=False, separators=(",", ":"))
+                    rows.append((key, payload, entry.get("etag"), entry.get("timestamp", 0), None, now,
+                                 len(payload.encode("utf-8"))))
+                self._conn.execute("BEGIN")
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO cache (key, data, etag, timestamp, ttl, accessed, size) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+                self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated_json', ?)",
+                                   (json_path,))
+                self._conn.execute("COMMIT")
+                self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+                os.replace(json_path, json_path + ".migrated")
+                logger.info(f"Đã chuyển {len(rows)} entry từ {json_path} sang {self.db_path}")
+            except Exception as e:
+                if self._conn.in_transaction:
+                    self._conn.execute("ROLLBACK")
+                logger.error(f"Lỗi khi chuyển cache JSON cũ: {str(e)}")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,194 @@
+"""Chế độ dòng lệnh (không cần Tkinter/màn hình): lấy danh sách video và tải hàng loạt.
+
+Ví dụ:
+    python cli.py https://www.youtube.com/@handle -o downloads -m audio -j 4
+    python cli.py -f channels.txt --list-only > videos.jsonl
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+from download_core import DOWNLOAD_MODES
+from download_queue import DownloadQueue, run_job
+from download_scheduler import AdaptiveScheduler, parse_rate
+from history_store import HistoryStore
+from postprocess import PostProcessingStage
+from settings import get_data_path, load_api_keys
+from video_model import fetch_channel_batch
+from youtube_api import YouTubeAPIWrapper
+
+logger = logging.getLogger(__name__)
+
+# Mã thoát: 1 = có video tải lỗi, 2 = sai tham số (argparse), 3 = lỗi dừng cả lượt chạy, 130 = Ctrl+C
+EXIT_FATAL = 3
+
+
+class JsonEmitter:
+    """Ghi sự kiện dạng JSON Lines (mỗi dòng một object) ra stdout hoặc file, an toàn đa luồng"""
+
+    def __init__(self, stream, progress_interval=1.0):
+        self.stream = stream
+        self.progress_interval = progress_interval
+        self._lock = threading.Lock()
+        self._last_progress = {}
+
+    def emit(self, event, **fields):
+        line = json.dumps({"event": event, "time": time.time(), **fields}, ensure_ascii=False)
+        with self._lock:
+            self.stream.write(line + "\n")
+            self.stream.flush()
+
+    def progress(self, msg_type, url, *data):
+        if msg_type == "progress":
+            # Giới hạn tần suất: progress_hook của yt-dlp gọi sau mỗi chunk
+            now = time.monotonic()
+            if now - self._last_progress.get(url, 0) < self.progress_interval:
+                return
+            self._last_progress[url] = now
+            downloaded, total, speed, eta = data
+            self.emit("progress", url=url, downloaded_bytes=downloaded, total_bytes=total, speed=speed, eta=eta)
+        elif msg_type == "finished":
+            self.emit("finished", url=url)
+
+
+def read_inputs(urls, url_file):
+    inputs = list(urls)
+    if url_file:
+        with open(url_file, "r", encoding="utf-8") as f:
+            inputs += [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    return list(dict.fromkeys(inputs))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Tải video YouTube theo kênh/@handle/video không cần giao diện")
+    parser.add_argument("urls", nargs="*", help="URL kênh, @handle hoặc link video")
+    parser.add_argument("-f", "--file", help="File chứa danh sách URL, mỗi dòng một URL")
+    parser.add_argument("-o", "--output", default=os.getcwd(), help="Thư mục lưu video")
+    parser.add_argument("-m", "--mode", choices=DOWNLOAD_MODES, default="video+audio", help="Chế độ tải")
+    parser.add_argument("-j", "--workers", type=int, default=6, help="Số video tải song song tối đa")
+    parser.add_argument("--post-workers", type=int, help="Số tiến trình ffmpeg song song (mặc định: số lõi CPU)")
+    parser.add_argument("--limit-rate", help="Giới hạn băng thông tổng, ví dụ 5M hoặc 800K (byte/giây)")
+    parser.add_argument("--list-only", action="store_true", help="Chỉ liệt kê video, không tải")
+    parser.add_argument("--fetch-workers", type=int, default=8, help="Số kênh được lấy danh sách song song")
+    parser.add_argument("--quota", type=int, default=10000, help="Ngân sách quota API mỗi ngày của mỗi key (đơn vị)")
+    parser.add_argument("--qps", type=float, default=10.0, help="Số lệnh API tối đa mỗi giây của mỗi key")
+    parser.add_argument("--full-resync", action="store_true", help="Đồng bộ lại toàn bộ danh sách video của kênh")
+    parser.add_argument("--resume", action="store_true", help="Tải tiếp các job chưa xong trong hàng đợi")
+    parser.add_argument("--metrics", help="Ghi số liệu API ra file: .prom/.txt dạng Prometheus, còn lại JSON")
+    parser.add_argument("--events", help="Ghi sự kiện JSON Lines vào file thay vì stdout")
+    args = parser.parse_args(argv)
+    if not args.urls and not args.file and not args.resume:
+        parser.error("cần ít nhất một URL, --file hoặc --resume")
+    return args
+
+
+def run(args, emitter, cancel_event):
+    records = []
+    inputs = read_inputs(args.urls, args.file)
+    if inputs:
+        yt_api = YouTubeAPIWrapper(load_api_keys(), daily_quota=args.quota, requests_per_second=args.qps,
+                                   cache_path=get_data_path("youtube_cache.db"))
+        # Các kênh được lấy song song, dùng chung pool API key (rate limiter và ngân sách quota của từng key)
+        results = fetch_channel_batch(
+            yt_api, inputs, workers=max(1, args.fetch_workers), full_resync=args.full_resync,
+            on_progress=lambda source, state, detail: emitter.emit(
+                "channel_progress", input=source, state=state, detail=detail
+            ),
+        )
+        for url, found, error in results:
+            if error:
+                emitter.emit("fetch_error", input=url, error=error)
+                continue
+            emitter.emit("fetched", input=url, count=len(found))
+            records += found
+        emitter.emit("quota", used=yt_api.quota.used, remaining=yt_api.quota.remaining(), keys=yt_api.quota.status())
+        if args.metrics:
+            yt_api.export_metrics(args.metrics)
+        yt_api.close()
+
+    # Bỏ video trùng khi nhiều kênh/link trỏ tới cùng một video
+    records = list({record.video_id: record for record in records}.values())
+    for record in records:
+        emitter.emit("video", video_id=record.video_id, title=record.title, url=record.url,
+                     published_at=record.published_at, view_count=record.view_count)
+    if args.list_only:
+        return 0
+
+    output = os.path.abspath(args.output)
+    os.makedirs(output, exist_ok=True)
+    history = HistoryStore(
+        get_data_path("download_history.db"), legacy_json=get_data_path("download_history.json")
+    )
+    # Video đã tải ở cùng chế độ được bỏ qua ngay, không trích xuất hay tải gì
+    downloaded = history.downloaded([r.video_id for r in records], args.mode)
+    for record in records:
+        if record.video_id in downloaded:
+            emitter.emit("skipped", video_id=record.video_id, url=record.url, file_path=downloaded[record.video_id])
+    records = [r for r in records if r.video_id not in downloaded]
+
+    download_queue = DownloadQueue(get_data_path("download_queue.db"))
+    download_queue.clean_abandoned()
+    job_ids = [download_queue.add(r.url, args.mode, output, r.video_id, r.title) for r in records]
+    if args.resume:
+        job_ids += [job["job_id"] for job in download_queue.pending()]
+    jobs = [download_queue.get(job_id) for job_id in dict.fromkeys(job_ids)]
+
+    failed = 0
+    lock = threading.Lock()
+
+    def on_result(job, success, file_path, error):
+        nonlocal failed
+        with lock:
+            failed += not success
+        emitter.emit("result", job_id=job["job_id"], video_id=job["video_id"], url=job["url"],
+                     success=success, file_path=file_path, error=error)
+
+    post_stage = PostProcessingStage(args.post_workers)
+    scheduler = AdaptiveScheduler(
+        lambda job, extra_opts, progress: run_job(
+            download_queue, job, cancel_event, progress_callback=progress, extra_opts=extra_opts,
+            post_stage=post_stage, history=history,
+        ),
+        max_workers=max(1, args.workers),
+        bandwidth_limit=parse_rate(args.limit_rate),
+        cancel_event=cancel_event,
+        max_post_pending=2 * post_stage.workers,
+    )
+    try:
+        scheduler.run(jobs, progress_callback=emitter.progress, on_result=on_result)
+    finally:
+        post_stage.shutdown()
+    emitter.emit("summary", total=len(jobs), succeeded=len(jobs) - failed, failed=failed, skipped=len(downloaded),
+                 bytes=scheduler.total_bytes, final_workers=scheduler.concurrency,
+                 post_workers=post_stage.workers, stages=post_stage.timer.snapshot())
+    return 1 if failed else 0
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    stream = open(args.events, "a", encoding="utf-8") if args.events else sys.stdout
+    cancel_event = threading.Event()
+    emitter = JsonEmitter(stream)
+    try:
+        return run(args, emitter, cancel_event)
+    except KeyboardInterrupt:
+        # Dừng các luồng tải; job đang chạy giữ file .part cho lần --resume sau
+        cancel_event.set()
+        return 130
+    except Exception as e:
+        # Thiếu API key, hết quota, không mở được file DB...: báo bằng sự kiện JSON thay vì traceback lên stdout
+        cancel_event.set()
+        logger.exception(f"Lỗi khi chạy: {str(e)}")
+        emitter.emit("error", message=str(e))
+        return EXIT_FATAL
+    finally:
+        if stream is not sys.stdout:
+            stream.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
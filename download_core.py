@@ -0,0 +1,321 @@
+import copy
+import functools
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from postprocess import PostStep, run_post_step
+
+logger = logging.getLogger(__name__)
+
+DOWNLOAD_MODES = ("video+audio", "video", "audio")
+FINAL_OUTTMPL = "%(title)s.%(ext)s"
+# File gốc chờ ffmpeg xử lý mang mã định dạng để không trùng tên file kết quả
+RAW_OUTTMPL = "%(title)s.f%(format_id)s.%(ext)s"
+FINAL_EXTS = {"video+audio": "mp4", "audio": "mp3"}
+# Tùy chọn đổi theo từng job, được gán lại lên YoutubeDL dùng chung của luồng trước mỗi lần tải
+JOB_OPTION_KEYS = ("format", "ratelimit", "http_chunk_size", "concurrent_fragment_downloads")
+
+
+@functools.lru_cache(maxsize=None)
+def find_ffmpeg():
+    """Trả về đường dẫn ffmpeg nhúng cạnh ứng dụng (hoặc trong .exe), None nếu không có"""
+    base_dir = getattr(sys, '_MEIPASS', os.path.dirname(os.path.abspath(__file__)))
+    ffmpeg_name = 'ffmpeg.exe' if sys.platform == 'win32' else 'ffmpeg'
+    ffmpeg_path = os.path.join(base_dir, ffmpeg_name)
+    return ffmpeg_path if os.path.exists(ffmpeg_path) else None
+
+
+# yt_dlp chỉ được import khi thật sự tải (mất ~0.2 giây), để giao diện và CLI khởi động nhanh
+VIDEO_ID_RE = re.compile(
+    r"(?:youtube(?:-nocookie)?\.com/(?:watch\?(?:.*&)?v=|shorts/|embed/|live/|v/)|youtu\.be/)([0-9A-Za-z_-]{11})"
+)
+
+
+def video_key(url):
+    """ID video YouTube trong URL (watch, youtu.be, shorts...); URL khác giữ nguyên"""
+    match = VIDEO_ID_RE.search(url)
+    return match.group(1) if match else url
+
+
+class ExtractionCache:
+    """Kết quả extract_info (chưa chọn định dạng) và tên file đã tính theo video ID, trong bộ nhớ.
+
+    TTL ngắn vì link định dạng của YouTube hết hạn sau vài giờ.
+    """
+
+    def __init__(self, ttl=600, max_items=256):
+        self.ttl = ttl
+        self.max_items = max_items
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> {"info", "paths", "timestamp"}
+
+    def _entry(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry["timestamp"] > self.ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def get(self, key):
+        """Bản sao info dict (process_ie_result sửa trực tiếp lên dict), None nếu chưa có hoặc hết hạn"""
+        with self._lock:
+            entry = self._entry(key)
+            info = entry["info"] if entry else None
+        return copy.deepcopy(info) if info is not None else None
+
+    def set(self, key, info):
+        with self._lock:
+            self._entries[key] = {"info": info, "paths": {}, "timestamp": time.time()}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_items:
+                self._entries.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def get_path(self, key, variant):
+        with self._lock:
+            entry = self._entry(key)
+            return entry["paths"].get(variant) if entry else None
+
+    def set_path(self, key, variant, path):
+        with self._lock:
+            entry = self._entry(key)
+            if entry is not None:
+                entry["paths"][variant] = path
+
+
+EXTRACTION_CACHE = ExtractionCache()
+_worker_local = threading.local()
+
+
+def _worker_ydl(ffmpeg_path):
+    """YoutubeDL dùng lại cho mọi video trên cùng một luồng tải (giữ extractor, kết nối HTTP đã khởi tạo).
+
+    Progress hook được gắn một lần và chuyển tiếp tới ydl.job_progress_hook do fetch() gán cho từng job.
+    Không đọc hook từ _worker_local: yt-dlp gọi hook trên luồng riêng của nó khi tải nhiều fragment song song.
+    """
+    import yt_dlp
+
+    ydl = getattr(_worker_local, "ydl", None)
+    if ydl is None or _worker_local.ffmpeg_path != ffmpeg_path:
+        ydl = yt_dlp.YoutubeDL({
+            "quiet": True,
+            # Không in thanh tiến độ ra stdout (CLI dùng stdout cho sự kiện JSON Lines); tiến độ đi qua hook
+            "noprogress": True,
+            "noplaylist": True,
+            "restrictfilenames": True,
+            "retries": 10,  # Tăng số lần thử lại
+            "fragment_retries": 10,  # Tăng thử lại cho đoạn
+            "socket_timeout": 30,  # Timeout 30 giây
+            "ffmpeg_location": ffmpeg_path,
+        })
+        ydl.job_progress_hook = None
+        ydl.add_progress_hook(lambda d: ydl.job_progress_hook and ydl.job_progress_hook(d))
+        _worker_local.ydl = ydl
+        _worker_local.ffmpeg_path = ffmpeg_path
+    return ydl
+
+
+class Downloader:
+    """Phần lõi tải video bằng yt-dlp, không phụ thuộc Tkinter; dùng chung cho giao diện và CLI"""
+
+    def __init__(self, download_path, mode="video+audio", cancel_event=None, on_success=None, extra_opts=None,
+                 extraction_cache=EXTRACTION_CACHE):
+        if mode not in DOWNLOAD_MODES:
+            raise ValueError(f"Chế độ tải không hợp lệ: {mode}")
+        self.download_path = download_path
+        self.mode = mode
+        # Tùy chọn yt-dlp do bộ điều phối quyết định (ratelimit, http_chunk_size, concurrent_fragment_downloads)
+        self.extra_opts = extra_opts or {}
+        self.cancel_event = cancel_event or threading.Event()
+        # on_success(url, file_path) được gọi sau mỗi video tải xong hoặc đã có sẵn
+        self.on_success = on_success
+        self.extraction_cache = extraction_cache
+
+    def build_opts(self, ffmpeg_path, progress_hook=None, format_spec=None):
+        opts = {
+            "outtmpl": os.path.join(self.download_path, FINAL_OUTTMPL),
+            "quiet": True,
+            "noplaylist": True,
+            "restrictfilenames": True,
+            "retries": 10,  # Tăng số lần thử lại
+            "fragment_retries": 10,  # Tăng thử lại cho đoạn
+            "socket_timeout": 30,  # Timeout 30 giây
+            "http_chunk_size": 10485760,  # 10MB chunk để ổn định tải 4K
+            "progress_hooks": [progress_hook] if progress_hook else [],
+            "ffmpeg_location": ffmpeg_path,
+        }
+
+        # Chỉ tải file gốc; ghép/chuyển mã bằng ffmpeg là công đoạn riêng (xem postprocess.py)
+        if format_spec:
+            opts.update({"format": format_spec})
+        elif self.mode == "video+audio":
+            opts.update({
+                "format": "bestvideo,bestaudio",
+                "outtmpl": os.path.join(self.download_path, RAW_OUTTMPL),
+            })
+        elif self.mode == "video":
+            opts.update({"format": "bestvideo"})
+        elif self.mode == "audio":
+            opts.update({
+                "format": "bestaudio[ext=m4a]",
+                "outtmpl": os.path.join(self.download_path, RAW_OUTTMPL),
+            })
+        opts.update(self.extra_opts)
+        return opts
+
+    def _make_progress_hook(self, url, progress_callback, on_partial):
+        import yt_dlp
+
+        seen_partials = set()
+        # video+audio tải hai file liên tiếp: cộng dồn để tiến độ của cả video không bị tụt về 0
+        done_bytes = {}
+
+        def progress_hook(d):
+            tmp_path = d.get("tmpfilename")
+            if on_partial and tmp_path and tmp_path not in seen_partials:
+                seen_partials.add(tmp_path)
+                on_partial(tmp_path)
+            if self.cancel_event.is_set():
+                # Dừng yt-dlp ngay, file .part được giữ lại để hàng đợi quyết định tải tiếp hay xóa
+                raise yt_dlp.utils.DownloadCancelled()
+            if progress_callback is None:
+                return
+            previous = sum(size for name, size in done_bytes.items() if name != d.get("filename"))
+            if d["status"] == "downloading":
+                downloaded = d.get("downloaded_bytes", 0)
+                total = d.get("total_bytes") or d.get("total_bytes_estimate", 0)
+                if total > 0:
+                    progress_callback(
+                        "progress", url, previous + downloaded, previous + total, d.get("speed"), d.get("eta")
+                    )
+            elif d["status"] == "finished":
+                done_bytes[d.get("filename")] = d.get("total_bytes") or d.get("downloaded_bytes", 0)
+                progress_callback("finished", url)
+
+        return progress_hook
+
+    def _final_path(self, ydl, info):
+        ext = FINAL_EXTS.get(self.mode)
+        if ext is None:
+            return ydl.prepare_filename(info)
+        return ydl.prepare_filename(dict(info, ext=ext), outtmpl=os.path.join(self.download_path, FINAL_OUTTMPL))
+
+    def _apply_opts(self, ydl, opts):
+        for name in JOB_OPTION_KEYS:
+            if name in opts:
+                ydl.params[name] = opts[name]
+            else:
+                ydl.params.pop(name, None)
+        ydl.params["outtmpl"]["default"] = opts["outtmpl"]
+        # YoutubeDL dựng bộ chọn định dạng một lần trong __init__, cần dựng lại khi đổi format
+        if getattr(ydl, "_format_spec", None) != opts["format"]:
+            ydl.format_selector = ydl.build_format_selector(opts["format"])
+            ydl._format_spec = opts["format"]
+
+    def _extract(self, ydl, key, url):
+        """Info dict chưa chọn định dạng: lấy từ cache hoặc trích xuất một lần duy nhất"""
+        info = self.extraction_cache.get(key)
+        if info is None:
+            info = ydl.extract_info(url, download=False, process=False)
+            self.extraction_cache.set(key, info)
+            info = copy.deepcopy(info)
+        return info
+
+    def _fetch(self, ydl, url, format_spec=None):
+        self._apply_opts(ydl, self.build_opts(ydl.params["ffmpeg_location"], format_spec=format_spec))
+        key = video_key(url)
+        variant = (self.download_path, format_spec or self.mode)
+        info = self._extract(ydl, key, url)
+        file_path = self.extraction_cache.get_path(key, variant)
+        if file_path is None:
+            # Chỉ chọn định dạng trên info đã có, không gửi lại yêu cầu trích xuất
+            selected = ydl.process_ie_result(copy.deepcopy(info), download=False)
+            file_path = ydl.prepare_filename(selected) if format_spec else self._final_path(ydl, selected)
+            self.extraction_cache.set_path(key, variant, file_path)
+        if os.path.exists(file_path):
+            logger.info(f"Video đã tồn tại: {file_path}")
+            return True, file_path, None, None
+        if self.cancel_event.is_set():
+            return False, None, None, None
+        info = ydl.process_ie_result(info, download=True)
+        if format_spec or self.mode == "video":
+            return True, ydl.prepare_filename(info), None, None
+        inputs = [d["filepath"] for d in info.get("requested_downloads") or [] if d.get("filepath")]
+        if self.mode == "video+audio":
+            return True, None, PostStep("merge", inputs, file_path), None
+        return True, None, PostStep("extract_audio", inputs[:1], file_path), None
+
+    def fetch(self, url, progress_callback=None, on_partial=None):
+        """Công đoạn mạng: tải file gốc, không chạy ffmpeg; trả về (success, file_path, post_step, error).
+
+        Nếu post_step khác None thì file chưa dùng được, cần chạy post_step (PostProcessingStage hoặc run_post_step).
+        progress_callback("progress", url, downloaded, total, speed, eta) / ("finished", url) được gọi trên
+        luồng tải; downloaded/total cộng dồn qua các file của cùng video, speed (byte/giây) và eta có thể là None.
+        on_partial(tmp_path) được gọi cho mỗi file .part mới để hàng đợi có thể tải tiếp sau khi khởi động lại.
+        """
+        import yt_dlp
+
+        if self.cancel_event.is_set():
+            return False, None, None, None
+        ffmpeg_path = find_ffmpeg()
+        if ffmpeg_path is None:
+            logger.error("FFmpeg không tìm thấy cạnh ứng dụng")
+            return False, None, None, "FFmpeg không tìm thấy. Đảm bảo ffmpeg.exe được nhúng trong build."
+        ydl = _worker_ydl(ffmpeg_path)
+        ydl.job_progress_hook = self._make_progress_hook(url, progress_callback, on_partial)
+
+        try:
+            try:
+                result = self._fetch(ydl, url)
+            except (yt_dlp.utils.DownloadError, yt_dlp.utils.ExtractorError) as e:
+                if self.mode != "video+audio" or "Requested format is not available" not in str(e):
+                    raise
+                # Video không có luồng hình/tiếng tách rời: tải bản "best" đã ghép sẵn, không cần ffmpeg
+                result = self._fetch(ydl, url, format_spec="best")
+            if result[0]:
+                logger.info(f"Tải thành công: {url}")
+            return result
+        except yt_dlp.utils.DownloadCancelled:
+            logger.info(f"Đã dừng tải: {url}")
+            return False, None, None, None
+        except Exception as e:
+            if self.cancel_event.is_set():
+                logger.info(f"Đã dừng tải: {url}")
+                return False, None, None, None
+            # Link định dạng trong cache có thể đã hết hạn: lần thử sau trích xuất lại từ đầu
+            self.extraction_cache.discard(video_key(url))
+            logger.error(f"Lỗi tải video {url}: {str(e)}")
+            return False, None, None, f"Lỗi tải video: {str(e)}"
+
+    def download(self, url, progress_callback=None, on_partial=None):
+        """Tải một video và chạy ffmpeg ngay trên luồng hiện tại; trả về (success, file_path, error)"""
+        success, file_path, step, error = self.fetch(url, progress_callback, on_partial)
+        if success and step is not None:
+            success, file_path, error = self.post_process(url, step)
+        elif success:
+            self.complete(url, file_path)
+        return success, file_path, error
+
+    def post_process(self, url, step):
+        try:
+            file_path = run_post_step(step, find_ffmpeg())
+        except Exception as e:
+            logger.error(f"Lỗi xử lý ffmpeg {url}: {str(e)}")
+            return False, None, f"Lỗi xử lý video: {str(e)}"
+        self.complete(url, file_path)
+        return True, file_path, None
+
+    def complete(self, url, file_path):
+        if self.on_success:
+            self.on_success(url, file_path)
@@ -0,0 +1,240 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+from download_core import Downloader, find_ffmpeg, video_key
+
+logger = logging.getLogger(__name__)
+
+# queued -> running -> done | failed | cancelled; running còn sót khi khởi động nghĩa là app bị tắt/crash
+JOB_STATES = ("queued", "running", "done", "failed", "cancelled")
+
+
+class DownloadQueue:
+    """Hàng đợi tải lưu trên đĩa (SQLite): trạng thái, số lần thử và file .part của từng job"""
+
+    def __init__(self, db_path, progress_interval=2.0):
+        self.db_path = db_path
+        self.progress_interval = progress_interval
+        self._lock = threading.Lock()
+        self._last_flush = {}
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "job_id INTEGER PRIMARY KEY AUTOINCREMENT, video_id TEXT, url TEXT NOT NULL, title TEXT, "
+            "mode TEXT NOT NULL, download_path TEXT NOT NULL, state TEXT NOT NULL, "
+            "attempts INTEGER NOT NULL DEFAULT 0, downloaded_bytes INTEGER NOT NULL DEFAULT 0, "
+            "total_bytes INTEGER NOT NULL DEFAULT 0, tmp_paths TEXT NOT NULL DEFAULT '[]', "
+            "file_path TEXT, error TEXT, created REAL NOT NULL, updated REAL NOT NULL, "
+            "UNIQUE(url, mode, download_path))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs(state)")
+        # Job đang chạy khi app bị đóng/crash được đưa lại vào hàng đợi để tải tiếp từ file .part
+        recovered = self._conn.execute(
+            "UPDATE jobs SET state = 'queued', updated = ? WHERE state = 'running'", (time.time(),)
+        ).rowcount
+        if recovered:
+            logger.info(f"Khôi phục {recovered} job tải dở từ lần chạy trước")
+
+    def _update(self, job_id, **fields):
+        fields["updated"] = time.time()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {columns} WHERE job_id = ?", (*fields.values(), job_id))
+
+    def add(self, url, mode, download_path, video_id=None, title=None):
+        """Thêm job (hoặc đưa job cũ chưa xong về queued); trả về job_id"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT job_id, state FROM jobs WHERE url = ? AND mode = ? AND download_path = ?",
+                (url, mode, download_path),
+            ).fetchone()
+            if row is None:
+                return self._conn.execute(
+                    "INSERT INTO jobs (video_id, url, title, mode, download_path, state, created, updated) "
+                    "VALUES (?, ?, ?, ?, ?, 'queued', ?, ?)",
+                    (video_id, url, title, mode, download_path, now, now),
+                ).lastrowid
+            self._conn.execute(
+                "UPDATE jobs SET state = 'queued', error = NULL, updated = ? WHERE job_id = ?",
+                (now, row["job_id"]),
+            )
+            return row["job_id"]
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def pending(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM jobs WHERE state IN ('queued', 'running') ORDER BY job_id"
+            ).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    @staticmethod
+    def _to_dict(row):
+        job = dict(row)
+        job["tmp_paths"] = json.loads(job["tmp_paths"])
+        return job
+
+    def start(self, job_id):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET state = 'running', attempts = attempts + 1, updated = ? WHERE job_id = ?",
+                (time.time(), job_id),
+            )
+
+    def update_progress(self, job_id, downloaded, total):
+        # progress_hook gọi sau mỗi chunk; chỉ ghi xuống đĩa sau mỗi progress_interval giây
+        now = time.monotonic()
+        if now - self._last_flush.get(job_id, 0) < self.progress_interval:
+            return
+        self._last_flush[job_id] = now
+        self._update(job_id, downloaded_bytes=downloaded, total_bytes=total)
+
+    def add_partial(self, job_id, tmp_path):
+        with self._lock:
+            row = self._conn.execute("SELECT tmp_paths FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if row is None:
+                return
+            tmp_paths = json.loads(row["tmp_paths"])
+            if tmp_path in tmp_paths:
+                return
+            tmp_paths.append(tmp_path)
+            self._conn.execute(
+                "UPDATE jobs SET tmp_paths = ?, updated = ? WHERE job_id = ?",
+                (json.dumps(tmp_paths, ensure_ascii=False), time.time(), job_id),
+            )
+
+    def finish(self, job_id, file_path):
+        self._last_flush.pop(job_id, None)
+        self._update(job_id, state="done", file_path=file_path, error=None, tmp_paths="[]")
+
+    def fail(self, job_id, error):
+        self._last_flush.pop(job_id, None)
+        self._update(job_id, state="failed", error=error)
+
+    def cancel(self, job_ids):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE jobs SET state = 'cancelled', updated = ? "
+                "WHERE job_id = ? AND state IN ('queued', 'running')",
+                [(now, job_id) for job_id in job_ids],
+            )
+
+    def clean_abandoned(self):
+        """Chỉ xóa file tạm của các job do app tạo ra và đã bị người dùng hủy.
+
+        Job lỗi giữ lại file .part để lần thử sau tải tiếp.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT job_id, tmp_paths FROM jobs WHERE state = 'cancelled' AND tmp_paths != '[]'"
+            ).fetchall()
+        for row in rows:
+            for tmp_path in json.loads(row["tmp_paths"]):
+                # yt-dlp ghi thêm file .ytdl cạnh file .part để lưu trạng thái tải theo đoạn
+                base = tmp_path[:-len(".part")] if tmp_path.endswith(".part") else tmp_path
+                for path in (tmp_path, base + ".ytdl"):
+                    try:
+                        os.remove(path)
+                        logger.info(f"Đã xóa file tạm: {path}")
+                    except FileNotFoundError:
+                        pass
+                    except Exception as e:
+                        logger.error(f"Lỗi khi dọn file tạm: {str(e)}")
+            self._update(row["job_id"], tmp_paths="[]")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def run_job(download_queue, job, cancel_event=None, progress_callback=None, on_success=None, extra_opts=None,
+            post_stage=None, history=None):
+    """Chạy một job của hàng đợi bằng Downloader và ghi lại trạng thái; trả về (success, file_path, error).
+
+    Có post_stage: bước ffmpeg được xếp vào công đoạn xử lý riêng và hàm trả về ngay một Future của
+    (success, file_path, error), luồng tải được giải phóng cho video tiếp theo.
+    Có history (HistoryStore): video đã tải ở cùng chế độ và file còn khớp checksum được bỏ qua
+    trước mọi truy cập mạng.
+    """
+    job_id = job["job_id"]
+    video_id = job["video_id"] or video_key(job["url"])
+    if history is not None:
+        file_path = history.verify(video_id, job["mode"])
+        if file_path:
+            logger.info(f"Bỏ qua video đã tải: {file_path}")
+            download_queue.finish(job_id, file_path)
+            return True, file_path, None
+
+    def succeeded(url, file_path):
+        if history is not None:
+            history.add(video_id, job["mode"], url, file_path)
+        if on_success:
+            on_success(url, file_path)
+
+    downloader = Downloader(
+        job["download_path"], job["mode"], cancel_event, on_success=succeeded, extra_opts=extra_opts
+    )
+    download_queue.start(job_id)
+
+    def on_progress(msg_type, url, *data):
+        if msg_type == "progress":
+            download_queue.update_progress(job_id, data[0], data[1])
+        if progress_callback:
+            progress_callback(msg_type, url, *data)
+
+    started = time.monotonic()
+    success, file_path, step, error = downloader.fetch(
+        job["url"], on_progress, on_partial=lambda tmp_path: download_queue.add_partial(job_id, tmp_path)
+    )
+    download_seconds = time.monotonic() - started
+    if post_stage is not None:
+        post_stage.timer.add("download", download_seconds)
+
+    def record(result):
+        success, file_path, error = result
+        if success:
+            download_queue.finish(job_id, file_path)
+        elif error:
+            download_queue.fail(job_id, error)
+        # Bị dừng (hủy hoặc đóng app): giữ trạng thái running, lần khởi động sau sẽ tải tiếp
+        return result
+
+    if not success or step is None:
+        if success:
+            downloader.complete(job["url"], file_path)
+        return record((success, file_path, error))
+    if post_stage is None:
+        return record(downloader.post_process(job["url"], step))
+
+    logger.info(f"Tải xong sau {download_seconds:.1f}s, chờ xử lý ffmpeg: {job['url']}")
+    result = Future()
+
+    def on_processed(future):
+        if future.cancelled():
+            # App đóng khi file còn chờ ffmpeg: giữ trạng thái running để lần sau xử lý lại
+            result.set_result((False, None, None))
+            return
+        try:
+            file_path = future.result()
+        except Exception as e:
+            logger.error(f"Lỗi xử lý ffmpeg {job['url']}: {str(e)}")
+            result.set_result(record((False, None, f"Lỗi xử lý video: {str(e)}")))
+            return
+        downloader.complete(job["url"], file_path)
+        result.set_result(record((True, file_path, None)))
+
+    post_stage.submit(step, find_ffmpeg()).add_done_callback(on_processed)
+    return result
@@ -0,0 +1,236 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+# Ước lượng kích thước khi chưa biết (byte): audio nhỏ nên được tải trước
+MODE_SIZE_ESTIMATES = {"audio": 8 * 1024 * 1024, "video": 200 * 1024 * 1024, "video+audio": 250 * 1024 * 1024}
+MIN_CHUNK = 1024 * 1024
+MAX_CHUNK = 20 * 1024 * 1024
+
+
+def parse_rate(value):
+    """'5M', '800K', '1.5m' hoặc số byte/giây -> int; None/'' -> None"""
+    if value in (None, "", 0):
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    text = str(value).strip().upper()
+    units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+    if text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(float(text))
+
+
+def expected_size(job):
+    """Số byte còn phải tải của job, dựa trên tiến độ đã lưu hoặc ước lượng theo chế độ tải"""
+    if job.get("total_bytes"):
+        return max(0, job["total_bytes"] - job.get("downloaded_bytes", 0))
+    return MODE_SIZE_ESTIMATES.get(job.get("mode"), MODE_SIZE_ESTIMATES["video+audio"])
+
+
+def is_throttled(error):
+    return bool(error) and any(code in error for code in ("429", "403", "Too Many Requests"))
+
+
+class ByteBucket:
+    """Token bucket theo byte dùng chung cho mọi job: byte đã tải được trừ sau, luồng vượt mức phải ngủ bù.
+
+    Cho phép nợ tối đa burst byte nên giới hạn đúng cho tổng băng thông, bất kể số luồng hay số fragment.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or rate
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, nbytes):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate) - nbytes
+            self._updated = now
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+
+class AdaptiveScheduler:
+    """Điều phối tải: số luồng và số fragment song song tự điều chỉnh theo thông lượng đo được và tỉ lệ lỗi.
+
+    Tăng dần khi thông lượng còn tăng, giảm một nửa khi bị chặn (429/403), có thể giới hạn băng thông tổng.
+    """
+
+    def __init__(self, task, min_workers=1, max_workers=6, initial_workers=3, bandwidth_limit=None,
+                 adjust_interval=5.0, cancel_event=None, max_post_pending=None):
+        # task(job, extra_opts, progress_callback) -> (success, file_path, error) hoặc Future của bộ đó
+        # khi video còn chờ công đoạn ffmpeg; chỗ tải được trả lại ngay lúc task return
+        # max_post_pending: số video tối đa đang chờ ffmpeg; đạt mức này thì ngừng nhận job mới để file gốc
+        # chưa xử lý không dồn lên đĩa khi tải nhanh hơn ffmpeg (thường là vài lần số luồng ffmpeg)
+        self.max_post_pending = max_post_pending
+        self.task = task
+        self.min_workers = min_workers
+        self.max_workers = max(min_workers, max_workers)
+        self.concurrency = min(self.max_workers, max(min_workers, initial_workers))
+        self.fragments = 2
+        self.bandwidth_limit = bandwidth_limit
+        # Giới hạn tổng được áp trong progress hook thay vì chia "ratelimit" của yt-dlp cho từng job
+        # (yt-dlp áp ratelimit cho từng luồng fragment, và phần chia cũ không đổi khi số luồng thay đổi)
+        self._bucket = ByteBucket(bandwidth_limit) if bandwidth_limit else None
+        self.adjust_interval = adjust_interval
+        self.cancel_event = cancel_event or threading.Event()
+        self._cond = threading.Condition()
+        self._running = 0
+        self._post_pending = 0
+        self._seq = itertools.count()
+        self._last_bytes = {}  # url -> downloaded_bytes lần báo trước
+        self._window_bytes = 0
+        self._window_errors = 0
+        self._window_throttled = 0
+        self._window_start = time.monotonic()
+        self._best_throughput = 0.0
+        self.throughput = 0.0
+        self.total_bytes = 0
+
+    def _job_opts(self):
+        opts = {"concurrent_fragment_downloads": self.fragments}
+        if self.throughput:
+            # Chunk khoảng 10 giây tải của một luồng
+            per_job = self.throughput / max(1, self._running)
+            opts["http_chunk_size"] = int(min(MAX_CHUNK, max(MIN_CHUNK, per_job * 10)))
+        return opts
+
+    def _on_progress(self, msg_type, url, *data):
+        if msg_type == "progress":
+            downloaded = data[0]
+            with self._cond:
+                delta = downloaded - self._last_bytes.get(url, 0)
+                self._last_bytes[url] = downloaded
+                if delta > 0:
+                    self._window_bytes += delta
+                    self.total_bytes += delta
+            # Ngủ ngoài khóa, trên chính luồng đang tải, để làm chậm đúng luồng đó
+            if delta > 0 and self._bucket:
+                self._bucket.consume(delta)
+
+    def _adjust(self):
+        now = time.monotonic()
+        elapsed = now - self._window_start
+        if elapsed < self.adjust_interval:
+            return
+        throughput = self._window_bytes / elapsed
+        errors, throttled = self._window_errors, self._window_throttled
+        self._window_bytes = self._window_errors = self._window_throttled = 0
+        self._window_start = now
+        self.throughput = throughput
+        old = (self.concurrency, self.fragments)
+
+        capped = self.bandwidth_limit and throughput >= 0.95 * self.bandwidth_limit
+        if throttled:
+            self.concurrency = max(self.min_workers, self.concurrency // 2)
+            self.fragments = max(1, self.fragments // 2)
+            self._best_throughput = throughput
+        elif errors:
+            self.concurrency = max(self.min_workers, self.concurrency - 1)
+        elif self._running >= self.concurrency and not capped:
+            if throughput > self._best_throughput * 1.1:
+                # Thông lượng còn tăng khi thêm luồng -> đường truyền chưa bão hòa
+                self._best_throughput = throughput
+                self.concurrency = min(self.max_workers, self.concurrency + 1)
+                self.fragments = min(8, self.fragments + 1)
+            elif throughput < self._best_throughput * 0.8:
+                self.concurrency = max(self.min_workers, self.concurrency - 1)
+        if (self.concurrency, self.fragments) != old:
+            logger.info(
+                f"Điều chỉnh tải: {old[0]} -> {self.concurrency} luồng, {old[1]} -> {self.fragments} fragment "
+                f"({throughput / 1024 / 1024:.2f} MB/s, {errors} lỗi, {throttled} bị chặn)"
+            )
+
+    def _run_one(self, job, progress_callback, on_result):
+        def on_progress(*msg):
+            self._on_progress(*msg)
+            if progress_callback:
+                progress_callback(*msg)
+
+        with self._cond:
+            extra_opts = self._job_opts()
+        try:
+            result = self.task(job, extra_opts, on_progress)
+        except Exception as e:
+            logger.error(f"Lỗi trong tác vụ tải: {str(e)}")
+            result = (False, None, str(e))
+        if isinstance(result, Future):
+            # Phần mạng đã xong, chỉ còn ffmpeg: tính là tải thành công và nhường chỗ cho job khác
+            with self._cond:
+                self._running -= 1
+                self._post_pending += 1
+                self._last_bytes.pop(job["url"], None)
+                self._cond.notify_all()
+            result.add_done_callback(lambda future: self._post_done(job, future.result(), on_result))
+            return
+        success, _, error = result
+        with self._cond:
+            self._running -= 1
+            if not success and error:
+                self._window_errors += 1
+                self._window_throttled += is_throttled(error)
+            self._last_bytes.pop(job["url"], None)
+            self._cond.notify_all()
+        if on_result:
+            on_result(job, *result)
+
+    def _post_done(self, job, result, on_result):
+        try:
+            if on_result:
+                on_result(job, *result)
+        finally:
+            with self._cond:
+                self._post_pending -= 1
+                self._cond.notify_all()
+
+    def _post_backlogged(self):
+        return bool(self.max_post_pending) and self._post_pending >= self.max_post_pending
+
+    def _worker(self, index, pending, progress_callback, on_result):
+        """Luồng tải sống suốt lượt chạy: lấy lần lượt job từ heap (giữ YoutubeDL của luồng cho mọi job).
+
+        Luồng thứ index chỉ nhận job khi index < concurrency, nên khi giảm số luồng các luồng dư chỉ chờ.
+        """
+        while True:
+            with self._cond:
+                while True:
+                    if self.cancel_event.is_set() or not pending:
+                        return
+                    if index < self.concurrency and not self._post_backlogged():
+                        break
+                    self._cond.wait(timeout=0.5)
+                job = heapq.heappop(pending)[2]
+                self._running += 1
+            self._run_one(job, progress_callback, on_result)
+
+    def run(self, jobs, progress_callback=None, on_result=None):
+        """Chạy tất cả job (chặn tới khi tải và xử lý xong hoặc bị hủy); job nhỏ được ưu tiên"""
+        pending = [(expected_size(job), next(self._seq), job) for job in jobs]
+        heapq.heapify(pending)
+        workers = 0
+        with self._cond:
+            while True:
+                old = self.concurrency
+                self._adjust()
+                if self.concurrency != old:
+                    self._cond.notify_all()
+                if self.cancel_event.is_set():
+                    pending.clear()
+                if not pending and self._running == 0 and self._post_pending == 0:
+                    break
+                while pending and workers < self.concurrency:
+                    threading.Thread(
+                        target=self._worker, args=(workers, pending, progress_callback, on_result), daemon=True
+                    ).start()
+                    workers += 1
+                self._cond.wait(timeout=0.5)
@@ -0,0 +1,381 @@
+import hashlib
+import json
+import random
+import threading
+import time
+from urllib.parse import parse_qs, urlsplit
+from datetime import datetime, timedelta, timezone
+
+from api_quota import DEFAULT_COST, UNIT_COSTS, quota_day
+
+PAGE_SIZE_MAX = 50
+BATCH_LIMIT = 1000
+DESCRIPTION = (
+    "Video tổng hợp cho benchmark. Nội dung mô tả được lặp lại để kích thước phản hồi gần với dữ liệu thật "
+    "của YouTube Data API, nơi phần snippet chiếm phần lớn dung lượng. "
+)
+
+
+def _etag(body):
+    digest = hashlib.sha1(json.dumps(body, sort_keys=True, separators=(",", ":")).encode("utf-8"))
+    return digest.hexdigest()[:27]
+
+
+def _synthetic_id(prefix, seed, length):
+    alphabet = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_"
+    digest = hashlib.sha256(f"{prefix}:{seed}".encode("utf-8")).digest()
+    return prefix + "".join(alphabet[b % 64] for b in digest[:length])
+
+
+def _thumbnails(video_id):
+    return {
+        name: {"url": f"https://i.ytimg.com/vi/{video_id}/{file}.jpg", "width": w, "height": h}
+        for name, file, w, h in (
+            ("default", "default", 120, 90), ("medium", "mqdefault", 320, 180), ("high", "hqdefault", 480, 360)
+        )
+    }
+
+
+def parse_fields(spec):
+    """Cú pháp partial response của Google ("a,b/c,d(e,f)") -> cây dict; None nghĩa là lấy cả nhánh"""
+    def select(node, names):
+        # Đi theo đường a/b/c, tạo nhánh khi cần; trả về None nếu một nhánh cha đã được lấy toàn bộ
+        for name in names:
+            if name in node and node[name] is None:
+                return None
+            node = node.setdefault(name, {})
+        return node
+
+    def parse(i, base):
+        while i < len(spec) and spec[i] != ")":
+            j = i
+            while j < len(spec) and spec[j] not in ",()":
+                j += 1
+            names = [name.strip() for name in spec[i:j].split("/")]
+            if j < len(spec) and spec[j] == "(":
+                node = select(base, names)
+                j = parse(j + 1, {} if node is None else node) + 1
+            else:
+                parent = select(base, names[:-1])
+                if parent is not None:
+                    parent[names[-1]] = None
+            if j < len(spec) and spec[j] == ",":
+                j += 1
+            i = j
+        return i
+
+    tree = {}
+    parse(0, tree)
+    return tree
+
+
+def apply_fields(value, tree):
+    if tree is None:
+        return value
+    if isinstance(value, list):
+        return [apply_fields(item, tree) for item in value]
+    if isinstance(value, dict):
+        return {key: apply_fields(value[key], sub) for key, sub in tree.items() if key in value}
+    return value
+
+
+def _http_error(status, reason, message):
+    # Lỗi giống hệt lỗi googleapiclient ném ra để YouTubeAPIWrapper xử lý như với server thật
+    import httplib2
+    from googleapiclient.errors import HttpError
+
+    content = json.dumps({"error": {"code": status, "message": message,
+                                    "errors": [{"reason": reason, "message": message}]}})
+    return HttpError(httplib2.Response({"status": status}), content.encode("utf-8"))
+
+
+class FakeVideo:
+    __slots__ = ("video_id", "title", "published", "views")
+
+    def __init__(self, video_id, title, published, views):
+        self.video_id = video_id
+        self.title = title
+        self.published = published
+        self.views = views
+
+
+class FakeChannel:
+    def __init__(self, channel_id, handle, title):
+        self.channel_id = channel_id
+        self.handle = handle
+        self.title = title
+        self.playlist_id = "UU" + channel_id[2:]
+        self.videos = []  # Mới nhất trước, đúng thứ tự của uploads playlist
+
+
+class FakeRequest:
+    """Giống HttpRequest của googleapiclient ở các điểm YouTubeAPIWrapper dùng: methodId, headers, execute()"""
+
+    def __init__(self, server, method_id, params):
+        self.server = server
+        self.methodId = method_id
+        self.params = params
+        self.headers = {}
+        self.uri = f"fake://youtube/v3/{method_id.split('.', 1)[1]}"
+
+    def execute(self, http=None, num_retries=0):
+        return self.server.handle(self)
+
+
+class FakeBatch:
+    """Giống BatchHttpRequest: các lệnh add() được gửi trong một round trip khi execute()"""
+
+    def __init__(self, server, callback=None):
+        self._server = server
+        self._callback = callback
+        self._requests = []
+
+    def add(self, request, callback=None, request_id=None):
+        if len(self._requests) >= BATCH_LIMIT:
+            raise Exception(f"Batch vượt quá {BATCH_LIMIT} lệnh")
+        self._requests.append((request_id or str(len(self._requests) + 1), request, callback or self._callback))
+
+    def execute(self, http=None):
+        self._server.round_trip()
+        for request_id, request, callback in self._requests:
+            try:
+                response, exception = self._server.handle(request, round_trip=False), None
+            except Exception as e:
+                response, exception = None, e
+            if callback:
+                callback(request_id, response, exception)
+
+
+class _Resource:
+    def __init__(self, server, name):
+        self._server = server
+        self._name = name
+
+    def list(self, **params):
+        return FakeRequest(self._server, f"youtube.{self._name}.list", params)
+
+
+class FakeYouTube:
+    """Bản giả chạy trong bộ nhớ của các endpoint channels, playlistItems và videos (YouTube Data API v3).
+
+    Truyền vào YouTubeAPIWrapper(..., client=FakeYouTube()) để đo/benchmark đường fetch mà không tốn quota.
+    Hỗ trợ kênh tổng hợp với số video tùy ý, độ trễ, lỗi ngẫu nhiên, quota theo ngày (riêng cho từng API key
+    trong tham số key của URI, như mỗi key một project) và ETag/304.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, daily_quota=None, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.daily_quota = daily_quota
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._channels = {}
+        self._by_handle = {}
+        self._by_playlist = {}
+        self._videos = {}
+        self._quota_day = None
+        self.quota_used = 0
+        self.quota_by_key = {}
+        self.calls = {}  # (methodId, status) -> số lệnh
+        self.round_trips = 0  # Số HTTP request thật sự (một batch tính là một)
+        self.response_bytes = 0
+
+    # --- Dữ liệu tổng hợp ---
+
+    def add_channel(self, video_count, channel_id=None, handle=None, title=None):
+        """Tạo kênh với video_count video (ngày đăng giảm dần); trả về channel_id"""
+        with self._lock:
+            index = len(self._channels)
+            channel_id = channel_id or _synthetic_id("UC", index, 22)
+            channel = FakeChannel(channel_id, handle or f"fake{index}", title or f"Kênh giả {index}")
+            self._channels[channel_id] = channel
+            self._by_handle[channel.handle.lower()] = channel
+            self._by_playlist[channel.playlist_id] = channel
+        self.upload(channel_id, video_count, start=datetime(2015, 1, 1, tzinfo=timezone.utc))
+        return channel_id
+
+    def upload(self, channel_id, count=1, start=None):
+        """Thêm count video mới lên đầu uploads playlist của kênh; trả về danh sách video_id mới"""
+        with self._lock:
+            channel = self._channels[channel_id]
+            if start is None:
+                start = channel.videos[0].published + timedelta(hours=1) if channel.videos else datetime.now(timezone.utc)
+            new = []
+            for i in range(count):
+                seq = len(self._videos)
+                video_id = _synthetic_id("", f"{channel_id}:{seq}", 11)
+                video = FakeVideo(video_id, f"Video {seq} của {channel.title}", start + timedelta(hours=6 * i),
+                                  self._random.randint(0, 5_000_000))
+                self._videos[video_id] = video
+                new.append(video)
+            channel.videos[:0] = reversed(new)
+            return [v.video_id for v in reversed(new)]
+
+    def channel(self, channel_id):
+        return self._channels[channel_id]
+
+    # --- Giao diện giống client googleapiclient ---
+
+    def channels(self):
+        return _Resource(self, "channels")
+
+    def playlistItems(self):
+        return _Resource(self, "playlistItems")
+
+    def videos(self):
+        return _Resource(self, "videos")
+
+    def new_batch_http_request(self, callback=None):
+        return FakeBatch(self, callback)
+
+    # --- Xử lý request ---
+
+    def stats(self):
+        """Số lệnh theo endpoint/mã trạng thái và quota đã dùng, để so sánh giữa các lần chạy"""
+        with self._lock:
+            by_endpoint = {}
+            for (method_id, status), count in self.calls.items():
+                by_endpoint.setdefault(method_id.split(".", 1)[1], {})[status] = count
+            return {"requests": sum(self.calls.values()), "round_trips": self.round_trips,
+                    "response_bytes": self.response_bytes,
+                    "by_endpoint": by_endpoint, "quota_used": self.quota_used,
+                    "quota_by_key": dict(self.quota_by_key)}
+
+    def reset_stats(self):
+        with self._lock:
+            self.calls.clear()
+            self.round_trips = 0
+            self.response_bytes = 0
+
+    def round_trip(self):
+        """Chi phí của một HTTP request: độ trễ mạng (ngoài lock để các luồng chạy song song)"""
+        with self._lock:
+            self.round_trips += 1
+        if self.latency or self.jitter:
+            time.sleep(max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter)))
+
+    def _count(self, method_id, status):
+        key = (method_id, status)
+        self.calls[key] = self.calls.get(key, 0) + 1
+
+    def handle(self, request, round_trip=True):
+        if round_trip:
+            self.round_trip()
+        with self._lock:
+            cost = UNIT_COSTS.get(request.methodId, DEFAULT_COST)
+            day = quota_day()
+            if day != self._quota_day:
+                self._quota_day, self.quota_used = day, 0
+                self.quota_by_key.clear()
+            api_key = parse_qs(urlsplit(request.uri).query).get("key", [None])[0]
+            if self.daily_quota and self.quota_by_key.get(api_key, 0) + cost > self.daily_quota:
+                self._count(request.methodId, "403")
+                raise _http_error(403, "quotaExceeded", "The request cannot be completed because you have exceeded your quota.")
+            self.quota_used += cost
+            self.quota_by_key[api_key] = self.quota_by_key.get(api_key, 0) + cost
+            if self.error_rate and self._random.random() < self.error_rate:
+                self._count(request.methodId, "503")
+                raise _http_error(503, "backendError", "Backend Error")
+            handler = {
+                "youtube.channels.list": self._channels_list,
+                "youtube.playlistItems.list": self._playlist_items_list,
+                "youtube.videos.list": self._videos_list,
+            }[request.methodId]
+            body = handler(request.params)
+            fields = request.params.get("fields")
+            # ETag phụ thuộc cả nội dung lẫn mask: cùng dữ liệu nhưng khác fields là hai bản khác nhau
+            etag = _etag([body, fields])
+            body["etag"] = etag
+            if fields:
+                body = apply_fields(body, parse_fields(fields))
+            if request.headers.get("If-None-Match") == etag:
+                self._count(request.methodId, "304")
+                raise _http_error(304, "notModified", "Not Modified")
+            self._count(request.methodId, "200")
+            # Đi qua JSON như phản hồi thật để đo được số byte và thời gian parse
+            payload = json.dumps(body, ensure_ascii=False)
+            self.response_bytes += len(payload.encode("utf-8"))
+        return json.loads(payload)
+
+    @staticmethod
+    def _parts(params):
+        return {p.strip() for p in params.get("part", "").split(",") if p.strip()}
+
+    def _channels_list(self, params):
+        if "id" in params:
+            found = [self._channels.get(cid) for cid in params["id"].split(",")]
+        elif "forHandle" in params:
+            found = [self._by_handle.get(params["forHandle"].lstrip("@").lower())]
+        elif "forUsername" in params:
+            found = [self._by_handle.get(params["forUsername"].lower())]
+        else:
+            raise _http_error(400, "missingRequiredParameter", "No filter selected.")
+        parts = self._parts(params)
+        items = []
+        for channel in filter(None, found):
+            item = {"kind": "youtube#channel", "id": channel.channel_id}
+            if "snippet" in parts:
+                item["snippet"] = {"title": channel.title, "customUrl": f"@{channel.handle}",
+                                   "thumbnails": _thumbnails(channel.channel_id)}
+            if "contentDetails" in parts:
+                item["contentDetails"] = {"relatedPlaylists": {"likes": "", "uploads": channel.playlist_id}}
+            items.append(item)
+        return {"kind": "youtube#channelListResponse", "pageInfo": {"totalResults": len(items),
+                                                                    "resultsPerPage": len(items)}, "items": items}
+
+    def _playlist_items_list(self, params):
+        channel = self._by_playlist.get(params.get("playlistId"))
+        if channel is None:
+            raise _http_error(404, "playlistNotFound", "The playlist identified with the request's playlistId parameter cannot be found.")
+        page_size = min(int(params.get("maxResults") or 5), PAGE_SIZE_MAX)
+        token = params.get("pageToken")
+        offset = int(token[1:]) if token else 0
+        parts = self._parts(params)
+        items = []
+        for position, video in enumerate(channel.videos[offset:offset + page_size], offset):
+            item = {"kind": "youtube#playlistItem", "id": _synthetic_id("", f"{channel.playlist_id}:{video.video_id}", 40)}
+            if "snippet" in parts:
+                item["snippet"] = {
+                    "publishedAt": video.published.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                    "channelId": channel.channel_id,
+                    "title": video.title,
+                    "description": DESCRIPTION * 3,
+                    "thumbnails": _thumbnails(video.video_id),
+                    "channelTitle": channel.title,
+                    "playlistId": channel.playlist_id,
+                    "position": position,
+                    "resourceId": {"kind": "youtube#video", "videoId": video.video_id},
+                    "videoOwnerChannelTitle": channel.title,
+                    "videoOwnerChannelId": channel.channel_id,
+                }
+            if "contentDetails" in parts:
+                item["contentDetails"] = {"videoId": video.video_id,
+                                          "videoPublishedAt": video.published.strftime("%Y-%m-%dT%H:%M:%SZ")}
+            items.append(item)
+        body = {"kind": "youtube#playlistItemListResponse", "items": items,
+                "pageInfo": {"totalResults": len(channel.videos), "resultsPerPage": page_size}}
+        if offset + page_size < len(channel.videos):
+            body["nextPageToken"] = f"p{offset + page_size}"
+        if offset:
+            body["prevPageToken"] = f"p{max(0, offset - page_size)}"
+        return body
+
+    def _videos_list(self, params):
+        ids = [vid for vid in params.get("id", "").split(",") if vid]
+        if len(ids) > PAGE_SIZE_MAX:
+            raise _http_error(400, "invalidParameter", "Too many video ids.")
+        parts = self._parts(params)
+        items = []
+        for video in filter(None, (self._videos.get(vid) for vid in ids)):
+            item = {"kind": "youtube#video", "id": video.video_id}
+            if "snippet" in parts:
+                item["snippet"] = {"publishedAt": video.published.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                                   "title": video.title, "description": DESCRIPTION * 3,
+                                   "thumbnails": _thumbnails(video.video_id)}
+            if "statistics" in parts:
+                item["statistics"] = {"viewCount": str(video.views), "likeCount": str(video.views // 40),
+                                      "favoriteCount": "0", "commentCount": str(video.views // 900)}
+            items.append(item)
+        return {"kind": "youtube#videoListResponse", "items": items,
+                "pageInfo": {"totalResults": len(items), "resultsPerPage": len(items)}}
@@ -0,0 +1,140 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from download_core import video_key
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_BYTES = 1024 * 1024
+LEGACY_MODES = {".mp3": "audio", ".m4a": "audio"}
+
+
+def quick_checksum(file_path, size=None):
+    """sha1 của kích thước file và 3 đoạn 1MB (đầu, giữa, cuối): đủ phát hiện file bị thay, không phải đọc cả file"""
+    size = os.path.getsize(file_path) if size is None else size
+    digest = hashlib.sha1(str(size).encode())
+    with open(file_path, "rb") as f:
+        for offset in sorted({0, max(0, size // 2 - SAMPLE_BYTES // 2), max(0, size - SAMPLE_BYTES)}):
+            f.seek(offset)
+            digest.update(f.read(SAMPLE_BYTES))
+    return digest.hexdigest()
+
+
+class HistoryStore:
+    """Lịch sử tải lưu trong SQLite theo (video_id, mode), kèm kích thước và checksum của file.
+
+    Mỗi video tải xong chỉ ghi thêm một dòng (WAL), không ghi lại toàn bộ lịch sử; an toàn đa luồng.
+    """
+
+    def __init__(self, db_path, legacy_json=None):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS history ("
+            "video_id TEXT NOT NULL, mode TEXT NOT NULL, url TEXT, file_path TEXT NOT NULL, "
+            "size INTEGER NOT NULL, checksum TEXT, timestamp REAL NOT NULL, "
+            "PRIMARY KEY (video_id, mode))"
+        )
+        if legacy_json:
+            self._migrate_json(legacy_json)
+
+    def add(self, video_id, mode, url, file_path):
+        """Ghi một video đã tải xong (gọi trên luồng tải/xử lý, checksum được tính tại đây)"""
+        try:
+            size = os.path.getsize(file_path)
+            checksum = quick_checksum(file_path, size)
+        except OSError as e:
+            logger.error(f"Không đọc được file đã tải {file_path}: {str(e)}")
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO history (video_id, mode, url, file_path, size, checksum, timestamp) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (video_id, mode, url, file_path, size, checksum, time.time()),
+            )
+
+    def downloaded(self, video_ids, mode):
+        """video_id -> file_path của các video đã tải ở chế độ mode mà file vẫn còn nguyên kích thước.
+
+        Chỉ đọc SQLite và stat file, không có truy cập mạng.
+        """
+        video_ids = list(video_ids)
+        rows = []
+        with self._lock:
+            for i in range(0, len(video_ids), 500):
+                chunk = video_ids[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows += self._conn.execute(
+                    f"SELECT video_id, file_path, size FROM history WHERE mode = ? AND video_id IN ({placeholders})",
+                    (mode, *chunk),
+                ).fetchall()
+        result = {}
+        for video_id, file_path, size in rows:
+            try:
+                if os.path.getsize(file_path) == size:
+                    result[video_id] = file_path
+            except OSError:
+                pass  # File đã bị xóa/di chuyển: coi như chưa tải
+        return result
+
+    def verify(self, video_id, mode):
+        """Kiểm tra kỹ bằng checksum (đọc 3MB của file); trả về file_path nếu khớp.
+
+        Dùng trước khi bỏ qua một video, để file bị thay hoặc ghi dở vẫn được tải lại.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT file_path, size, checksum FROM history WHERE video_id = ? AND mode = ?", (video_id, mode)
+            ).fetchone()
+        if row is None:
+            return None
+        file_path, size, checksum = row
+        try:
+            if quick_checksum(file_path) == checksum:
+                return file_path
+        except OSError:
+            return None
+        logger.warning(f"File đã tải bị thay đổi, sẽ tải lại: {file_path}")
+        return None
+
+    def _migrate_json(self, json_path):
+        """Nhập download_history.json cũ ({url: {file_path, timestamp}}) một lần rồi đổi tên file"""
+        if not os.path.exists(json_path):
+            return
+        try:
+            with open(json_path, "r", encoding="utf-8") as f:
+                legacy = json.load(f)
+            rows = []
+            for url, entry in legacy.items():
+                file_path = entry.get("file_path")
+                if not file_path or not os.path.exists(file_path):
+                    continue
+                # File cũ không ghi chế độ tải: đoán theo đuôi file
+                mode = LEGACY_MODES.get(os.path.splitext(file_path)[1].lower(), "video+audio")
+                size = os.path.getsize(file_path)
+                rows.append((video_key(url), mode, url, file_path, size, quick_checksum(file_path, size),
+                             entry.get("timestamp", time.time())))
+            with self._lock:
+                self._conn.execute("BEGIN")
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO history (video_id, mode, url, file_path, size, checksum, timestamp) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+                self._conn.execute("COMMIT")
+            os.replace(json_path, json_path + ".migrated")
+            logger.info(f"Đã chuyển {len(rows)} mục lịch sử tải từ {json_path} sang SQLite")
+        except Exception as e:
+            logger.error(f"Lỗi khi chuyển lịch sử tải cũ: {str(e)}")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -1,21 +1,24 @@
+import time
+
+_STARTED = time.perf_counter()  # Mốc đo thời gian khởi động
+
 import os
-import tempfile
-from dotenv import load_dotenv
 import threading
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
-from PIL import Image, ImageTk
-import io
-import requests
-import yt_dlp
-import shutil
-import re
 import json
-import time
+import re
 import sys
-import subprocess
 from youtube_api import YouTubeAPIWrapper
-from concurrent.futures import ThreadPoolExecutor
+from video_grid import VirtualVideoGrid
+from video_model import VideoStore, fetch_channel_batch, stream_records
+from download_queue import DownloadQueue, run_job
+from download_scheduler import AdaptiveScheduler, parse_rate
+from history_store import HistoryStore
+from postprocess import PostProcessingStage
+from progress import ProgressAggregator, format_progress
+from settings import get_data_path, load_api_keys
+from collections import OrderedDict
 import logging
 import queue
 
@@ -31,102 +34,12 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-# Xử lý .env trong .exe
-def get_resource_path(relative_path):
-    """Lấy đường dẫn tài nguyên trong .exe hoặc khi chạy trực tiếp"""
-    try:
-        base_path = sys._MEIPASS
-    except AttributeError:
-        base_path = os.path.dirname(os.path.abspath(__file__))
-    return os.path.join(base_path, relative_path)
-
-# Tạo .env tạm nếu chạy từ .exe
-env_path = get_resource_path(".env")
-if os.path.exists(env_path):
-    load_dotenv(env_path)
-else:
-    # Tạo .env tạm nếu không tìm thấy
-    with open(os.path.join(tempfile.gettempdir(), ".env"), "w") as f:
-        f.write("YOUTUBE_API_KEY=your_api_key_here")
-    load_dotenv(os.path.join(tempfile.gettempdir(), ".env"))
-
-load_dotenv()
-API_KEY = os.getenv("YOUTUBE_API_KEY")
-if not API_KEY:
-    raise ValueError("YOUTUBE_API_KEY không được cấu hình trong .env")
-
-class VideoItem(tk.Frame):
-    def __init__(self, parent, video_id, title, thumb_url, published_at, view_count):
-        super().__init__(parent, bd=1, relief="flat", padx=5, pady=5, bg="white", highlightthickness=1)
-        self.video_id = video_id
-        self.url = f"https://www.youtube.com/watch?v={video_id}"
-        self.selected = tk.BooleanVar()
-        self.thumb_url = thumb_url
-        self.published_at = published_at
-        self.view_count = view_count
-        self.title = title.strip()
-        self.file_path = None  # Lưu đường dẫn file sau khi tải
-
-        tk.Checkbutton(self, variable=self.selected, bg="white").grid(row=0, column=0, sticky="nw")
-        self.thumb_label = tk.Label(self, text="[Đang tải ảnh…]", width=160, height=90, bg="#eee")
-        self.thumb_label.grid(row=1, column=0, pady=(0, 5))
-        self.lbl_title = tk.Label(
-            self, text=self.title, wraplength=160, justify="left",
-            font=("Arial", 10, "bold"), bg="white"
-        )
-        self.lbl_title.grid(row=2, column=0, pady=(0, 5))
-        self.lbl_status = tk.Label(self, text="Chưa tải", fg="gray", bg="white", font=("Arial", 10))
-        self.lbl_status.grid(row=3, column=0, pady=(0, 5))
-
-        self.bind("<Enter>", lambda e: self.config(bg="#f0f0f0"))
-        self.bind("<Leave>", lambda e: self.config(bg="white"))
-        for child in self.winfo_children():
-            child.bind("<Enter>", lambda e: self.config(bg="#f0f0f0"))
-            child.bind("<Leave>", lambda e: self.config(bg="white"))
-        
-        # Sự kiện nhấp chuột để mở thư mục
-        self.bind("<Double-1>", self.open_file_location)
-        for child in self.winfo_children():
-            child.bind("<Double-1>", self.open_file_location)
-
-    def load_thumbnail(self, executor):
-        def load():
-            try:
-                resp = requests.get(self.thumb_url, timeout=5)
-                img = Image.open(io.BytesIO(resp.content)).resize((160, 90), Image.LANCZOS)
-                photo = ImageTk.PhotoImage(img)
-                self.thumb_label.after(0, lambda: self.thumb_label.config(image=photo, text=""))
-                self.photo = photo
-            except Exception as e:
-                self.thumb_label.after(0, lambda: self.thumb_label.config(text="[Lỗi ảnh]", bg="#ccc"))
-                logger.error(f"Lỗi tải thumbnail {self.thumb_url}: {str(e)}")
-
-        executor.submit(load)
-
-    def is_selected(self):
-        return self.selected.get()
-
-    def update_status(self, success, file_path=None):
-        if success:
-            self.lbl_status.config(text="Đã tải", fg="green")
-            self.file_path = file_path  # Lưu đường dẫn file
-        else:
-            self.lbl_status.config(text="Lỗi", fg="red")
-
-    def open_file_location(self, event):
-        if self.lbl_status.cget("text") == "Đã tải" and self.file_path:
-            try:
-                # Mở thư mục và highlight file trên Windows
-                subprocess.run(['explorer', '/select,', os.path.normpath(self.file_path)])
-            except Exception as e:
-                logger.error(f"Lỗi khi mở thư mục: {str(e)}")
-                messagebox.showerror("Lỗi", f"Không thể mở thư mục: {str(e)}")
-
 class YouTubeDownloaderApp(tk.Tk):
     def __init__(self):
         super().__init__()
         self.title("YouTube Channel Downloader")
-        self.geometry(self.load_config().get("geometry", "920x720"))
+        self.config_data = self.load_config()
+        self.geometry(self.config_data.get("geometry", "920x720"))
         self.configure(bg="#f5f5f5")
         if sys.platform == 'win32':
             icon_path = os.path.join(getattr(sys, '_MEIPASS', os.path.dirname(os.path.abspath(__file__))), 'youtube.ico')
@@ -134,15 +47,25 @@ class YouTubeDownloaderApp(tk.Tk):
                 self.iconbitmap(icon_path)
         self.protocol("WM_DELETE_WINDOW", self.on_closing)
 
-        self.yt_api = YouTubeAPIWrapper(API_KEY)
-        self.video_items = []
-        self.all_video_items = []  # Lưu tất cả video để hỗ trợ tìm kiếm
+        # yt_api, history, download_queue, thumbnail_loader (import PIL/requests, mở SQLite, chuyển dữ liệu
+        # JSON cũ) được tạo trên luồng nền sau khi cửa sổ đã hiện
+        self.yt_api = None
+        self.history = None
+        self.download_queue = None
+        self.thumbnail_loader = None
+        self.benchmark_startup = "--benchmark-startup" in sys.argv
+        self.store = VideoStore()  # Danh mục video, tách khỏi widget
+        self.search_debounce_ms = 200
+        self.fetch_poll_ms = 50  # Nhịp nhận trang video từ luồng fetch
+        self._search_after_id = None
         self.download_path = os.getcwd()
-        self.current_columns = 4
-        self.video_item_width = 180
-        self.history = self.load_history()  # Tải lịch sử khi khởi động
+        self.thumbnail_photos = OrderedDict()  # video_id -> PhotoImage, giới hạn theo LRU
+        self.thumbnail_photos_max = 500
         self.cancel_event = threading.Event()  # Cờ để hủy tải
-        self.download_futures = []  # Lưu danh sách futures để hủy
+        self.download_jobs = []  # job_id của lượt tải hiện tại
+        self.progress_fps = 10  # Số lần cập nhật tiến độ trên giao diện mỗi giây
+        # ffmpeg chạy trên pool riêng theo số lõi CPU để không giữ chỗ của luồng tải mạng
+        self.post_stage = PostProcessingStage(self.config_data.get("post_workers"))
 
         self.style = ttk.Style()
         self.style.theme_use("clam")
@@ -153,6 +76,67 @@ class YouTubeDownloaderApp(tk.Tk):
         self.style.configure("TProgressbar", thickness=20)
 
         self._build_ui()
+        self.fetch_btn.config(state="disabled")
+        self.download_btn.config(state="disabled")
+        self._window_ms = None
+        self.bind("<Map>", self._on_first_map, add="+")
+        # Phần khởi tạo nặng (API key, client API, PIL/requests) chạy sau khi cửa sổ đã được vẽ
+        self.after_idle(self.after, 1, self._deferred_init)
+
+    def _on_first_map(self, event):
+        if event.widget is self and self._window_ms is None:
+            self._window_ms = (time.perf_counter() - _STARTED) * 1000
+
+    def _deferred_init(self):
+        self._update_status("Đang khởi tạo…")
+        threading.Thread(target=self._open_stores, daemon=True).start()
+
+    def _open_stores(self):
+        """Chạy trên luồng nền: mở các file SQLite, chuyển dữ liệu cũ, dựng bộ tải thumbnail và client API"""
+        from thumbnail_cache import ThumbnailCache
+        from thumbnail_loader import ThumbnailLoader, make_session
+
+        thumbnail_workers = int(self.config_data.get("thumbnail_workers", 4))
+        thumbnail_loader = ThumbnailLoader(
+            ThumbnailCache(get_data_path("thumbnail_cache"), session=make_session(thumbnail_workers)),
+            workers=thumbnail_workers,
+        )
+        # Lịch sử tải theo (video_id, chế độ tải); file JSON cũ được chuyển sang một lần
+        history = HistoryStore(
+            get_data_path("download_history.db"), legacy_json=get_data_path("download_history.json")
+        )
+        download_queue = DownloadQueue(get_data_path("download_queue.db"))
+        download_queue.clean_abandoned()
+        yt_api, api_error = None, None
+        try:
+            yt_api = YouTubeAPIWrapper(load_api_keys(), cache_path=get_data_path("youtube_cache.db"))
+            # Dựng client API và kết nối HTTP trên luồng nền, không chặn giao diện
+            yt_api.prefetch()
+        except Exception as e:
+            logger.error(f"Lỗi khi khởi tạo YouTube API: {str(e)}")
+            api_error = str(e)
+        self.after(0, lambda: self._on_stores_ready(thumbnail_loader, history, download_queue, yt_api, api_error))
+
+    def _on_stores_ready(self, thumbnail_loader, history, download_queue, yt_api, api_error):
+        self.thumbnail_loader = thumbnail_loader
+        self.history = history
+        self.download_queue = download_queue
+        self.yt_api = yt_api
+        self.download_btn.config(state="normal")
+        if yt_api is not None:
+            self.fetch_btn.config(state="normal")
+            self._update_status("sẵn sàng")
+        else:
+            self._update_status("Chưa cấu hình YouTube API")
+            if not self.benchmark_startup:
+                messagebox.showerror("Lỗi", api_error)
+        ready_ms = (time.perf_counter() - _STARTED) * 1000
+        logger.info(f"Khởi động: cửa sổ sau {self._window_ms or 0:.0f}ms, sẵn sàng sau {ready_ms:.0f}ms")
+        if self.benchmark_startup:
+            print(json.dumps({"window_ms": round(self._window_ms or ready_ms, 1), "ready_ms": round(ready_ms, 1)}))
+            self.after(0, self.destroy)
+            return
+        self.after(500, self._resume_pending_downloads)
 
     def _build_ui(self):
         top = tk.Frame(self, bg="#f5f5f5")
@@ -166,6 +150,11 @@ class YouTubeDownloaderApp(tk.Tk):
         self.fetch_btn.pack(side="left")
         self.fetch_btn.bind("<Enter>", lambda e: self.show_tooltip(self.fetch_btn, "Tải danh sách video hoặc thông tin video"))
         self.fetch_btn.bind("<Leave>", lambda e: self.hide_tooltip())
+        self.full_resync_var = tk.BooleanVar(value=False)
+        self.full_resync_cb = ttk.Checkbutton(top, text="Đồng bộ lại toàn bộ", variable=self.full_resync_var)
+        self.full_resync_cb.pack(side="left", padx=5)
+        self.full_resync_cb.bind("<Enter>", lambda e: self.show_tooltip(self.full_resync_cb, "Bỏ qua đồng bộ tăng dần, tải lại toàn bộ danh sách video của kênh"))
+        self.full_resync_cb.bind("<Leave>", lambda e: self.hide_tooltip())
 
         opts = tk.Frame(self, bg="#f5f5f5")
         opts.pack(fill="x", padx=10, pady=5)
@@ -182,6 +171,7 @@ class YouTubeDownloaderApp(tk.Tk):
             values=["video+audio", "video", "audio"], width=15, state="readonly"
         )
         self.mode_cb.pack(side="left")
+        self.mode_cb.bind("<<ComboboxSelected>>", lambda e: self._mark_downloaded())
         self.mode_cb.bind("<Enter>", lambda e: self.show_tooltip(self.mode_cb, "Chọn chế độ tải: Video + Âm thanh, Chỉ video, hoặc Chỉ âm thanh"))
         self.mode_cb.bind("<Leave>", lambda e: self.hide_tooltip())
         ttk.Label(opts, text="Sắp xếp:").pack(side="left", padx=5)
@@ -202,21 +192,13 @@ class YouTubeDownloaderApp(tk.Tk):
 
         middle = tk.Frame(self, bg="#f5f5f5")
         middle.pack(fill="both", expand=True, padx=10, pady=5)
-        self.canvas = tk.Canvas(middle, highlightthickness=0, bg="#ffffff")
-        vsb = ttk.Scrollbar(middle, orient="vertical", command=self.canvas.yview)
-        self.canvas.configure(yscrollcommand=vsb.set)
-        vsb.pack(side="right", fill="y")
-        self.canvas.pack(side="left", fill="both", expand=True)
-        self.frame_videos = tk.Frame(self.canvas, bg="#ffffff")
-        self.canvas.create_window((0, 0), window=self.frame_videos, anchor="nw")
-        self.frame_videos.bind(
-            "<Configure>",
-            lambda e: self.canvas.configure(scrollregion=self.canvas.bbox("all")),
+        self.video_grid = VirtualVideoGrid(
+            middle, thumb_provider=self._get_thumbnail, on_layout=self._on_grid_layout, bg="#ffffff"
         )
-        self.canvas.bind_all("<MouseWheel>", self._on_mousewheel)
-        self.canvas.bind_all("<Button-4>", self._on_mousewheel)
-        self.canvas.bind_all("<Button-5>", self._on_mousewheel)
-        self.canvas.bind("<Configure>", self._on_canvas_configure)
+        self.video_grid.pack(fill="both", expand=True)
+        self.bind_all("<MouseWheel>", self._on_mousewheel)
+        self.bind_all("<Button-4>", self._on_mousewheel)
+        self.bind_all("<Button-5>", self._on_mousewheel)
 
         bottom = tk.Frame(self, bg="#f5f5f5")
         bottom.pack(fill="x", padx=10, pady=10)
@@ -264,138 +246,167 @@ class YouTubeDownloaderApp(tk.Tk):
 
     def _on_mousewheel(self, event):
         if event.num == 4 or event.delta > 0:
-            self.canvas.yview_scroll(-1, "units")
+            self.video_grid.scroll(-1)
         elif event.num == 5 or event.delta < 0:
-            self.canvas.yview_scroll(1, "units")
+            self.video_grid.scroll(1)
+
+    def _get_thumbnail(self, record):
+        photo = self.thumbnail_photos.get(record.video_id)
+        if photo is not None:
+            self.thumbnail_photos.move_to_end(record.video_id)
+            return photo
+        # Chỉ tải ảnh cho các ô đang hiển thị
+        if record.thumb_url and self.thumbnail_loader is not None:
+            self.thumbnail_loader.request(
+                record.thumb_url, lambda img: self.after(0, lambda: self._on_thumbnail_loaded(record, img)),
+                key=record.video_id,
+            )
+        return None
+
+    def _on_grid_layout(self, records):
+        # Ảnh trong khung nhìn được tải trước, ảnh của các ô đã cuộn qua bị hủy
+        if self.thumbnail_loader is None:
+            return
+        self.thumbnail_loader.prioritize(
+            [r.thumb_url for r in records if r.thumb_url and r.video_id not in self.thumbnail_photos]
+        )
 
-    def _on_canvas_configure(self, event):
-        canvas_width = event.width
-        num_columns = max(2, min(10, canvas_width // self.video_item_width))
-        if num_columns != self.current_columns:
-            self.current_columns = num_columns
-            self.update_grid_layout()
+    def _on_thumbnail_loaded(self, record, img):
+        from PIL import ImageTk
 
-    def update_grid_layout(self):
-        if not self.video_items:
-            return
-        for w in self.frame_videos.winfo_children():
-            w.grid_forget()
-        for index, item in enumerate(self.video_items):
-            item.grid(row=index // self.current_columns, column=index % self.current_columns, padx=10, pady=10, sticky="ew")
-        self.canvas.configure(scrollregion=self.canvas.bbox("all"))
+        photo = None
+        if img is not None:
+            photo = ImageTk.PhotoImage(img)
+            self.thumbnail_photos[record.video_id] = photo
+            while len(self.thumbnail_photos) > self.thumbnail_photos_max:
+                self.thumbnail_photos.popitem(last=False)
+        cell = self.video_grid.cell_for(record)
+        if cell is not None:
+            cell.set_thumbnail(photo, error=img is None)
 
     def _thread_fetch(self):
         self.fetch_btn.config(state="disabled")
-        threading.Thread(target=self.fetch_videos, daemon=True).start()
-
-    def clean_video_title(self, title):
-        return re.sub(r'#\S+', '', title).strip()
+        self.clear_videos()
+        # Luồng nền chỉ gửi dữ liệu qua hàng đợi; widget chỉ được cập nhật trong _drain_fetch trên luồng chính
+        channel = queue.Queue()
+        threading.Thread(
+            target=self.fetch_videos,
+            args=(self.url_entry.get().strip(), self.full_resync_var.get(), channel),
+            daemon=True,
+        ).start()
+        self.after(self.fetch_poll_ms, self._drain_fetch, channel)
 
     def search_videos(self, event=None):
-        query = self.search_entry.get().strip().lower()
-        if not query:
-            self.video_items = self.all_video_items.copy()
-        else:
-            self.video_items = [
-                item for item in self.all_video_items
-                if query in item.title.lower()
-            ]
-        self.update_grid_layout()
-        self._update_status(f"Đã lọc {len(self.video_items)} video")
-
-    def fetch_videos(self):
+        # Chờ người dùng ngừng gõ rồi mới lọc, tránh bố trí lại lưới sau mỗi phím
+        if self._search_after_id is not None:
+            self.after_cancel(self._search_after_id)
+        self._search_after_id = self.after(self.search_debounce_ms, self._apply_search)
+
+    def _apply_search(self):
+        self._search_after_id = None
+        view = self.store.filter(self.search_entry.get())
+        self.video_grid.set_records(view)
+        self._update_status(f"Đã lọc {len(view)} video")
+
+    def fetch_videos(self, channel_url, full_resync, channel):
         try:
-            channel_url = self.url_entry.get().strip()
-            self._update_status("Đang xác định URL…")
-            id_value, id_type = self.yt_api.get_channel_id(channel_url)
-            self._update_status("Đang tải thông tin…")
-            self.clear_videos()
-
-            thumbnail_executor = ThreadPoolExecutor(max_workers=4)
-
-            if id_type == "video":
-                item = self.yt_api.fetch_single_video(id_value)
-                v_id = item["id"]
-                s = item["snippet"]
-                title = s["title"]
-                thumb_url = s["thumbnails"].get("medium", {}).get("url") or s["thumbnails"].get("default", {}).get("url")
-                published_at = s["publishedAt"]
-                view_count = int(item["statistics"].get("viewCount", 0))
-
-                clean_title = self.clean_video_title(title)
-                video_item = VideoItem(
-                    self.frame_videos, video_id=v_id, title=clean_title, thumb_url=thumb_url,
-                    published_at=published_at, view_count=view_count
-                )
-                video_item.grid(row=0, column=0, padx=10, pady=10, sticky="ew")
-                video_item.load_thumbnail(thumbnail_executor)
-                self.video_items.append(video_item)
-                self.all_video_items.append(video_item)
+            sources = [source for source in re.split(r"[\s,]+", channel_url) if source]
+            if len(sources) > 1:
+                self._fetch_batch(sources, full_resync, channel)
             else:
-                items = self.yt_api.fetch_all_videos(id_value)
-                video_ids = [
-                    vid["id"]["videoId"] if "videoId" in vid["id"] else vid["snippet"]["resourceId"]["videoId"]
-                    for vid in items
-                ]
-
-                self._update_status("Đang lấy thông tin lượt xem…")
-                view_counts = self.yt_api.get_video_stats(video_ids)
-                total_videos = len(video_ids)
-                processed = 0
-                self.progress["maximum"] = total_videos
-                self.progress["value"] = 0
-
-                for index, vid in enumerate(items):
-                    s = vid["snippet"]
-                    v_id = video_ids[index]
-                    title = s["title"]
-                    thumb_url = s["thumbnails"].get("medium", {}).get("url") or s["thumbnails"].get("default", {}).get("url")
-                    published_at = s["publishedAt"]
-                    view_count = view_counts.get(v_id, 0)
-
-                    clean_title = self.clean_video_title(title)
-                    item = VideoItem(
-                        self.frame_videos, video_id=v_id, title=clean_title, thumb_url=thumb_url,
-                        published_at=published_at, view_count=view_count
-                    )
-                    item.grid(row=index // self.current_columns, column=index % self.current_columns, padx=10, pady=10, sticky="ew")
-                    item.load_thumbnail(thumbnail_executor)
-                    self.video_items.append(item)
-                    self.all_video_items.append(item)
-
-                    processed += 1
-                    self.progress["value"] = processed
-                    self.progress_label.config(text=f"{int(processed / total_videos * 100)}%")
-                    self.update_idletasks()
-
-            self.progress["value"] = 0
-            self.progress_label.config(text="")
-            self.sort_videos()
-            self._update_status(f"Đã tải {len(self.video_items)} video")
+                stream_records(
+                    self.yt_api, channel_url, lambda kind, payload: channel.put((kind, payload)),
+                    full_resync=full_resync,
+                )
+            channel.put(("done", None))
         except Exception as e:
-            messagebox.showerror("Lỗi", str(e))
-            self._update_status("Lỗi khi tải video")
             logger.exception(f"Lỗi khi fetch video: {str(e)}")
-        finally:
-            self.fetch_btn.config(state="normal")
+            channel.put(("error", str(e)))
+
+    def _fetch_batch(self, sources, full_resync, channel):
+        # Nhiều kênh cách nhau bởi dấu cách/dấu phẩy: lấy song song, mỗi kênh hiện lên khi xong
+        finished = 0
+        lock = threading.Lock()
+
+        def on_progress(source, state, detail):
+            nonlocal finished
+            if state in ("done", "error", "skipped"):
+                with lock:
+                    finished += 1
+            text = {"resolved": "đã xác định kênh", "page": f"{detail} video", "done": f"xong {detail} video",
+                    "error": f"lỗi: {detail}", "skipped": f"bỏ qua: {detail}"}[state]
+            channel.put(("status", f"Kênh {finished}/{len(sources)} — {source}: {text}"))
+
+        results = fetch_channel_batch(
+            self.yt_api, sources, workers=int(self.config_data.get("fetch_workers", 8)), full_resync=full_resync,
+            on_progress=on_progress, on_records=lambda records: channel.put(("records", records)),
+        )
+        errors = [f"{source}: {error}" for source, _, error in results if error]
+        if errors:
+            logger.error(f"Lỗi khi lấy {len(errors)}/{len(sources)} kênh: {errors}")
+        if len(errors) == len(sources):
+            raise Exception("\n".join(errors))
+
+    def _drain_fetch(self, channel):
+        # Gộp mọi trang/lượt xem đến trong nhịp này rồi bố trí lại lưới một lần
+        records, view_counts, finished = [], {}, None
+        try:
+            while finished is None:
+                kind, payload = channel.get_nowait()
+                if kind == "records":
+                    records += payload
+                elif kind == "stats":
+                    view_counts.update(payload)
+                elif kind == "status":
+                    self._update_status(payload)
+                else:
+                    finished = (kind, payload)
+        except queue.Empty:
+            pass
+
+        changed = False
+        if records:
+            paths = self.history.downloaded([r.video_id for r in records], self.download_mode.get())
+            for record in records:
+                if record.video_id in paths:
+                    record.status, record.file_path = "done", paths[record.video_id]
+            self.store.add_records(records)
+            changed = True
+        if view_counts and self.store.update_view_counts(view_counts):
+            changed = changed or self.store.sort_mode == "popular"
+        if changed:
+            self.video_grid.set_records(self.store.apply(), keep_scroll=True)
+
+        if finished is None:
+            if records:
+                self._update_status(f"Đang tải danh sách… {len(self.store)} video")
+            self.after(self.fetch_poll_ms, self._drain_fetch, channel)
+            return
+        kind, payload = finished
+        self.fetch_btn.config(state="normal")
+        logger.info(f"Số liệu API: {self.yt_api.metrics_summary()}")
+        if kind == "error":
+            messagebox.showerror("Lỗi", payload)
+            self._update_status("Lỗi khi tải video")
+        else:
+            self._update_status(f"Đã tải {len(self.store)} video")
+
+    def _mark_downloaded(self):
+        if self.history is None:
+            return
+        # Chỉ tra SQLite và stat file: video đã tải hiện "Đã tải" ngay, không cần truy cập mạng
+        paths = self.history.downloaded([r.video_id for r in self.store.records], self.download_mode.get())
+        self.store.mark_downloaded(paths)
+        self.video_grid.refresh()
 
     def clear_videos(self):
-        for w in self.frame_videos.winfo_children():
-            w.grid_forget()
-            w.destroy()
-        self.video_items.clear()
-        self.all_video_items.clear()
+        if self.thumbnail_loader is not None:
+            self.thumbnail_loader.cancel_all()
+        self.video_grid.set_records(self.store.clear())
 
     def sort_videos(self):
         mode = self.sort_var.get()
-        if mode == "latest":
-            self.video_items.sort(key=lambda w: w.published_at, reverse=True)
-        elif mode == "oldest":
-            self.video_items.sort(key=lambda w: w.published_at)
-        elif mode == "popular":
-            self.video_items.sort(key=lambda w: w.view_count, reverse=True)
-
-        self.update_grid_layout()
+        self.video_grid.set_records(self.store.sort(mode))
         self._update_status(f"Đã sắp xếp theo {mode}")
 
     def select_folder(self):
@@ -405,27 +416,59 @@ class YouTubeDownloaderApp(tk.Tk):
             self.path_label.config(text=f"Lưu tại: {d}")
 
     def select_all(self):
-        for item in self.video_items:
-            item.selected.set(True)
+        self.store.set_selected(True)
+        self.video_grid.refresh()
         self._update_status("Đã chọn tất cả video")
 
     def deselect_all(self):
-        for item in self.video_items:
-            item.selected.set(False)
+        self.store.set_selected(False)
+        self.video_grid.refresh()
         self._update_status("Đã hủy chọn tất cả video")
 
-    def download_task(self, video_item, result_queue, progress_queue):
-        success, file_path = self._download(video_item.url, progress_queue)
-        result_queue.put((video_item, success, file_path))
+    def download_task(self, job, extra_opts, progress_callback):
+        # Trả về Future khi video còn chờ ffmpeg; lỗi được báo trong check_queues trên luồng giao diện
+        return run_job(
+            self.download_queue, job, self.cancel_event, progress_callback=progress_callback,
+            extra_opts=extra_opts, post_stage=self.post_stage, history=self.history,
+        )
 
     def download_selected(self):
-        sel = [w for w in self.video_items if w.is_selected()]
+        sel = self.store.selected()
         if not sel:
             messagebox.showinfo("Thông báo", "Bạn chưa chọn video nào.")
             return
 
+        # Bỏ qua video đã tải ở chế độ này (trạng thái lấy từ lịch sử lúc fetch)
+        skipped = [r for r in sel if r.status == "done"]
+        sel = [r for r in sel if r.status != "done"]
+        if not sel:
+            messagebox.showinfo("Thông báo", f"Cả {len(skipped)} video đã chọn đều đã được tải.")
+            return
+
+        # Ghi job xuống hàng đợi trên đĩa trước khi tải để có thể tải tiếp sau khi tắt/crash
+        mode = self.download_mode.get()
+        jobs = [
+            self.download_queue.get(self.download_queue.add(r.url, mode, self.download_path, r.video_id, r.title))
+            for r in sel
+        ]
+        self._start_downloads(jobs)
+
+    def _resume_pending_downloads(self):
+        jobs = self.download_queue.pending()
+        if not jobs:
+            return
+        if messagebox.askyesno(
+            "Tiếp tục tải", f"Còn {len(jobs)} video chưa tải xong từ lần trước. Tiếp tục tải?"
+        ):
+            self._start_downloads(jobs)
+            return
+        # Không tải tiếp: bỏ các job này và xóa file tạm của chúng để không hỏi lại ở lần mở sau
+        self.download_queue.cancel([job["job_id"] for job in jobs])
+        threading.Thread(target=self.download_queue.clean_abandoned, daemon=True).start()
+        self._update_status(f"Đã bỏ {len(jobs)} video chưa tải xong")
+
+    def _start_downloads(self, sel):
         self.cancel_event.clear()  # Reset cờ hủy
-        self.download_futures = []  # Reset danh sách futures
         self._update_status(f"Đang tải 0/{len(sel)} video…")
         self.download_btn.config(text="Hủy tải", command=self.cancel_download, state="normal")
         self.progress["maximum"] = 100
@@ -433,46 +476,64 @@ class YouTubeDownloaderApp(tk.Tk):
         self.progress_label.config(text="0%")
 
         result_queue = queue.Queue()
-        progress_queue = queue.Queue()
+        self.download_jobs = [job["job_id"] for job in sel]
 
-        total_bytes = {w.url: 0 for w in sel}
-        downloaded_bytes = {w.url: 0 for w in sel}
+        # Luồng tải ghi tiến độ vào slot riêng, luồng UI chỉ xử lý các video vừa thay đổi theo nhịp cố định
+        aggregator = ProgressAggregator(job["url"] for job in sel)
+        records = {job["url"]: self.store.get(job["video_id"]) for job in sel}
+        tick_ms = 1000 // self.progress_fps
         completed_videos = 0
 
+        # Số luồng tải tự điều chỉnh theo thông lượng, job nhỏ (audio) được tải trước
+        scheduler = AdaptiveScheduler(
+            self.download_task,
+            max_workers=int(self.config_data.get("max_download_workers", 6)),
+            bandwidth_limit=parse_rate(self.config_data.get("bandwidth_limit")),
+            cancel_event=self.cancel_event,
+            max_post_pending=2 * self.post_stage.workers,
+        )
+
+        def on_progress(msg_type, url, *data):
+            if msg_type == "progress":
+                aggregator.update(url, *data)
+
         def download_in_thread():
-            with ThreadPoolExecutor(max_workers=4) as executor:
-                futures = [executor.submit(self.download_task, w, result_queue, progress_queue) for w in sel]
-                self.download_futures = futures
-                for future in futures:
-                    try:
-                        future.result()
-                    except Exception as e:
-                        logger.error(f"Lỗi trong tác vụ tải: {str(e)}")
+            scheduler.run(
+                sel,
+                progress_callback=on_progress,
+                on_result=lambda job, success, file_path, error: result_queue.put((job, success, file_path, error)),
+            )
+            logger.info(f"Thời gian theo công đoạn: {self.post_stage.timer.snapshot()}")
+            # Các luồng tải đã dừng hẳn: lúc này mới xóa file .part của các job bị hủy
+            if self.cancel_event.is_set():
+                self.download_queue.clean_abandoned()
 
         def check_queues():
             nonlocal completed_videos
-            try:
-                while True:
-                    msg_type, url, *data = progress_queue.get_nowait()
-                    if msg_type == "progress":
-                        downloaded, total = data
-                        downloaded_bytes[url] = downloaded
-                        total_bytes[url] = max(total_bytes[url], total)
-                        total_sum = sum(total_bytes.values())
-                        downloaded_sum = sum(downloaded_bytes.values())
-                        if total_sum > 0:
-                            percent = min(100, (downloaded_sum / total_sum) * 100)
-                            self.progress["value"] = percent
-                            self.progress_label.config(text=f"{int(percent)}%")
-                    elif msg_type == "finished":
-                        downloaded_bytes[url] = total_bytes.get(url, 0)
-            except queue.Empty:
-                pass
+            changed = aggregator.drain()
+            for url, slot in changed:
+                record = records.get(url)
+                if record is not None and record.status in ("idle", "downloading"):
+                    record.status = "downloading"
+                    record.progress = format_progress(slot.downloaded, slot.total, slot.speed, slot.eta)
+                    self.video_grid.update_record(record)
+            if changed:
+                self.progress["value"] = aggregator.percent
+                self.progress_label.config(text=f"{int(aggregator.percent)}%")
 
             try:
                 while True:
-                    video_item, success, file_path = result_queue.get_nowait()
-                    video_item.update_status(success, file_path)
+                    job, success, file_path, error = result_queue.get_nowait()
+                    if error:
+                        messagebox.showerror("Lỗi", error)
+                    aggregator.finish(job["url"])
+                    record = records.get(job["url"])
+                    if record is not None:
+                        record.status = "done" if success else "error"
+                        record.progress = None
+                        if success:
+                            record.file_path = file_path  # Lưu đường dẫn file
+                        self.video_grid.update_record(record)
                     completed_videos += 1
                     self._update_status(f"Đang tải {completed_videos}/{len(sel)} video…")
                     if completed_videos == len(sel) or self.cancel_event.is_set():
@@ -485,16 +546,14 @@ class YouTubeDownloaderApp(tk.Tk):
                 self._finalize_download()
                 return
 
-            self.after(100, check_queues)
+            self.after(tick_ms, check_queues)
 
         threading.Thread(target=download_in_thread, daemon=True).start()
-        self.after(100, check_queues)
+        self.after(tick_ms, check_queues)
 
     def cancel_download(self):
-        self.cancel_event.set()  # Đặt cờ hủy
-        for future in self.download_futures:
-            future.cancel()  # Hủy các tác vụ đang chờ
-        self._clean_partial_files()  # Dọn file tải dở
+        self.cancel_event.set()  # Đặt cờ hủy, bộ điều phối ngừng khởi chạy job mới
+        self.download_queue.cancel(self.download_jobs)  # File tải dở được dọn khi các luồng tải dừng
         self._update_status("Đã hủy tải")
         self._finalize_download()
 
@@ -502,122 +561,17 @@ class YouTubeDownloaderApp(tk.Tk):
         self.download_btn.config(text="Tải video đã chọn", command=self.download_selected, state="normal")
         self.progress["value"] = 0
         self.progress_label.config(text="")
-        self.download_futures = []
+        self.download_jobs = []
         # Cập nhật trạng thái video: giữ "Đã tải", đặt lại các trạng thái khác thành "Chưa tải"
-        for item in self.video_items:
-            if item.lbl_status.cget("text") not in ["Đã tải"]:
-                item.lbl_status.config(text="Chưa tải", fg="gray")
-                item.file_path = None
-
-    def _clean_partial_files(self):
-        try:
-            for file in os.listdir(self.download_path):
-                if file.endswith(('.part', '.ytdl', '.temp')):
-                    file_path = os.path.join(self.download_path, file)
-                    os.remove(file_path)
-                    logger.info(f"Đã xóa file tạm: {file_path}")
-        except Exception as e:
-            logger.error(f"Lỗi khi dọn file tạm: {str(e)}")
-
-    def _download(self, url, progress_queue):
-        if self.cancel_event.is_set():
-            return False, None
-
-        def progress_hook(d):
-            if self.cancel_event.is_set():
-                return
-            if d["status"] == "downloading":
-                downloaded = d.get("downloaded_bytes", 0)
-                total = d.get("total_bytes") or d.get("total_bytes_estimate", 0)
-                if total > 0:
-                    progress_queue.put(("progress", url, downloaded, total))
-            elif d["status"] == "finished":
-                progress_queue.put(("finished", url))
-
-        base_dir = getattr(sys, '_MEIPASS', os.path.dirname(os.path.abspath(__file__)))
-        ffmpeg_name = 'ffmpeg.exe' if sys.platform == 'win32' else 'ffmpeg'
-        ffmpeg_path = os.path.join(base_dir, ffmpeg_name)
-        if not os.path.exists(ffmpeg_path):
-            logger.error(f"FFmpeg không tìm thấy tại: {ffmpeg_path}")
-            messagebox.showerror("Lỗi", "FFmpeg không tìm thấy. Đảm bảo ffmpeg.exe được nhúng trong build.")
-            return False, None
-
-        mode = self.download_mode.get()
-        opts = {
-            "outtmpl": os.path.join(self.download_path, "%(title)s.%(ext)s"),
-            "quiet": True,
-            "noplaylist": True,
-            "restrictfilenames": True,
-            "retries": 10,  # Tăng số lần thử lại
-            "fragment_retries": 10,  # Tăng thử lại cho đoạn
-            "socket_timeout": 30,  # Timeout 30 giây
-            "http_chunk_size": 10485760,  # 10MB chunk để ổn định tải 4K
-            "progress_hooks": [progress_hook],
-            "ffmpeg_location": ffmpeg_path,
-        }
-
-        if mode == "video+audio":
-            opts.update({
-                "format": "bestvideo+bestaudio/best",
-                "merge_output_format": "mp4"
-            })
-        elif mode == "video":
-            opts.update({"format": "bestvideo"})
-        elif mode == "audio":
-            opts.update({
-                "format": "bestaudio[ext=m4a]",
-                "postprocessors": [{
-                    "key": "FFmpegExtractAudio",
-                    "preferredcodec": "mp3",
-                    "preferredquality": "320",
-                }],
-            })
-
-        try:
-            with yt_dlp.YoutubeDL(opts) as ydl:
-                info = ydl.extract_info(url, download=False)
-                file_path = ydl.prepare_filename(info)
-                if os.path.exists(file_path):
-                    logger.info(f"Video đã tồn tại: {file_path}")
-                    self.history[url] = {"file_path": file_path, "timestamp": time.time()}
-                    self.save_history()
-                    return True, file_path
-                if self.cancel_event.is_set():
-                    return False, None
-                info = ydl.extract_info(url, download=True)
-                file_path = ydl.prepare_filename(info)
-            logger.info(f"Tải thành công: {url}")
-            self.history[url] = {"file_path": file_path, "timestamp": time.time()}
-            self.save_history()
-            return True, file_path
-        except Exception as e:
-            logger.error(f"Lỗi tải video {url}: {str(e)}")
-            messagebox.showerror("Lỗi", f"Lỗi tải video: {str(e)}")
-            return False, None
-
-    def load_history(self):
-        try:
-            with open(get_resource_path("download_history.json"), "r", encoding="utf-8") as f:
-                return json.load(f)
-        except FileNotFoundError:
-            return {}
-        except Exception as e:
-            logger.error(f"Lỗi khi đọc lịch sử tải: {str(e)}")
-            return {}
-
-    def save_history(self):
-        try:
-            with open(get_resource_path("download_history.json"), "w", encoding="utf-8") as f:
-                json.dump(self.history, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            logger.error(f"Lỗi khi lưu lịch sử tải: {str(e)}")
+        self.store.reset_unfinished()
+        self.video_grid.refresh()
 
     def _update_status(self, msg):
         self.status_label.config(text=f"Trạng thái: {msg}")
 
     def load_config(self):
         try:
-            with open(get_resource_path("config.json"), "r", encoding="utf-8") as f:
+            with open(get_data_path("config.json"), "r", encoding="utf-8") as f:
                 return json.load(f)
         except FileNotFoundError:
             return {}
@@ -626,16 +580,28 @@ class YouTubeDownloaderApp(tk.Tk):
             return {}
 
     def save_config(self):
-        config = {"geometry": self.geometry()}
+        config = dict(self.config_data, geometry=self.geometry())
         try:
-            with open(get_resource_path("config.json"), "w", encoding="utf-8") as f:
+            with open(get_data_path("config.json"), "w", encoding="utf-8") as f:
                 json.dump(config, f, ensure_ascii=False, indent=2)
         except Exception as e:
             logger.error(f"Lỗi khi lưu config: {str(e)}")
 
     def on_closing(self):
-        self.cancel_event.set()  # Hủy tải nếu đóng ứng dụng
-        self._clean_partial_files()
+        # Dừng tải nếu đóng ứng dụng; job đang chạy giữ file .part và được tải tiếp ở lần mở sau
+        self.cancel_event.set()
+        if self.thumbnail_loader is not None:
+            self.thumbnail_loader.shutdown()
+        self.post_stage.shutdown()
+        metrics_file = self.config_data.get("metrics_file")
+        if metrics_file and self.yt_api is not None:
+            try:
+                self.yt_api.export_metrics(metrics_file)
+            except Exception as e:
+                logger.error(f"Lỗi khi ghi số liệu API: {str(e)}")
+        if self.yt_api is not None:
+            # Luồng fetch có thể còn chạy nên không đóng cache, chỉ ghi quota đang giữ trong bộ nhớ
+            self.yt_api.quota.flush()
         self.save_config()
         self.destroy()
 
@@ -0,0 +1,108 @@
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+POST_ACTIONS = ("merge", "extract_audio")
+
+
+class PostStep:
+    """Việc ffmpeg cần làm sau khi tải xong: ghép video+audio thành mp4 hoặc chuyển audio sang mp3"""
+
+    __slots__ = ("action", "inputs", "output")
+
+    def __init__(self, action, inputs, output):
+        if action not in POST_ACTIONS:
+            raise ValueError(f"Bước xử lý không hợp lệ: {action}")
+        self.action = action
+        self.inputs = list(inputs)
+        self.output = output
+
+    def command(self, ffmpeg_path, output):
+        cmd = [ffmpeg_path, "-y", "-loglevel", "error", "-nostdin"]
+        for path in self.inputs:
+            cmd += ["-i", path]
+        if self.action == "merge":
+            # Chỉ đóng gói lại, không mã hóa lại -> nhanh và không giảm chất lượng
+            cmd += ["-map", "0:v:0", "-map", "1:a:0", "-c", "copy", "-movflags", "+faststart", "-f", "mp4"]
+        else:
+            cmd += ["-vn", "-c:a", "libmp3lame", "-b:a", "320k", "-f", "mp3"]
+        return cmd + [output]
+
+
+def run_post_step(step, ffmpeg_path):
+    """Chạy ffmpeg cho một PostStep; xóa file nguồn khi thành công, trả về đường dẫn file kết quả"""
+    tmp_output = step.output + ".tmp"
+    creationflags = subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0
+    proc = subprocess.run(
+        step.command(ffmpeg_path, tmp_output), capture_output=True, text=True, creationflags=creationflags
+    )
+    if proc.returncode != 0:
+        try:
+            os.remove(tmp_output)
+        except FileNotFoundError:
+            pass
+        raise Exception(f"ffmpeg lỗi ({proc.returncode}): {proc.stderr.strip()[-500:]}")
+    os.replace(tmp_output, step.output)
+    for path in step.inputs:
+        try:
+            os.remove(path)
+        except Exception as e:
+            logger.error(f"Lỗi khi xóa file nguồn {path}: {str(e)}")
+    return step.output
+
+
+class StageTimer:
+    """Cộng dồn thời gian của từng công đoạn (download, queue, postprocess), an toàn đa luồng"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = {}
+
+    def add(self, stage, seconds):
+        with self._lock:
+            count, total = self._totals.get(stage, (0, 0.0))
+            self._totals[stage] = (count + 1, total + seconds)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                stage: {"count": count, "seconds": round(total, 3)}
+                for stage, (count, total) in self._totals.items()
+            }
+
+
+class PostProcessingStage:
+    """Công đoạn ffmpeg chạy trên pool riêng (số luồng theo số lõi CPU), tách khỏi các luồng tải mạng.
+
+    Luồng tải chỉ cần đưa PostStep vào hàng đợi rồi trả chỗ cho video tiếp theo.
+    """
+
+    def __init__(self, workers=None, timer=None):
+        self.workers = workers or os.cpu_count() or 2
+        self.timer = timer or StageTimer()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="postprocess")
+
+    def submit(self, step, ffmpeg_path):
+        """Xếp việc ffmpeg vào hàng đợi; trả về Future cho đường dẫn file kết quả"""
+        queued_at = time.monotonic()
+
+        def work():
+            started = time.monotonic()
+            self.timer.add("queue", started - queued_at)
+            try:
+                return run_post_step(step, ffmpeg_path)
+            finally:
+                elapsed = time.monotonic() - started
+                self.timer.add("postprocess", elapsed)
+                logger.info(f"Xử lý {step.action} xong sau {elapsed:.1f}s: {step.output}")
+
+        return self._executor.submit(work)
+
+    def shutdown(self, wait=False):
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
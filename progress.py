@@ -0,0 +1,83 @@
+import collections
+import time
+
+
+class ProgressSlot:
+    """Tiến độ của một video; chỉ luồng tải của video đó ghi vào"""
+
+    __slots__ = ("downloaded", "total", "speed", "eta", "dirty")
+
+    def __init__(self):
+        self.downloaded = 0
+        self.total = 0
+        self.speed = None
+        self.eta = None
+        self.dirty = False
+
+
+class ProgressAggregator:
+    """Gộp tiến độ tải cho giao diện mà không cần lock.
+
+    Luồng tải chỉ ghi vào slot của mình và đánh dấu slot "bẩn" (mỗi slot vào hàng đợi tối đa một lần giữa
+    hai nhịp). Luồng UI gọi drain() theo nhịp cố định, cập nhật tổng đang chạy theo phần chênh lệch, nên
+    công việc mỗi nhịp chỉ phụ thuộc số video vừa thay đổi, không phụ thuộc số message hay tổng số video.
+    """
+
+    def __init__(self, keys=()):
+        self._slots = {key: ProgressSlot() for key in keys}
+        self._dirty = collections.deque()  # append/popleft của deque an toàn giữa các luồng
+        # Chỉ luồng UI đọc/ghi các giá trị dưới đây
+        self._seen = {}  # key -> (downloaded, total) đã cộng vào tổng
+        self.downloaded = 0
+        self.total = 0
+
+    def slot(self, key):
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = self._slots.setdefault(key, ProgressSlot())
+        return slot
+
+    def update(self, key, downloaded, total, speed=None, eta=None):
+        """Gọi trên luồng tải cho mỗi chunk; chỉ ghi vài thuộc tính"""
+        slot = self.slot(key)
+        slot.downloaded = downloaded
+        slot.total = max(slot.total, total)
+        slot.speed = speed
+        slot.eta = eta
+        if not slot.dirty:
+            slot.dirty = True
+            self._dirty.append(key)
+
+    def finish(self, key):
+        slot = self.slot(key)
+        self.update(key, slot.total, slot.total)
+
+    def drain(self):
+        """Gọi trên luồng UI mỗi nhịp; trả về [(key, slot)] của các video đã thay đổi kể từ nhịp trước"""
+        changed = []
+        for _ in range(len(self._dirty)):
+            key = self._dirty.popleft()
+            slot = self._slots[key]
+            # Xóa cờ trước khi đọc: lần ghi xảy ra trong lúc đọc sẽ đưa key vào hàng đợi lại
+            slot.dirty = False
+            downloaded, total = slot.downloaded, slot.total
+            old_downloaded, old_total = self._seen.get(key, (0, 0))
+            self.downloaded += downloaded - old_downloaded
+            self.total += total - old_total
+            self._seen[key] = (downloaded, total)
+            changed.append((key, slot))
+        return changed
+
+    @property
+    def percent(self):
+        return min(100.0, self.downloaded / self.total * 100) if self.total > 0 else 0.0
+
+
+def format_progress(downloaded, total, speed=None, eta=None):
+    """'45% · 2.3 MB/s · còn 0:12' cho nhãn trạng thái của từng video"""
+    parts = [f"{int(downloaded / total * 100) if total else 0}%"]
+    if speed:
+        parts.append(f"{speed / 1024 / 1024:.1f} MB/s")
+    if eta is not None:
+        parts.append(f"còn {time.strftime('%H:%M:%S' if eta >= 3600 else '%M:%S', time.gmtime(eta))}")
+    return " · ".join(parts)
@@ -0,0 +1,87 @@
+import re
+import unicodedata
+from bisect import bisect_left, insort
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def normalize_text(text):
+    """Chuẩn hóa để tìm kiếm: chữ thường, bỏ dấu tiếng Việt (đ -> d)"""
+    text = unicodedata.normalize("NFD", text.casefold())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return text.replace("đ", "d")
+
+
+def tokenize(text):
+    return _TOKEN_RE.findall(normalize_text(text))
+
+
+class TitleIndex:
+    """Chỉ mục tiêu đề dựng một lần cho mỗi lần fetch; mỗi từ trong truy vấn khớp tiền tố một từ trong tiêu đề"""
+
+    def __init__(self, titles):
+        self._tokens = [tuple(set(tokenize(title))) for title in titles]
+        postings = {}
+        for position, tokens in enumerate(self._tokens):
+            for token in tokens:
+                postings.setdefault(token, []).append(position)
+        self._postings = postings
+        self._vocab = sorted(postings)
+        self._last_query = None
+        self._last_result = None
+
+    def add(self, titles):
+        """Thêm tiêu đề mới vào cuối, vị trí tiếp nối các tiêu đề đã có"""
+        for title in titles:
+            position = len(self._tokens)
+            tokens = tuple(set(tokenize(title)))
+            self._tokens.append(tokens)
+            for token in tokens:
+                if token not in self._postings:
+                    self._postings[token] = []
+                    insort(self._vocab, token)
+                self._postings[token].append(position)
+        self._last_query = self._last_result = None
+
+    def __len__(self):
+        return len(self._tokens)
+
+    def _prefix_positions(self, prefix):
+        vocab = self._vocab
+        result = set()
+        i = bisect_left(vocab, prefix)
+        while i < len(vocab) and vocab[i].startswith(prefix):
+            result.update(self._postings[vocab[i]])
+            i += 1
+        return result
+
+    def _extends_last(self, query_tokens):
+        # Truy vấn mới chỉ gõ thêm ký tự/từ so với truy vấn trước -> kết quả là tập con
+        last = self._last_query
+        if last is None or len(query_tokens) < len(last):
+            return False
+        return all(new.startswith(old) for old, new in zip(last, query_tokens))
+
+    def _record_matches(self, position, query_tokens):
+        tokens = self._tokens[position]
+        return all(any(t.startswith(q) for t in tokens) for q in query_tokens)
+
+    def search(self, query):
+        """Trả về tập vị trí khớp, hoặc None nếu truy vấn rỗng (khớp tất cả)"""
+        query_tokens = tokenize(query)
+        if not query_tokens:
+            self._last_query = self._last_result = None
+            return None
+        if self._extends_last(query_tokens):
+            result = {p for p in self._last_result if self._record_matches(p, query_tokens)}
+        else:
+            result = None
+            # Bắt đầu từ từ dài nhất vì thường có ít kết quả nhất
+            for token in sorted(query_tokens, key=len, reverse=True):
+                positions = self._prefix_positions(token)
+                result = positions if result is None else result & positions
+                if not result:
+                    break
+        self._last_query = query_tokens
+        self._last_result = result
+        return result
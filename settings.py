@@ -0,0 +1,53 @@
+import os
+import sys
+
+
+# Xử lý .env trong .exe
+def get_resource_path(relative_path):
+    """Lấy đường dẫn tài nguyên trong .exe hoặc khi chạy trực tiếp"""
+    try:
+        base_path = sys._MEIPASS
+    except AttributeError:
+        base_path = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(base_path, relative_path)
+
+
+APP_DIR_NAME = "YouTubeChannelDownloader"
+
+
+def get_data_path(relative_path):
+    """Đường dẫn cho dữ liệu cần giữ qua các lần chạy (hàng đợi, lịch sử, cache, config).
+
+    Bản .exe onefile giải nén vào thư mục tạm (_MEIPASS) bị xóa khi thoát, nên dữ liệu được ghi vào
+    %LOCALAPPDATA% (hoặc ~/.local/share); khi chạy trực tiếp thì ghi cạnh mã nguồn như trước.
+    """
+    if getattr(sys, "frozen", False):
+        base = os.getenv("LOCALAPPDATA") or os.getenv("XDG_DATA_HOME") or os.path.join(
+            os.path.expanduser("~"), ".local", "share"
+        )
+        base_path = os.path.join(base, APP_DIR_NAME)
+    else:
+        base_path = os.path.dirname(os.path.abspath(__file__))
+    os.makedirs(base_path, exist_ok=True)
+    return os.path.join(base_path, relative_path)
+
+
+def _read_keys():
+    # YOUTUBE_API_KEYS: nhiều key (mỗi key một project) phân cách bằng dấu phẩy; YOUTUBE_API_KEY: một key
+    value = os.getenv("YOUTUBE_API_KEYS") or os.getenv("YOUTUBE_API_KEY") or ""
+    return [key.strip() for key in value.split(",") if key.strip()]
+
+
+def load_api_keys():
+    """Đọc danh sách API key từ biến môi trường, .env kèm trong .exe hoặc .env của thư mục hiện tại"""
+    keys = _read_keys()
+    if not keys:
+        # Chỉ nạp python-dotenv khi thật sự cần đọc file .env
+        from dotenv import find_dotenv, load_dotenv
+
+        env_path = get_resource_path(".env")
+        load_dotenv(env_path if os.path.exists(env_path) else find_dotenv(usecwd=True))
+        keys = _read_keys()
+    if not keys:
+        raise ValueError("YOUTUBE_API_KEY không được cấu hình trong .env")
+    return keys
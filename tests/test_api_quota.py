@@ -0,0 +1,73 @@
+import threading
+
+import pytest
+
+from api_quota import KeyPool, QuotaExceeded, key_id
+from cache_store import CacheStore
+
+METHOD = "youtube.videos.list"
+
+
+@pytest.fixture
+def store(tmp_path):
+    cache = CacheStore(str(tmp_path / "cache.db"))
+    yield cache
+    cache.close()
+
+
+def use(pool, times=1):
+    used = []
+    for _ in range(times):
+        api_key, _ = pool.acquire(METHOD)
+        pool.release(api_key)
+        used.append(api_key.key)
+    return used
+
+
+def test_fails_over_when_local_budget_is_spent():
+    pool = KeyPool(["a", "b"], daily_limit=2, rate=0)
+    assert sorted(use(pool, 4)) == ["a", "a", "b", "b"]
+    with pytest.raises(QuotaExceeded):
+        use(pool)
+    assert pool.used == 4 and pool.remaining() == 0
+
+
+def test_penalized_key_is_skipped_and_cooldown_persists(store):
+    pool = KeyPool(["a", "b"], daily_limit=100, store=store, rate=0)
+    pool.penalize(pool.keys[0], "quotaExceeded")
+    assert use(pool, 3) == ["b", "b", "b"]
+
+    reopened = KeyPool(["a", "b"], daily_limit=100, store=store, rate=0)
+    status = {item["key"]: item for item in reopened.status()}
+    assert status[key_id("a")]["reason"] == "quotaExceeded"
+    assert status[key_id("b")]["cooldown_until"] is None
+    assert use(reopened) == ["b"]
+
+
+def test_all_keys_in_quota_cooldown_raise():
+    pool = KeyPool(["a", "b"], daily_limit=0, rate=0)
+    for api_key in pool.keys:
+        pool.penalize(api_key, "dailyLimitExceeded")
+    with pytest.raises(QuotaExceeded):
+        use(pool)
+
+
+def test_concurrent_calls_spread_over_keys():
+    pool = KeyPool(["a", "b", "c"], daily_limit=0, rate=0)
+    held = [pool.acquire(METHOD)[0] for _ in range(3)]
+    assert sorted(api_key.key for api_key in held) == ["a", "b", "c"]
+    for api_key in held:
+        pool.release(api_key)
+
+
+def test_used_quota_is_flushed_in_batches_and_reloaded(store):
+    pool = KeyPool(["a", "b"], daily_limit=100, store=store, rate=0, flush_interval=3600)
+    threads = [threading.Thread(target=use, args=(pool, 5)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # Chưa tới flush_interval: chưa ghi gì xuống đĩa
+    assert store.get_state(f"quota_{key_id('a')}") is None
+    pool.flush()
+    assert KeyPool(["a", "b"], daily_limit=100, store=store, rate=0).used == 20
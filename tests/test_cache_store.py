@@ -0,0 +1,69 @@
+import time
+
+import pytest
+
+from cache_store import CacheStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    cache = CacheStore(str(tmp_path / "cache.db"), ttl=60, max_bytes=1000)
+    yield cache
+    cache.close()
+
+
+def test_ttl_marks_entries_stale_but_keeps_them(store, monkeypatch):
+    store.set("a", {"x": 1}, etag="e1")
+    store.set("short", 1, ttl=10)
+    assert store.get("a") == ({"x": 1}, "e1")
+    later = time.time() + 30
+    monkeypatch.setattr(time, "time", lambda: later)
+    assert store.get("short") == (None, None)
+    entry = store.get_entry("short")
+    assert entry["fresh"] is False and entry["data"] == 1
+    assert store.get("a") == ({"x": 1}, "e1")
+
+
+def test_touch_renews_ttl(store, monkeypatch):
+    store.set("a", 1, ttl=10)
+    later = time.time() + 30
+    monkeypatch.setattr(time, "time", lambda: later)
+    store.touch("a", etag="e2")
+    assert store.get("a") == (1, "e2")
+
+
+def test_evicts_least_recently_used_down_to_90_percent(tmp_path):
+    evicted = []
+    store = CacheStore(str(tmp_path / "cache.db"), max_bytes=1000, on_evict=evicted.append)
+    value = "x" * 198  # 200 byte sau khi mã hóa JSON
+    for i in range(5):
+        store.set(f"k{i}", value)
+        time.sleep(0.01)
+    store.get_entries(["k0"])  # k0 vừa được đọc -> không bị xóa
+    store.set("k5", value)
+    assert evicted == ["k1", "k2"]
+    assert store.get("k0")[0] == value
+    assert store._total_bytes <= 900
+    store.close()
+
+
+def test_state_survives_eviction_and_reopen(tmp_path):
+    path = str(tmp_path / "cache.db")
+    store = CacheStore(path, max_bytes=500)
+    store.set_states([("quota_a", {"day": "2024-01-01", "used": 7})])
+    for i in range(20):
+        store.set(f"k{i}", "x" * 100)
+    store.close()
+    store = CacheStore(path, max_bytes=500)
+    assert store.get_state("quota_a") == {"day": "2024-01-01", "used": 7}
+    assert store.get_state("missing") is None
+    store.close()
+
+
+def test_update_data_keeps_etag_and_timestamp(store):
+    store.set("a", [1, 2, 3], etag="e")
+    before = store.get_entry("a")
+    assert store.update_data("a", [1]) == 3
+    after = store.get_entry("a")
+    assert (after["data"], after["etag"], after["timestamp"]) == ([1], "e", before["timestamp"])
+    assert store.update_data("missing", 1) is None
@@ -0,0 +1,67 @@
+import functools
+import http.server
+import os
+import threading
+
+import pytest
+
+import download_core
+from download_core import Downloader, ExtractionCache
+
+SEGMENTS = 6
+
+
+@pytest.fixture
+def hls_url(tmp_path):
+    """Luồng HLS tĩnh nhiều đoạn, phục vụ bằng http.server trên localhost"""
+    root = tmp_path / "hls"
+    root.mkdir()
+    lines = ["#EXTM3U", "#EXT-X-VERSION:3", "#EXT-X-TARGETDURATION:2", "#EXT-X-MEDIA-SEQUENCE:0"]
+    for i in range(SEGMENTS):
+        lines += ["#EXTINF:2.0,", f"seg{i}.ts"]
+        # Gói MPEG-TS 188 byte bắt đầu bằng sync byte 0x47
+        (root / f"seg{i}.ts").write_bytes((b"\x47" + os.urandom(187)) * 50)
+    lines.append("#EXT-X-ENDLIST")
+    (root / "stream.m3u8").write_text("\n".join(lines) + "\n")
+
+    class Handler(http.server.SimpleHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(Handler, directory=str(root)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/stream.m3u8"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.parametrize("fragments", [1, 2, 4])
+def test_fetch_reports_progress_from_fragment_threads(hls_url, tmp_path, monkeypatch, fragments):
+    # Tải HLS chỉ ghép đoạn bằng Python, không cần ffmpeg thật
+    monkeypatch.setattr(download_core, "find_ffmpeg", lambda: "ffmpeg")
+    out = tmp_path / f"out-{fragments}"
+    out.mkdir()
+    events = []
+    downloader = Downloader(
+        str(out), "video", extra_opts={"format": "best", "concurrent_fragment_downloads": fragments},
+        extraction_cache=ExtractionCache(),
+    )
+
+    success, file_path, step, error = downloader.fetch(hls_url, lambda *msg: events.append(msg))
+
+    assert error is None
+    assert success and step is None
+    assert os.path.getsize(file_path) == SEGMENTS * 188 * 50
+    assert any(msg[0] == "progress" for msg in events)
+    assert events[-1][0] == "finished"
+
+
+def test_worker_ydl_hook_follows_current_job():
+    ydl = download_core._worker_ydl("ffmpeg")
+    calls = []
+    ydl.job_progress_hook = calls.append
+    # Hook được gọi từ luồng khác (như luồng fragment của yt-dlp) vẫn tới đúng job
+    thread = threading.Thread(target=lambda: [hook({"status": "downloading"}) for hook in ydl._progress_hooks])
+    thread.start()
+    thread.join()
+    assert calls == [{"status": "downloading"}]
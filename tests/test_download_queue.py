@@ -0,0 +1,58 @@
+from download_queue import DownloadQueue
+
+
+def test_running_jobs_are_requeued_after_restart(tmp_path):
+    path = str(tmp_path / "queue.db")
+    queue = DownloadQueue(path)
+    first = queue.add("https://youtu.be/a", "audio", str(tmp_path), "a", "A")
+    second = queue.add("https://youtu.be/b", "audio", str(tmp_path), "b", "B")
+    done = queue.add("https://youtu.be/c", "audio", str(tmp_path), "c", "C")
+    queue.start(first)
+    queue.update_progress(first, 500, 1000)
+    queue.add_partial(first, str(tmp_path / "a.m4a.part"))
+    queue.start(done)
+    queue.finish(done, str(tmp_path / "c.mp3"))
+    queue.close()
+
+    # Mở lại như sau khi app bị tắt giữa chừng
+    queue = DownloadQueue(path)
+    pending = {job["job_id"]: job for job in queue.pending()}
+    assert set(pending) == {first, second}
+    assert pending[first]["state"] == "queued"
+    assert pending[first]["attempts"] == 1
+    assert pending[first]["downloaded_bytes"] == 500
+    assert pending[first]["tmp_paths"] == [str(tmp_path / "a.m4a.part")]
+    queue.close()
+
+
+def test_add_requeues_existing_job(tmp_path):
+    queue = DownloadQueue(str(tmp_path / "queue.db"))
+    job_id = queue.add("https://youtu.be/a", "audio", str(tmp_path))
+    queue.fail(job_id, "lỗi mạng")
+    assert queue.add("https://youtu.be/a", "audio", str(tmp_path)) == job_id
+    job = queue.get(job_id)
+    assert job["state"] == "queued" and job["error"] is None
+    queue.close()
+
+
+def test_clean_abandoned_removes_temp_files_of_cancelled_jobs_only(tmp_path):
+    queue = DownloadQueue(str(tmp_path / "queue.db"))
+    cancelled = queue.add("https://youtu.be/a", "audio", str(tmp_path))
+    failed = queue.add("https://youtu.be/b", "audio", str(tmp_path))
+    files = {}
+    for job_id, name in ((cancelled, "a"), (failed, "b")):
+        part = tmp_path / f"{name}.m4a.part"
+        part.write_bytes(b"x")
+        (tmp_path / f"{name}.m4a.ytdl").write_bytes(b"x")
+        queue.add_partial(job_id, str(part))
+        files[name] = part
+    queue.cancel([cancelled])
+    queue.fail(failed, "lỗi")
+
+    queue.clean_abandoned()
+
+    assert not files["a"].exists() and not (tmp_path / "a.m4a.ytdl").exists()
+    assert files["b"].exists()
+    assert queue.get(cancelled)["tmp_paths"] == []
+    assert queue.pending() == []
+    queue.close()
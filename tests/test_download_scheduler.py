@@ -0,0 +1,92 @@
+import threading
+import time
+from concurrent.futures import Future
+
+import pytest
+
+from download_scheduler import AdaptiveScheduler, ByteBucket, expected_size, parse_rate
+
+
+def jobs(count, mode="audio"):
+    return [{"url": f"https://youtu.be/{i}", "mode": mode} for i in range(count)]
+
+
+def test_parse_rate():
+    assert parse_rate("5M") == 5 * 1024 * 1024
+    assert parse_rate("800k") == 800 * 1024
+    assert parse_rate(1234) == 1234
+    assert parse_rate("") is None
+
+
+def test_expected_size_prefers_saved_progress():
+    assert expected_size({"total_bytes": 100, "downloaded_bytes": 40, "mode": "video"}) == 60
+    assert expected_size({"mode": "audio"}) < expected_size({"mode": "video"})
+
+
+def test_byte_bucket_limits_total_rate_across_threads():
+    bucket = ByteBucket(200_000)
+    started = time.monotonic()
+    threads = [threading.Thread(target=lambda: [bucket.consume(20_000) for _ in range(10)]) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # 600 KB ở 200 KB/s với burst 200 KB -> khoảng 2 giây
+    assert time.monotonic() - started == pytest.approx(2.0, abs=0.4)
+
+
+def test_workers_are_reused_and_small_jobs_run_first():
+    threads, order = set(), []
+    lock = threading.Lock()
+
+    def task(job, extra_opts, progress):
+        with lock:
+            threads.add(threading.get_ident())
+            order.append(job["mode"])
+        assert "ratelimit" not in extra_opts
+        return True, "file", None
+
+    results = []
+    scheduler = AdaptiveScheduler(task, min_workers=2, max_workers=2, initial_workers=2)
+    scheduler.run(jobs(3, "video") + jobs(20), on_result=lambda job, *result: results.append(result))
+    assert len(results) == 23
+    assert len(threads) <= 2
+    # Hai luồng có thể ghi thứ tự lệch nhau một bước, nhưng mọi job audio nhỏ đều được lấy trước video
+    assert set(order[:18]) == {"audio"}
+
+
+def test_stops_taking_jobs_while_post_processing_is_backlogged():
+    futures = []
+    lock = threading.Lock()
+
+    def task(job, extra_opts, progress):
+        future = Future()
+        with lock:
+            futures.append(future)
+        return future
+
+    scheduler = AdaptiveScheduler(task, min_workers=1, max_workers=1, initial_workers=1, max_post_pending=2)
+    runner = threading.Thread(target=scheduler.run, args=(jobs(6),))
+    runner.start()
+    time.sleep(0.3)
+    assert len(futures) == 2
+    while runner.is_alive():
+        with lock:
+            pending = [future for future in futures if not future.done()]
+        for future in pending:
+            future.set_result((True, "file", None))
+        time.sleep(0.02)
+    assert len(futures) == 6
+
+
+def test_cancel_stops_remaining_jobs():
+    cancel = threading.Event()
+    calls = []
+
+    def task(job, extra_opts, progress):
+        calls.append(job)
+        cancel.set()
+        return False, None, None
+
+    AdaptiveScheduler(task, min_workers=1, max_workers=1, initial_workers=1, cancel_event=cancel).run(jobs(5))
+    assert len(calls) == 1
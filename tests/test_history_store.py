@@ -0,0 +1,20 @@
+from history_store import HistoryStore
+
+
+def test_verify_detects_changed_file(tmp_path):
+    history = HistoryStore(str(tmp_path / "history.db"))
+    video = tmp_path / "a.mp4"
+    video.write_bytes(b"x" * 3_000_000)
+    history.add("a", "video+audio", "https://youtu.be/a", str(video))
+
+    assert history.downloaded(["a", "b"], "video+audio") == {"a": str(video)}
+    assert history.verify("a", "video+audio") == str(video)
+    assert history.verify("a", "audio") is None
+
+    # Cùng kích thước nhưng nội dung khác: downloaded() không thấy, verify() thì có
+    with open(video, "r+b") as f:
+        f.seek(10)
+        f.write(b"yy")
+    assert history.downloaded(["a"], "video+audio") == {"a": str(video)}
+    assert history.verify("a", "video+audio") is None
+    history.close()
@@ -0,0 +1,32 @@
+from search_index import TitleIndex, normalize_text, tokenize
+
+
+def test_normalize_folds_case_and_vietnamese_marks():
+    assert normalize_text("ĐÀ NẴNG Phở") == "da nang pho"
+    assert tokenize("Hướng dẫn #1: Nấu ăn!") == ["huong", "dan", "1", "nau", "an"]
+
+
+def test_every_query_word_matches_a_title_word_prefix():
+    index = TitleIndex(["Hướng dẫn nấu ăn", "Du lịch Đà Nẵng", "Nấu phở bò"])
+    assert index.search("nau") == {0, 2}
+    assert index.search("NẤU PH") == {2}
+    assert index.search("da nang") == {1}
+    assert index.search("xyz") == set()
+    assert index.search("   ") is None
+
+
+def test_incremental_query_reuses_last_result_correctly():
+    index = TitleIndex(["abc def", "abd", "xyz"])
+    assert index.search("ab") == {0, 1}
+    assert index.search("abc") == {0}
+    # Xóa bớt ký tự thì không được dùng lại tập con cũ
+    assert index.search("ab") == {0, 1}
+
+
+def test_add_appends_positions_and_resets_last_query():
+    index = TitleIndex(["Một"])
+    assert index.search("hai") == set()
+    index.add(["Hai ba", "Bốn"])
+    assert len(index) == 3
+    assert index.search("hai") == {1}
+    assert index.search("bon") == {2}
@@ -0,0 +1,65 @@
+import io
+
+import pytest
+import requests
+from PIL import Image
+
+from thumbnail_cache import THUMB_SIZE, ThumbnailCache
+
+
+class FakeResponse:
+    def __init__(self, status_code, content=b"", headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} Server Error")
+
+
+class FakeSession:
+    def __init__(self):
+        buffer = io.BytesIO()
+        Image.new("RGB", (320, 180), "red").save(buffer, "JPEG")
+        self.image = buffer.getvalue()
+        self.mode = "ok"
+        self.calls = 0
+
+    def get(self, url, timeout=None, headers=None):
+        self.calls += 1
+        if self.mode == "offline":
+            raise requests.ConnectionError("offline")
+        if self.mode == "500":
+            return FakeResponse(500)
+        return FakeResponse(200, self.image, {"ETag": "e1"})
+
+
+@pytest.fixture
+def session():
+    return FakeSession()
+
+
+def test_stale_entry_falls_back_to_disk_when_revalidation_fails(tmp_path, session):
+    # ttl=0: mọi entry đều hết hạn và phải xác thực lại
+    cache = ThumbnailCache(str(tmp_path), ttl=0, memory_items=0, session=session)
+    assert cache.get("https://i.ytimg.com/a.jpg").size == THUMB_SIZE
+    for mode in ("500", "offline"):
+        session.mode = mode
+        assert cache.get("https://i.ytimg.com/a.jpg").size == THUMB_SIZE
+    assert session.calls == 3
+
+
+def test_error_is_raised_without_disk_copy(tmp_path, session):
+    cache = ThumbnailCache(str(tmp_path), session=session)
+    session.mode = "offline"
+    with pytest.raises(requests.RequestException):
+        cache.get("https://i.ytimg.com/missing.jpg")
+
+
+def test_fresh_entry_is_served_without_network(tmp_path, session):
+    cache = ThumbnailCache(str(tmp_path), memory_items=0, session=session)
+    cache.get("https://i.ytimg.com/a.jpg")
+    session.mode = "offline"
+    assert cache.get("https://i.ytimg.com/a.jpg").size == THUMB_SIZE
+    assert session.calls == 1
@@ -0,0 +1,64 @@
+import random
+
+from video_model import VideoRecord, VideoStore
+
+
+def make_record(n, views=0, day=1):
+    return VideoRecord(f"v{n:03d}", f"Video {n}", None, f"2024-01-{day:02d}T00:00:00Z", views)
+
+
+def ids(view):
+    return [record.video_id for record in view]
+
+
+def test_sort_modes():
+    store = VideoStore()
+    store.load([make_record(1, views=50, day=3), make_record(2, views=10, day=1), make_record(3, views=90, day=2)])
+    assert ids(store.sort("latest")) == ["v001", "v003", "v002"]
+    assert ids(store.sort("oldest")) == ["v002", "v003", "v001"]
+    assert ids(store.sort("popular")) == ["v003", "v001", "v002"]
+
+
+def test_add_records_matches_full_sort():
+    rng = random.Random(1)
+    records = [make_record(n, views=rng.randrange(1000), day=rng.randrange(1, 29)) for n in range(200)]
+    incremental = VideoStore()
+    incremental.load(records[:50])
+    # Trang nhỏ đi qua insort, trang lớn (> 64) dựng lại thứ tự
+    for start, end in ((50, 60), (60, 150), (150, 200)):
+        incremental.add_records(records[start:end])
+    full = VideoStore()
+    full.load(records)
+    for mode in ("latest", "oldest"):
+        assert [r.published_ts for r in incremental.sort(mode)] == [r.published_ts for r in full.sort(mode)]
+    assert [r.view_count for r in incremental.sort("popular")] == [r.view_count for r in full.sort("popular")]
+
+
+def test_add_records_skips_duplicates():
+    store = VideoStore()
+    store.load([make_record(1)])
+    store.add_records([make_record(1), make_record(2)])
+    assert len(store) == 2
+    assert store.get("v002").title == "Video 2"
+
+
+def test_update_view_counts_reorders_popular():
+    store = VideoStore()
+    store.load([make_record(n, views=n) for n in range(1, 6)])
+    assert store.update_view_counts({"v001": 100}) is True
+    assert ids(store.sort("popular"))[0] == "v001"
+    assert store.update_view_counts({"v001": 100}) is False
+
+
+def test_filter_keeps_sort_order_and_selection():
+    store = VideoStore()
+    store.load([
+        VideoRecord("a", "Hướng dẫn nấu ăn", None, "2024-01-01T00:00:00Z", 5),
+        VideoRecord("b", "Du lịch Đà Nẵng", None, "2024-01-02T00:00:00Z", 1),
+        VideoRecord("c", "Nấu phở bò", None, "2024-01-03T00:00:00Z", 9),
+    ])
+    assert ids(store.filter("nau")) == ["c", "a"]
+    store.set_selected(True)
+    assert [r.video_id for r in store.selected()] == ["c", "a"]
+    assert store.get("b").selected is False
+    assert len(store.filter("")) == 3
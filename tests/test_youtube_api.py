@@ -0,0 +1,43 @@
+import pytest
+
+from api_quota import QuotaExceeded
+from fake_youtube import FakeYouTube
+from youtube_api import YouTubeAPIWrapper
+
+
+def make_api(tmp_path, fake, keys):
+    return YouTubeAPIWrapper(keys, daily_quota=0, requests_per_second=0, client=fake,
+                             cache_path=str(tmp_path / "cache.db"), legacy_cache_json=None)
+
+
+def test_fetch_fails_over_to_next_key_on_server_quota(tmp_path):
+    fake = FakeYouTube(daily_quota=20)
+    channel_id = fake.add_channel(1500)
+    api = make_api(tmp_path, fake, ["k1", "k2", "k3"])
+    items = api.fetch_all_videos(channel_id)
+    assert len(items) == 1500
+    # Key đầu bị server báo hết quota -> các trang còn lại đi qua key khác
+    assert len(fake.stats()["quota_by_key"]) >= 2
+    counters = api.get_metrics()["counters"]
+    assert sum(item["value"] for item in counters["api_key_failovers_total"]) >= 1
+    api.close()
+
+
+def test_raises_quota_exceeded_when_every_key_is_spent(tmp_path):
+    fake = FakeYouTube(daily_quota=5)
+    channel_id = fake.add_channel(1500)
+    api = make_api(tmp_path, fake, ["k1", "k2"])
+    with pytest.raises(QuotaExceeded):
+        api.fetch_all_videos(channel_id)
+    assert all(item["reason"] == "quotaExceeded" for item in api.quota.status())
+    api.close()
+
+
+def test_get_channel_id_is_counted_once(tmp_path):
+    fake = FakeYouTube()
+    channel_id = fake.add_channel(3)
+    api = make_api(tmp_path, fake, ["k1"])
+    assert api.get_channel_id(f"https://www.youtube.com/channel/{channel_id}") == (channel_id, "channel")
+    calls = api.get_metrics()["counters"]["method_calls_total"]
+    assert [item["labels"]["method"] for item in calls] == ["get_channel_id"]
+    api.close()
@@ -0,0 +1,98 @@
+import hashlib
+import io
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+import requests
+from PIL import Image
+
+from cache_store import CacheStore
+
+logger = logging.getLogger(__name__)
+
+THUMB_SIZE = (160, 90)
+
+
+class ThumbnailCache:
+    """Cache thumbnail đã resize trên đĩa (theo URL) và trong bộ nhớ, xác thực lại bằng ETag/Last-Modified"""
+
+    def __init__(self, cache_dir="thumbnail_cache", max_bytes=100 * 1024 * 1024, ttl=7 * 86400,
+                 memory_items=300, session=None):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        self.index = CacheStore(
+            os.path.join(cache_dir, "index.db"), ttl=ttl, max_bytes=max_bytes, on_evict=self._remove_file
+        )
+        self.session = session or requests.Session()
+        self.memory_items = memory_items
+        self._memory = OrderedDict()  # url -> PIL.Image đã giải mã
+        self._lock = threading.Lock()
+
+    def _path(self, url):
+        return os.path.join(self.cache_dir, hashlib.sha1(url.encode("utf-8")).hexdigest() + ".jpg")
+
+    def _remove_file(self, url):
+        try:
+            os.remove(self._path(url))
+        except FileNotFoundError:
+            pass
+
+    def _remember(self, url, img):
+        with self._lock:
+            self._memory[url] = img
+            self._memory.move_to_end(url)
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+        return img
+
+    def _read_disk(self, path):
+        with Image.open(path) as img:
+            img.load()
+            return img.copy()
+
+    def get(self, url):
+        """Trả về PIL.Image 160x90; chỉ gọi mạng khi chưa có trên đĩa hoặc entry đã hết hạn"""
+        with self._lock:
+            img = self._memory.get(url)
+            if img is not None:
+                self._memory.move_to_end(url)
+                return img
+
+        path = self._path(url)
+        entry = self.index.get_entry(url)
+        on_disk = entry is not None and os.path.exists(path)
+        if on_disk and entry["fresh"]:
+            return self._remember(url, self._read_disk(path))
+
+        headers = {}
+        if on_disk:
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["data"].get("last_modified"):
+                headers["If-Modified-Since"] = entry["data"]["last_modified"]
+        try:
+            resp = self.session.get(url, timeout=5, headers=headers)
+            if resp.status_code == 304 and on_disk:
+                self.index.touch(url)
+                return self._remember(url, self._read_disk(path))
+            resp.raise_for_status()
+        except requests.RequestException as e:
+            if not on_disk:
+                raise
+            # Mất mạng, timeout hay lỗi 5xx: ảnh cũ trên đĩa vẫn dùng được, thử xác thực lại sau một TTL nữa
+            logger.warning(f"Không xác thực lại được thumbnail {url}, dùng bản trên đĩa: {str(e)}")
+            self.index.touch(url)
+            return self._remember(url, self._read_disk(path))
+
+        img = Image.open(io.BytesIO(resp.content)).convert("RGB").resize(THUMB_SIZE, Image.LANCZOS)
+        # Ghi ra file tạm rồi đổi tên để luồng khác không đọc phải file dở
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        img.save(tmp_path, "JPEG", quality=90)
+        os.replace(tmp_path, path)
+        self.index.set(
+            url, {"last_modified": resp.headers.get("Last-Modified")},
+            etag=resp.headers.get("ETag"), size=os.path.getsize(path),
+        )
+        return self._remember(url, img)
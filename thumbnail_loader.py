@@ -0,0 +1,98 @@
+import itertools
+import logging
+import queue
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+
+def make_session(pool_size):
+    """requests.Session dùng chung, giữ kết nối keep-alive tới máy chủ ảnh"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class ThumbnailLoader:
+    """Luồng tải thumbnail sống suốt ứng dụng, ưu tiên ảnh đang hiển thị, hủy ảnh đã cuộn qua"""
+
+    def __init__(self, cache, workers=4):
+        self.cache = cache
+        self._queue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        # url -> {"token": seq của mục hàng đợi còn hiệu lực, "callbacks": {key: callback}}
+        self._pending = {}
+        self._stopped = False
+        self._threads = [
+            threading.Thread(target=self._worker, daemon=True, name=f"thumbnail-{i}") for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def request(self, url, callback, priority=0, key=None):
+        """Yêu cầu tải ảnh; callback(img hoặc None) được gọi trên luồng worker.
+
+        Yêu cầu lặp lại cho cùng url và key (vd. mỗi lần vẽ lại ô) chỉ thay callback, không xếp hàng thêm.
+        """
+        with self._lock:
+            job = self._pending.get(url)
+            if job is None:
+                job = self._pending[url] = {"token": None, "callbacks": {}}
+                self._enqueue(url, job, priority)
+            job["callbacks"][callback if key is None else key] = callback
+
+    def _enqueue(self, url, job, priority):
+        token = next(self._seq)
+        job["token"] = token
+        self._queue.put((priority, token, url))
+
+    def prioritize(self, urls):
+        """urls: ảnh đang hiển thị theo thứ tự trên màn hình; các yêu cầu khác đang chờ bị hủy"""
+        wanted = {url: i for i, url in enumerate(urls)}
+        with self._lock:
+            for url in list(self._pending):
+                if url not in wanted:
+                    del self._pending[url]
+                else:
+                    self._enqueue(url, self._pending[url], wanted[url])
+
+    def cancel_all(self):
+        with self._lock:
+            self._pending.clear()
+
+    def _worker(self):
+        while True:
+            priority, token, url = self._queue.get()
+            if url is None:
+                return
+            with self._lock:
+                job = self._pending.get(url)
+                # Bỏ qua mục đã bị hủy hoặc đã được xếp lại với độ ưu tiên khác
+                if job is None or job["token"] != token:
+                    continue
+                job["token"] = None
+            try:
+                img = self.cache.get(url)
+            except Exception as e:
+                logger.error(f"Lỗi tải thumbnail {url}: {str(e)}")
+                img = None
+            with self._lock:
+                # Nếu bị hủy trong lúc tải thì không gọi callback (ảnh vẫn nằm trong cache)
+                job = self._pending.pop(url, None)
+            callbacks = list(job["callbacks"].values()) if job else []
+            for callback in callbacks:
+                callback(img)
+
+    def shutdown(self):
+        if self._stopped:
+            return
+        self._stopped = True
+        self.cancel_all()
+        for _ in self._threads:
+            self._queue.put((float("-inf"), -1, None))
@@ -0,0 +1,207 @@
+import logging
+import os
+import subprocess
+import tkinter as tk
+from tkinter import messagebox, ttk
+
+logger = logging.getLogger(__name__)
+
+STATUS_STYLES = {
+    "idle": ("Chưa tải", "gray"),
+    "downloading": ("Đang tải", "#1a73e8"),
+    "done": ("Đã tải", "green"),
+    "error": ("Lỗi", "red"),
+}
+
+
+class VideoItem(tk.Frame):
+    """Ô hiển thị một video; được tái sử dụng cho nhiều VideoRecord khi cuộn"""
+
+    def __init__(self, parent, blank_image, on_toggle):
+        super().__init__(parent, bd=1, relief="flat", padx=5, pady=5, bg="white", highlightthickness=1)
+        self.record = None
+        self.blank_image = blank_image
+        self.on_toggle = on_toggle
+        self.selected = tk.BooleanVar()
+
+        tk.Checkbutton(self, variable=self.selected, bg="white", command=self._toggle).grid(row=0, column=0, sticky="nw")
+        self.thumb_label = tk.Label(
+            self, image=blank_image, text="[Đang tải ảnh…]", compound="center", bg="#eee"
+        )
+        self.thumb_label.grid(row=1, column=0, pady=(0, 5))
+        self.lbl_title = tk.Label(
+            self, wraplength=160, justify="left", anchor="nw", height=3,
+            font=("Arial", 10, "bold"), bg="white"
+        )
+        self.lbl_title.grid(row=2, column=0, pady=(0, 5), sticky="ew")
+        self.lbl_status = tk.Label(self, text="Chưa tải", fg="gray", bg="white", font=("Arial", 10))
+        self.lbl_status.grid(row=3, column=0, pady=(0, 5))
+
+        self.bind("<Enter>", lambda e: self.config(bg="#f0f0f0"))
+        self.bind("<Leave>", lambda e: self.config(bg="white"))
+        for child in self.winfo_children():
+            child.bind("<Enter>", lambda e: self.config(bg="#f0f0f0"))
+            child.bind("<Leave>", lambda e: self.config(bg="white"))
+
+        # Sự kiện nhấp chuột để mở thư mục
+        self.bind("<Double-1>", self.open_file_location)
+        for child in self.winfo_children():
+            child.bind("<Double-1>", self.open_file_location)
+
+    def bind_record(self, record, photo=None):
+        self.record = record
+        self.selected.set(record.selected)
+        self.lbl_title.config(text=record.title)
+        self.set_thumbnail(photo)
+        self.refresh_status()
+
+    def set_thumbnail(self, photo, error=False):
+        if photo is not None:
+            self.thumb_label.config(image=photo, text="", bg="#eee")
+        elif error:
+            self.thumb_label.config(image=self.blank_image, text="[Lỗi ảnh]", bg="#ccc")
+        else:
+            self.thumb_label.config(image=self.blank_image, text="[Đang tải ảnh…]", bg="#eee")
+
+    def refresh_status(self):
+        text, color = STATUS_STYLES[self.record.status]
+        if self.record.status == "downloading" and self.record.progress:
+            text = self.record.progress
+        self.lbl_status.config(text=text, fg=color)
+        self.selected.set(self.record.selected)
+
+    def _toggle(self):
+        if self.record is not None:
+            self.record.selected = self.selected.get()
+            self.on_toggle(self.record)
+
+    def open_file_location(self, event):
+        if self.record is not None and self.record.status == "done" and self.record.file_path:
+            try:
+                # Mở thư mục và highlight file trên Windows
+                subprocess.run(['explorer', '/select,', os.path.normpath(self.record.file_path)])
+            except Exception as e:
+                logger.error(f"Lỗi khi mở thư mục: {str(e)}")
+                messagebox.showerror("Lỗi", f"Không thể mở thư mục: {str(e)}")
+
+
+class VirtualVideoGrid(tk.Frame):
+    """Lưới video ảo: chỉ tạo widget cho các hàng đang hiển thị (cộng thêm overscan) và tái sử dụng khi cuộn"""
+
+    def __init__(self, parent, cell_width=180, cell_height=250, overscan=1,
+                 thumb_provider=None, on_toggle=None, on_layout=None, **kwargs):
+        super().__init__(parent, **kwargs)
+        self.cell_width = cell_width
+        self.cell_height = cell_height
+        self.overscan = overscan
+        self.columns = 4
+        self.records = []
+        # thumb_provider(record) trả về PhotoImage đã có hoặc None và tự yêu cầu tải
+        self.thumb_provider = thumb_provider or (lambda record: None)
+        self.on_toggle = on_toggle or (lambda record: None)
+        # on_layout(records) nhận các record đang hiển thị theo thứ tự, sau mỗi lần bố trí
+        self.on_layout = on_layout or (lambda records: None)
+        self.blank_image = tk.PhotoImage(width=160, height=90)
+
+        self.canvas = tk.Canvas(self, highlightthickness=0, bg="#ffffff", yscrollincrement=cell_height // 5)
+        vsb = ttk.Scrollbar(self, orient="vertical", command=self.yview)
+        self.canvas.configure(yscrollcommand=vsb.set)
+        vsb.pack(side="right", fill="y")
+        self.canvas.pack(side="left", fill="both", expand=True)
+        self.canvas.bind("<Configure>", self._on_canvas_configure)
+
+        self._free = []  # (cell, window_id) đang ẩn, sẵn sàng tái sử dụng
+        self._active = {}  # index trong self.records -> (cell, window_id)
+        self._layout_pending = None
+
+    def set_records(self, records, keep_scroll=False):
+        self.records = records
+        for slot in self._active.values():
+            self._release(slot)
+        self._active = {}
+        self._update_scrollregion()
+        if not keep_scroll:
+            self.canvas.yview_moveto(0)
+        self._layout()
+
+    def refresh(self):
+        for index, (cell, _) in self._active.items():
+            cell.bind_record(self.records[index], self.thumb_provider(self.records[index]))
+
+    def cell_for(self, record):
+        for cell, _ in self._active.values():
+            if cell.record is record:
+                return cell
+        return None
+
+    def update_record(self, record):
+        cell = self.cell_for(record)
+        if cell is not None:
+            cell.refresh_status()
+
+    def scroll(self, units):
+        self.canvas.yview_scroll(units, "units")
+        self._schedule_layout()
+
+    def yview(self, *args):
+        self.canvas.yview(*args)
+        self._schedule_layout()
+
+    def _on_canvas_configure(self, event):
+        num_columns = max(2, min(10, event.width // self.cell_width))
+        if num_columns != self.columns:
+            self.columns = num_columns
+            for slot in self._active.values():
+                self._release(slot)
+            self._active = {}
+        self._update_scrollregion()
+        self._schedule_layout()
+
+    def _update_scrollregion(self):
+        rows = -(-len(self.records) // self.columns)
+        self.canvas.configure(scrollregion=(0, 0, self.columns * self.cell_width, rows * self.cell_height))
+
+    def _schedule_layout(self):
+        # Gộp nhiều sự kiện cuộn liên tiếp thành một lần bố trí
+        if self._layout_pending is None:
+            self._layout_pending = self.after_idle(self._layout)
+
+    def _release(self, slot):
+        cell, window_id = slot
+        self.canvas.itemconfigure(window_id, state="hidden")
+        self.canvas.coords(window_id, -2 * self.cell_width, -2 * self.cell_height)
+        cell.record = None
+        self._free.append(slot)
+
+    def _acquire(self):
+        if self._free:
+            return self._free.pop()
+        cell = VideoItem(self.canvas, self.blank_image, self.on_toggle)
+        window_id = self.canvas.create_window(
+            0, 0, window=cell, anchor="nw", width=self.cell_width - 20, height=self.cell_height - 20
+        )
+        return cell, window_id
+
+    def _layout(self):
+        self._layout_pending = None
+        total = len(self.records)
+        top = self.canvas.canvasy(0)
+        height = max(self.canvas.winfo_height(), self.cell_height)
+        first_row = max(0, int(top // self.cell_height) - self.overscan)
+        last_row = int((top + height) // self.cell_height) + self.overscan
+        wanted = range(first_row * self.columns, min(total, (last_row + 1) * self.columns))
+
+        # Ô nào vẫn nằm trong vùng nhìn thấy thì giữ nguyên, phần còn lại đem tái sử dụng
+        for index in [i for i in self._active if i not in wanted]:
+            self._release(self._active.pop(index))
+        for index in wanted:
+            if index in self._active:
+                continue
+            cell, window_id = slot = self._acquire()
+            record = self.records[index]
+            row, col = divmod(index, self.columns)
+            self.canvas.coords(window_id, col * self.cell_width + 10, row * self.cell_height + 10)
+            self.canvas.itemconfigure(window_id, state="normal")
+            cell.bind_record(record, self.thumb_provider(record))
+            self._active[index] = slot
+        self.on_layout([self.records[i] for i in sorted(self._active)])
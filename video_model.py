@@ -0,0 +1,331 @@
+import logging
+import re
+from array import array
+from bisect import insort
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from api_quota import QuotaExceeded
+from search_index import TitleIndex
+
+logger = logging.getLogger(__name__)
+
+
+def parse_timestamp(value):
+    """Đổi publishedAt dạng ISO 8601 (2024-01-31T12:00:00Z) thành epoch giây"""
+    try:
+        return int(datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp())
+    except (AttributeError, ValueError):
+        return 0
+
+
+class VideoRecord:
+    """Dữ liệu của một video, tách khỏi widget Tk"""
+
+    __slots__ = ("video_id", "title", "thumb_url", "published_at", "published_ts", "view_count",
+                 "selected", "status", "file_path", "progress")
+
+    def __init__(self, video_id, title, thumb_url, published_at, view_count):
+        self.video_id = video_id
+        self.title = title.strip()
+        self.thumb_url = thumb_url
+        self.published_at = published_at
+        self.published_ts = parse_timestamp(published_at)
+        self.view_count = view_count
+        self.selected = False
+        self.status = "idle"  # idle | downloading | done | error
+        self.file_path = None  # Lưu đường dẫn file sau khi tải
+        self.progress = None  # Chuỗi tiến độ khi đang tải, ví dụ "45% · 2.3 MB/s · còn 00:12"
+
+    @property
+    def url(self):
+        return f"https://www.youtube.com/watch?v={self.video_id}"
+
+
+def clean_video_title(title):
+    return re.sub(r'#\S+', '', title).strip()
+
+
+def _thumbnail_url(snippet):
+    return snippet["thumbnails"].get("medium", {}).get("url") or snippet["thumbnails"].get("default", {}).get("url")
+
+
+def _playlist_records(items):
+    # items ở dạng gọn của youtube_api.compact_playlist_item
+    return [
+        VideoRecord(it["videoId"], clean_video_title(it["title"]), it["thumbnail"], it["publishedAt"], 0)
+        for it in items
+    ]
+
+
+def stream_records(yt_api, url_or_handle, emit, full_resync=False, stats_workers=2):
+    """Lấy video theo dạng luồng, chạy trên luồng nền; không đụng tới widget.
+
+    emit(kind, payload) được gọi với ("status", str), ("records", [VideoRecord]) cho mỗi trang playlist
+    ngay khi về (lượt xem tạm là 0) và ("stats", {video_id: lượt xem}) khi lượt xem của trang đó có.
+    Hàm trả về khi danh sách và toàn bộ lượt xem đã xong.
+    """
+    emit("status", "Đang xác định URL…")
+    id_value, id_type = yt_api.get_channel_id(url_or_handle)
+    emit("status", "Đang tải thông tin…")
+
+    if id_type == "video":
+        item = yt_api.fetch_single_video(id_value)
+        s = item["snippet"]
+        emit("records", [VideoRecord(
+            item["id"], clean_video_title(s["title"]), _thumbnail_url(s),
+            s["publishedAt"], int(item["statistics"].get("viewCount", 0))
+        )])
+        return
+
+    # Lượt xem của trang trước được lấy song song trong khi trang sau đang tải
+    with ThreadPoolExecutor(max_workers=stats_workers) as executor:
+        futures = []
+
+        def fetch_stats(video_ids):
+            emit("stats", yt_api.get_video_stats(video_ids))
+
+        def on_page(items):
+            records = _playlist_records(items)
+            emit("records", records)
+            futures.append(executor.submit(fetch_stats, [r.video_id for r in records]))
+
+        yt_api.fetch_all_videos(id_value, full_resync=full_resync, on_page=on_page)
+        emit("status", "Đang lấy thông tin lượt xem…")
+        for future in futures:
+            future.result()
+
+
+def fetch_channel_batch(yt_api, inputs, workers=8, full_resync=False, on_progress=None, on_records=None):
+    """Lấy video của nhiều kênh/@handle/link cùng lúc, dùng chung rate limiter và quota của yt_api.
+
+    Handle được phân giải một lượt (gộp trong HTTP batch), kênh trùng chỉ lấy một lần. on_progress(source, state, detail) báo
+    riêng từng nguồn: "resolved", "page" (số video đã nhận), "done" (số video), "error" (thông báo),
+    "skipped" (hết quota). on_records(records) được gọi một lần cho mỗi kênh ngay khi kênh đó xong.
+    Trả về list (source, records hoặc None, error) theo thứ tự inputs.
+    """
+    on_progress = on_progress or (lambda source, state, detail: None)
+    inputs = list(dict.fromkeys(inputs))
+    results = {}
+
+    try:
+        resolved = yt_api.resolve_channels(inputs)
+    except Exception as e:
+        resolved = {source: e for source in inputs}
+
+    # Nhiều link/handle có thể trỏ tới cùng một kênh: chỉ lấy một lần, các nguồn còn lại dùng chung kết quả
+    owners = {}
+    for source in inputs:
+        target = resolved[source]
+        if isinstance(target, Exception):
+            results[source] = (None, str(target))
+            on_progress(source, "error", str(target))
+            continue
+        on_progress(source, "resolved", target[0])
+        owners.setdefault(target, []).append(source)
+
+    # Uploads playlist của mọi kênh được tra chung trước (50 kênh mỗi lệnh), lỗi riêng sẽ hiện lại khi fetch
+    channel_ids = [target_id for target_id, kind in owners if kind == "channel"]
+    if channel_ids:
+        try:
+            yt_api.get_uploads_playlists(channel_ids)
+        except Exception as e:
+            logger.error(f"Lỗi khi tra uploads playlist: {str(e)}")
+
+    def fetch(target):
+        sources = owners[target]
+        records, view_counts = [], {}
+
+        def emit(kind, payload):
+            if kind == "records":
+                records.extend(payload)
+                for source in sources:
+                    on_progress(source, "page", len(records))
+            elif kind == "stats":
+                view_counts.update(payload)
+
+        try:
+            if yt_api.quota.remaining() == 0:
+                raise QuotaExceeded("Hết quota trong ngày")
+            stream_records(yt_api, sources[0], emit, full_resync=full_resync)
+        except Exception as e:
+            state = "skipped" if isinstance(e, QuotaExceeded) else "error"
+            for source in sources:
+                results[source] = (None, str(e))
+                on_progress(source, state, str(e))
+            return
+        for record in records:
+            record.view_count = view_counts.get(record.video_id, record.view_count)
+        if on_records:
+            on_records(records)
+        for source in sources:
+            results[source] = (records, None)
+            on_progress(source, "done", len(records))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(fetch, owners))
+    return [(source, *results[source]) for source in inputs]
+
+
+class VideoView:
+    """Dãy VideoRecord theo thứ tự hiển thị, chỉ giữ mảng chỉ số trỏ vào VideoStore"""
+
+    __slots__ = ("_records", "_order")
+
+    def __init__(self, records, order):
+        self._records = records
+        self._order = order
+
+    def __len__(self):
+        return len(self._order)
+
+    def __getitem__(self, index):
+        return self._records[self._order[index]]
+
+    def __iter__(self):
+        records = self._records
+        return (records[i] for i in self._order)
+
+
+class VideoStore:
+    """Danh mục video của kênh, độc lập với giao diện: sắp xếp, lọc và chọn đều chạy trên đây"""
+
+    SORT_MODES = ("latest", "oldest", "popular")
+
+    def __init__(self):
+        self.records = []
+        self._positions = {}  # video_id -> vị trí trong self.records
+        self.sort_mode = "latest"
+        self.query = ""
+        self.index = TitleIndex([])
+        # Thứ tự sắp xếp tính sẵn khi nạp danh mục, cùng thứ hạng của từng vị trí
+        self._orders = {"latest": array("l"), "popular": array("l")}
+        self._ranks = {"latest": array("l"), "popular": array("l")}
+        self.view = VideoView(self.records, array("l"))
+
+    def __len__(self):
+        return len(self.records)
+
+    def load(self, records):
+        self.records = list(records)
+        self._positions = {record.video_id: i for i, record in enumerate(self.records)}
+        self.index = TitleIndex([record.title for record in self.records])
+        for mode in self._orders:
+            self._rebuild_order(mode)
+        return self.apply()
+
+    def clear(self):
+        return self.load([])
+
+    def get(self, video_id):
+        position = self._positions.get(video_id)
+        return None if position is None else self.records[position]
+
+    def _sort_key(self, mode):
+        records = self.records
+        if mode == "latest":
+            return lambda i: -records[i].published_ts
+        return lambda i: -records[i].view_count
+
+    def _rebuild_order(self, mode):
+        self._orders[mode] = array("l", sorted(range(len(self.records)), key=self._sort_key(mode)))
+        self._rebuild_rank(mode)
+
+    def _rebuild_rank(self, mode):
+        rank = array("l", bytes(len(self.records) * array("l").itemsize))
+        for r, position in enumerate(self._orders[mode]):
+            rank[position] = r
+        self._ranks[mode] = rank
+
+    def sort(self, mode):
+        if mode not in self.SORT_MODES:
+            raise ValueError(f"Chế độ sắp xếp không hợp lệ: {mode}")
+        self.sort_mode = mode
+        return self.apply()
+
+    def filter(self, query):
+        self.query = query.strip()
+        return self.apply()
+
+    def apply(self):
+        # Không sắp xếp lại: chỉ lấy thứ tự tính sẵn và lọc theo kết quả tìm kiếm
+        mode = "popular" if self.sort_mode == "popular" else "latest"
+        order = self._orders[mode]
+        matches = self.index.search(self.query)
+        if matches is not None:
+            order = array("l", sorted(matches, key=self._ranks[mode].__getitem__))
+        if self.sort_mode == "oldest":
+            order = order[::-1]
+        self.view = VideoView(self.records, order)
+        return self.view
+
+    def add_records(self, records):
+        """Thêm video mới (ví dụ từ đồng bộ tăng dần), chèn vào các thứ tự sẵn có thay vì sắp xếp lại"""
+        added = []
+        for record in records:
+            if record.video_id in self._positions:
+                continue
+            self._positions[record.video_id] = len(self.records)
+            added.append(len(self.records))
+            self.records.append(record)
+        if not added:
+            return self.view
+        self.index.add([self.records[i].title for i in added])
+        for mode in self._orders:
+            if len(added) > 64:
+                # Thêm cả trang lớn (ví dụ danh sách từ cache) thì sắp xếp lại một lần nhanh hơn chèn từng video
+                self._rebuild_order(mode)
+                continue
+            order = self._orders[mode]
+            key = self._sort_key(mode)
+            for position in added:
+                insort(order, position, key=key)
+            self._rebuild_rank(mode)
+        return self.apply()
+
+    def update_view_counts(self, view_counts):
+        changed = []
+        for video_id, count in view_counts.items():
+            position = self._positions.get(video_id)
+            if position is not None and self.records[position].view_count != count:
+                self.records[position].view_count = count
+                changed.append(position)
+        if not changed:
+            return False
+        # Ít thay đổi thì gỡ ra và chèn lại đúng chỗ, nhiều thì sắp xếp lại một lần
+        if len(changed) > 64:
+            self._rebuild_order("popular")
+        else:
+            order = self._orders["popular"]
+            key = self._sort_key("popular")
+            for position in changed:
+                order.remove(position)
+                insort(order, position, key=key)
+            self._rebuild_rank("popular")
+        return True
+
+    def set_selected(self, selected):
+        # Chỉ áp dụng cho các video đang hiển thị (sau khi lọc)
+        for record in self.view:
+            record.selected = selected
+
+    def selected(self):
+        return [record for record in self.view if record.selected]
+
+    def mark_downloaded(self, paths):
+        """paths: video_id -> file_path đã tải (theo lịch sử); video "done" khác được đặt lại "idle"."""
+        for record in self.records:
+            file_path = paths.get(record.video_id)
+            if file_path:
+                record.status = "done"
+                record.file_path = file_path
+            elif record.status == "done":
+                record.status = "idle"
+                record.file_path = None
+
+    def reset_unfinished(self):
+        for record in self.records:
+            record.progress = None
+            if record.status != "done":
+                record.status = "idle"
+                record.file_path = None
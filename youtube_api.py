@@ -1,9 +1,17 @@
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
-import time
-import logging
+import functools
 import json
 import os
+import time
+import logging
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+from api_metrics import Metrics
+from api_quota import KEY_ROTATION_REASONS, KeyPool, QuotaExceeded
+from cache_store import CacheStore
+from settings import get_resource_path
 
 logging.basicConfig(
     level=logging.INFO,
@@ -16,144 +24,620 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+
+def _endpoint(request):
+    # "youtube.playlistItems.list" -> "playlistItems.list"
+    method_id = getattr(request, "methodId", None) or "unknown"
+    return method_id.split(".", 1)[1] if method_id.startswith("youtube.") else method_id
+
+
+# Partial response: chỉ lấy các trường được dùng, giảm dung lượng phản hồi và thời gian parse JSON
+PLAYLIST_ITEM_FIELDS = (
+    "etag,nextPageToken,"
+    "items/snippet(publishedAt,title,resourceId/videoId,thumbnails/medium/url,thumbnails/default/url)"
+)
+VIDEO_FIELDS = (
+    "etag,items(id,statistics/viewCount,"
+    "snippet(publishedAt,title,thumbnails/medium/url,thumbnails/default/url))"
+)
+STATS_FIELDS = "items(id,statistics/viewCount)"
+CHANNEL_ID_FIELDS = "etag,items/id"
+UPLOADS_FIELDS = "items(id,contentDetails/relatedPlaylists/uploads)"
+
+
+def compact_playlist_item(item):
+    """Dạng lưu gọn của một playlistItem: chỉ videoId, title, publishedAt và một URL thumbnail.
+
+    Item đã ở dạng gọn được trả về nguyên vẹn, nên dùng được cho cả cache cũ lẫn mới.
+    """
+    if "videoId" in item:
+        return item
+    snippet = item["snippet"]
+    thumbnails = snippet.get("thumbnails") or {}
+    return {
+        "videoId": snippet["resourceId"]["videoId"],
+        "title": snippet.get("title", ""),
+        "publishedAt": snippet["publishedAt"],
+        "thumbnail": (thumbnails.get("medium") or thumbnails.get("default") or {}).get("url"),
+    }
+
+
+def _with_key(uri, api_key):
+    """Thay tham số key trong URI của lệnh (client được dựng với key đầu tiên của pool)"""
+    parts = urlsplit(uri)
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k != "key"]
+    return urlunsplit(parts._replace(query=urlencode(query + [("key", api_key)])))
+
+
+def _error_reason(error):
+    # googleapiclient đưa error.errors[] của phản hồi vào HttpError.error_details
+    details = getattr(error, "error_details", None)
+    if isinstance(details, list):
+        for detail in details:
+            if isinstance(detail, dict) and detail.get("reason"):
+                return detail["reason"]
+    return None
+
+
+def _cache_kind(cache_key):
+    # "stat_abc" -> "stat", "videos_UC..." -> "videos"
+    return cache_key.split("_", 1)[0]
+
+
+def build_client(api_key):
+    """Dựng client YouTube Data API từ discovery document tĩnh, không tải discovery qua mạng.
+
+    Ưu tiên file youtube.v3.json kèm theo bản build, sau đó tới bản có sẵn trong googleapiclient.
+    """
+    from googleapiclient.discovery import build_from_document
+    from googleapiclient.discovery_cache import get_static_doc
+
+    bundled = get_resource_path("youtube.v3.json")
+    if os.path.exists(bundled):
+        with open(bundled, "r", encoding="utf-8") as f:
+            document = f.read()
+    else:
+        document = get_static_doc("youtube", "v3")
+    if document is None:
+        raise Exception("Không tìm thấy discovery document của YouTube Data API v3")
+    return build_from_document(document, developerKey=api_key)
+
+
+def instrumented(method):
+    """Đo thời gian và đếm số lần gọi/lỗi của một phương thức public của YouTubeAPIWrapper"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        started = time.perf_counter()
+        outcome = "ok"
+        try:
+            return method(self, *args, **kwargs)
+        except Exception:
+            outcome = "error"
+            raise
+        finally:
+            labels = {"method": method.__name__}
+            self.metrics.observe("method_duration_seconds", time.perf_counter() - started, labels)
+            self.metrics.inc("method_calls_total", dict(labels, outcome=outcome))
+    return wrapper
+
+
 class YouTubeAPIWrapper:
-    def __init__(self, api_key):
-        self.youtube = build('youtube', 'v3', developerKey=api_key)
-        self.cache_file = "youtube_cache.json"
+    def __init__(self, api_key, daily_quota=10000, requests_per_second=10.0, client=None,
+                 cache_path="youtube_cache.db", legacy_cache_json="youtube_cache.json"):
+        # api_key: một key hoặc danh sách key; daily_quota và requests_per_second tính cho từng key
+        api_keys = [api_key] if isinstance(api_key, str) else list(api_key)
+        self.api_key = api_keys[0]
+        # Client được dựng lần đầu khi cần (hoặc sớm hơn bằng prefetch() trên luồng nền);
+        # có thể truyền sẵn client, ví dụ fake_youtube.FakeYouTube để benchmark không tốn quota
+        self._youtube = client
+        self._build_lock = threading.Lock()
         self.cache_ttl = 86400  # 24 hours
+        self.cache = CacheStore(cache_path, ttl=self.cache_ttl, legacy_json=legacy_cache_json)
+        self.playlist_ttl = 30 * 86400  # uploads playlist của kênh gần như không đổi
+        self.sync_cursor_ttl = 365 * 86400
+        self.full_resync_interval = 7 * 86400
+        self.stats_ttl = 3600  # lượt xem thay đổi nhanh nên chỉ cache 1 giờ
+        self.stats_workers = 4
+        self.batch_size = 50  # Số lệnh API gộp trong một HTTP batch request (giới hạn của Google là 1000)
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self.revalidation_stats = {"not_modified": 0, "quota_saved": 0, "bytes_saved": 0}
+        # Dùng chung cho mọi luồng: pool key với rate limiter và ngân sách quota ngày riêng cho từng key,
+        # trạng thái quota/nghỉ của key được lưu trong bảng state của cache (không bị LRU/TTL xóa)
+        self.quota = KeyPool(api_keys, daily_quota, store=self.cache, rate=requests_per_second)
+        self.metrics = Metrics()
+        self.metrics.describe("api_requests_total", "Số request tới YouTube Data API theo endpoint và mã trạng thái")
+        self.metrics.describe("api_request_duration_seconds", "Độ trễ từng request API")
+        self.metrics.describe("api_quota_units_total", "Quota đã dùng theo endpoint")
+        self.metrics.describe("api_retries_total", "Số lần thử lại theo endpoint")
+        self.metrics.describe("api_batches_total", "Số HTTP batch request đã gửi")
+        self.metrics.describe("api_batch_calls_total", "Số lệnh API được gửi gộp trong HTTP batch")
+        self.metrics.describe("api_key_units_total", "Quota đã dùng theo API key (định danh rút gọn)")
+        self.metrics.describe("api_key_failovers_total", "Số lần chuyển sang key khác do hết quota/giới hạn tốc độ")
+        self.metrics.describe("cache_lookups_total", "Tra cache theo loại key và kết quả (hit/miss/stale/revalidated)")
+        self.metrics.describe("method_duration_seconds", "Thời gian chạy của các phương thức public")
+
+    def _count_cache(self, cache_key, result, value=1):
+        self.metrics.inc("cache_lookups_total", {"kind": _cache_kind(cache_key), "result": result}, value)
+
+    @property
+    def youtube(self):
+        if self._youtube is None:
+            with self._build_lock:
+                if self._youtube is None:
+                    started = time.perf_counter()
+                    self._youtube = build_client(self.api_key)
+                    logger.info(f"Đã dựng client YouTube API sau {time.perf_counter() - started:.2f}s")
+        return self._youtube
+
+    def prefetch(self):
+        """Dựng client và nạp httplib2 trên luồng nền để lệnh API đầu tiên không phải chờ"""
+        def warm_up():
+            try:
+                self.youtube
+                self._http()
+            except Exception as e:
+                logger.error(f"Lỗi khi khởi tạo client YouTube API: {str(e)}")
+
+        threading.Thread(target=warm_up, daemon=True, name="youtube-api-prefetch").start()
 
     def _load_cache(self, cache_key):
         try:
-            if os.path.exists(self.cache_file):
-                with open(self.cache_file, "r", encoding="utf-8") as f:
-                    cache_data = json.load(f)
-                if (cache_key in cache_data and
-                        time.time() - cache_data[cache_key].get("timestamp", 0) < self.cache_ttl):
-                    return cache_data[cache_key]["data"], cache_data[cache_key].get("etag")
-            return None, None
+            data, etag = self.cache.get(cache_key)
+        except Exception as e:
+            logger.error(f"Lỗi khi đọc cache: {str(e)}")
+            data, etag = None, None
+        self._count_cache(cache_key, "miss" if data is None else "hit")
+        return data, etag
+
+    def _load_cache_entry(self, cache_key):
+        # Trả về cả entry đã hết hạn để có thể xác thực lại bằng ETag
+        try:
+            entry = self.cache.get_entry(cache_key)
         except Exception as e:
             logger.error(f"Lỗi khi đọc cache: {str(e)}")
-            return None, None
+            entry = None
+        self._count_cache(cache_key, "miss" if entry is None else "hit" if entry["fresh"] else "stale")
+        return entry
 
-    def _save_cache(self, cache_key, data, etag=None):
+    def _save_cache(self, cache_key, data, etag=None, ttl=None):
         try:
-            cache_data = {}
-            if os.path.exists(self.cache_file):
-                with open(self.cache_file, "r", encoding="utf-8") as f:
-                    cache_data = json.load(f)
-            cache_data[cache_key] = {
-                "timestamp": time.time(),
-                "data": data,
-                "etag": etag
-            }
-            with open(self.cache_file, "w", encoding="utf-8") as f:
-                json.dump(cache_data, f, ensure_ascii=False, indent=2)
+            self.cache.set(cache_key, data, etag, ttl=ttl)
             logger.info(f"Đã lưu cache cho {cache_key}")
         except Exception as e:
             logger.error(f"Lỗi khi lưu cache: {str(e)}")
 
+    def _execute(self, request, etag=None):
+        """Gọi API; nếu có etag thì gửi If-None-Match và trả về None khi server trả 304.
+
+        Key bị server báo hết quota/giới hạn tốc độ được cho nghỉ và lệnh được gửi lại bằng key khác.
+        Ném QuotaExceeded (không gửi request) khi không còn key nào đủ quota trong ngày.
+        """
+        while True:
+            endpoint, api_key = self._charge(request, etag)
+            started = time.perf_counter()
+            status = "200"
+            try:
+                # httplib2.Http không an toàn đa luồng nên mỗi luồng dùng kết nối riêng
+                return request.execute(http=self._http())
+            except HttpError as e:
+                status = str(e.resp.status)
+                if etag and e.resp.status == 304:
+                    return None
+                if not self._fail_over(api_key, e):
+                    raise
+            except Exception:
+                status = "network_error"
+                raise
+            finally:
+                self.quota.release(api_key, ok=status in ("200", "304"))
+                self.metrics.observe("api_request_duration_seconds", time.perf_counter() - started,
+                                     {"endpoint": endpoint})
+                self.metrics.inc("api_requests_total", {"endpoint": endpoint, "status": status})
+
+    def _charge(self, request, etag=None):
+        """Chọn API key (trừ quota, chờ rate limiter của key) và gắn key, If-None-Match vào lệnh sắp gửi.
+
+        Trả về (endpoint, ApiKey); phải gọi self.quota.release(key) khi lệnh xong.
+        """
+        endpoint = _endpoint(request)
+        try:
+            api_key, cost = self.quota.acquire(getattr(request, "methodId", None))
+        except QuotaExceeded:
+            self.metrics.inc("api_requests_total", {"endpoint": endpoint, "status": "quota_exceeded"})
+            raise
+        self.metrics.inc("api_quota_units_total", {"endpoint": endpoint}, cost)
+        self.metrics.inc("api_key_units_total", {"key": api_key.id}, cost)
+        if getattr(request, "uri", None):
+            request.uri = _with_key(request.uri, api_key.key)
+        if etag:
+            request.headers["If-None-Match"] = etag
+        return endpoint, api_key
+
+    def _fail_over(self, api_key, error):
+        """True nếu lỗi là hết quota/giới hạn tốc độ của key: key được cho nghỉ, lệnh nên gửi lại bằng key khác"""
+        reason = _error_reason(error)
+        if reason not in KEY_ROTATION_REASONS:
+            return False
+        self.quota.penalize(api_key, reason)
+        self.metrics.inc("api_key_failovers_total", {"key": api_key.id, "reason": reason})
+        return True
+
+    def _execute_batch(self, requests):
+        """Gửi nhiều lệnh độc lập [(request, etag)] trong một HTTP request multipart (batch).
+
+        Trả về [(response, error)] theo đúng thứ tự: lỗi của từng lệnh (HttpError, QuotaExceeded, lỗi mạng)
+        nằm trong error của lệnh đó, không ảnh hưởng các lệnh khác. Lệnh có etag mà server trả 304 cho
+        (None, None), giống _execute. Lệnh bị từ chối vì key hết quota được gửi lại bằng key khác.
+        """
+        results = [(None, None)] * len(requests)
+        if len(requests) == 1:
+            # Một lệnh thì gửi thẳng, không cần bọc multipart
+            request, etag = requests[0]
+            try:
+                results[0] = (self._execute(request, etag), None)
+            except Exception as e:
+                results[0] = (None, e)
+            return results
+
+        pending = list(range(len(requests)))
+        while pending:
+            pending = self._send_batch(requests, pending, results)
+        return results
+
+    def _send_batch(self, requests, indexes, results):
+        # Gửi requests[i] (i trong indexes) trong một batch; trả về các chỉ số cần gửi lại bằng key khác
+        sent = {}  # index -> (endpoint, ApiKey)
+        answered = set()
+        retry = []
+
+        def on_response(request_id, response, exception):
+            index = int(request_id)
+            endpoint, api_key = sent[index]
+            status = "200"
+            if exception is not None:
+                status = str(exception.resp.status) if isinstance(exception, HttpError) else "network_error"
+                if isinstance(exception, HttpError) and exception.resp.status == 304 and requests[index][1]:
+                    exception = None
+            answered.add(index)
+            self.quota.release(api_key, ok=status in ("200", "304"))
+            self.metrics.inc("api_requests_total", {"endpoint": endpoint, "status": status})
+            if isinstance(exception, HttpError) and self._fail_over(api_key, exception):
+                retry.append(index)
+                return
+            results[index] = (response, exception)
+
+        batch = self.youtube.new_batch_http_request(callback=on_response)
+        for index in indexes:
+            request, etag = requests[index]
+            try:
+                sent[index] = self._charge(request, etag)
+            except QuotaExceeded as e:
+                results[index] = (None, e)
+                continue
+            batch.add(request, request_id=str(index))
+        if not sent:
+            return []
+
+        started = time.perf_counter()
+        try:
+            batch.execute(http=self._http())
+        except Exception as e:
+            # Cả HTTP request thất bại (mất mạng, timeout): mọi lệnh chưa có kết quả đều nhận lỗi này
+            for index, (endpoint, api_key) in sent.items():
+                if index not in answered:
+                    results[index] = (None, e)
+                    self.quota.release(api_key, ok=False)
+                    self.metrics.inc("api_requests_total", {"endpoint": endpoint, "status": "network_error"})
+        finally:
+            self.metrics.observe("api_request_duration_seconds", time.perf_counter() - started, {"endpoint": "batch"})
+            self.metrics.inc("api_batches_total")
+            self.metrics.inc("api_batch_calls_total", value=len(sent))
+        return sorted(retry)
+
+    def _http(self):
+        http = getattr(self._local, "http", None)
+        if http is None:
+            import httplib2
+
+            http = self._local.http = httplib2.Http(timeout=30)
+        return http
+
+    def _renew_cache(self, cache_key, entry, quota_saved):
+        # 304 Not Modified: gia hạn TTL, không tải lại dữ liệu
+        self._count_cache(cache_key, "revalidated")
+        try:
+            self.cache.touch(cache_key)
+        except Exception as e:
+            logger.error(f"Lỗi khi gia hạn cache: {str(e)}")
+        with self._stats_lock:
+            self.revalidation_stats["not_modified"] += 1
+            self.revalidation_stats["quota_saved"] += quota_saved
+            self.revalidation_stats["bytes_saved"] += entry["size"]
+        logger.info(
+            f"Cache {cache_key} chưa thay đổi (304), tiết kiệm {quota_saved} quota, ~{entry['size']} bytes"
+        )
+        return entry["data"]
+
+    def get_revalidation_stats(self):
+        with self._stats_lock:
+            return dict(self.revalidation_stats)
+
+    def get_metrics(self):
+        """Snapshot JSON của số lệnh, độ trễ, quota và cache; xuất text Prometheus bằng metrics.to_prometheus()"""
+        snapshot = self.metrics.snapshot()
+        snapshot["quota"] = {"used": self.quota.used, "remaining": self.quota.remaining(),
+                             "daily_limit": self.quota.daily_limit, "keys": self.quota.status()}
+        snapshot["revalidation"] = self.get_revalidation_stats()
+        return snapshot
+
+    def export_metrics(self, path):
+        """Ghi số liệu ra file: .prom/.txt dạng text Prometheus, còn lại là JSON của get_metrics()"""
+        if path.endswith((".prom", ".txt")):
+            self.metrics.write(path)
+            return
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.get_metrics(), f, ensure_ascii=False, indent=2)
+
+    def metrics_summary(self):
+        """Một dòng tóm tắt để ghi log sau mỗi lần fetch"""
+        counters = self.metrics.snapshot()["counters"]
+        requests = sum(item["value"] for item in counters.get("api_requests_total", []))
+        lookups = {}
+        for item in counters.get("cache_lookups_total", []):
+            lookups[item["labels"]["result"]] = lookups.get(item["labels"]["result"], 0) + item["value"]
+        total = sum(lookups.values())
+        hit_ratio = (lookups.get("hit", 0) + lookups.get("revalidated", 0)) / total * 100 if total else 0
+        return (f"{requests} request API, quota đã dùng hôm nay {self.quota.used}, "
+                f"cache hit {hit_ratio:.0f}% ({total} lần tra)")
+
+    def close(self):
+        """Ghi quota còn trong bộ nhớ xuống đĩa rồi đóng cache"""
+        self.quota.flush()
+        self.cache.close()
+
+    def _get_uploads_playlist(self, channel_id):
+        playlist_id = self.get_uploads_playlists([channel_id])[channel_id]
+        if isinstance(playlist_id, Exception):
+            raise playlist_id
+        return playlist_id
+
+    def get_uploads_playlists(self, channel_ids):
+        """channel_id -> uploads playlist (hoặc Exception riêng của kênh đó).
+
+        Kênh chưa có trong cache được tra chung: mỗi lệnh channels.list nhận 50 ID, các lệnh được gộp
+        trong HTTP batch.
+        """
+        playlists = {}
+        missing = []
+        for channel_id in dict.fromkeys(channel_ids):
+            cached_data, _ = self._load_cache(f"playlist_{channel_id}")
+            if cached_data:
+                playlists[channel_id] = cached_data
+            else:
+                missing.append(channel_id)
+        chunks = [missing[i:i + 50] for i in range(0, len(missing), 50)]
+        for i in range(0, len(chunks), self.batch_size):
+            group = chunks[i:i + self.batch_size]
+            responses = self._execute_batch([
+                (self.youtube.channels().list(
+                    part="contentDetails", id=",".join(ids), maxResults=50, fields=UPLOADS_FIELDS
+                ), None)
+                for ids in group
+            ])
+            for ids, (resp, error) in zip(group, responses):
+                if error is not None:
+                    for channel_id in ids:
+                        playlists[channel_id] = error
+                    continue
+                for item in resp.get("items", []):
+                    playlist_id = item["contentDetails"]["relatedPlaylists"]["uploads"]
+                    playlists[item["id"]] = playlist_id
+                    self._save_cache(f"playlist_{item['id']}", playlist_id, ttl=self.playlist_ttl)
+                for channel_id in ids:
+                    playlists.setdefault(channel_id, Exception("Không tìm thấy kênh"))
+        return playlists
+
+    @staticmethod
+    def _parse_channel_input(url_or_handle):
+        """((id, loại), None) nếu đọc được ngay từ URL, hoặc (None, (tham số channels.list, giá trị)) nếu phải tra API"""
+        if "watch?v=" in url_or_handle:
+            # Xử lý link video
+            return (url_or_handle.split("watch?v=")[-1].split("&")[0], "video"), None
+        if "shorts/" in url_or_handle:
+            # Xử lý link video Shorts
+            return (url_or_handle.split("shorts/")[-1].split("?")[0].split("/")[0], "video"), None
+        if "channel/" in url_or_handle:
+            return (url_or_handle.split("channel/")[1].split("/")[0], "channel"), None
+        if "@" in url_or_handle:
+            return None, ("forHandle", url_or_handle.split("@")[-1].strip("/"))
+        if "/c/" in url_or_handle:
+            return None, ("forUsername", url_or_handle.split("/c/")[-1].strip("/"))
+        raise Exception("URL hoặc handle không hợp lệ")
+
+    @instrumented
     def get_channel_id(self, url_or_handle):
+        # Gọi bản không đo để mỗi lần gọi chỉ được đếm một lần trong method_calls_total
+        resolved = self._resolve_channels([url_or_handle])[url_or_handle]
+        if isinstance(resolved, Exception):
+            raise resolved
+        return resolved
+
+    @instrumented
+    def resolve_channels(self, inputs):
+        """Phân giải nhiều URL/@handle một lượt: dict input -> (id, "channel"/"video") hoặc Exception.
+
+        Handle/custom URL chưa có trong cache được tra bằng channels.list, gộp trong HTTP batch.
+        """
+        return self._resolve_channels(inputs)
+
+    def _resolve_channels(self, inputs):
+        results = {}
+        lookups = {}  # (tham số, giá trị) -> các input cùng trỏ tới
+        for source in dict.fromkeys(inputs):
+            try:
+                resolved, lookup = self._parse_channel_input(source)
+            except Exception as e:
+                results[source] = e
+                continue
+            if resolved:
+                results[source] = resolved
+                continue
+            cached_data, _ = self._load_cache(f"channel_{lookup[1]}")
+            if cached_data:
+                results[source] = (cached_data, "channel")
+            else:
+                lookups.setdefault(lookup, []).append(source)
+
+        pending = list(lookups)
+        for i in range(0, len(pending), self.batch_size):
+            group = pending[i:i + self.batch_size]
+            responses = self._execute_batch([
+                (self.youtube.channels().list(part="id", fields=CHANNEL_ID_FIELDS, **{param: value}), None)
+                for param, value in group
+            ])
+            for (param, value), (resp, error) in zip(group, responses):
+                if isinstance(error, HttpError):
+                    error = Exception(f"Lỗi API: {str(error)}")
+                elif error is None and not resp.get("items"):
+                    kind = "handle" if param == "forHandle" else "custom URL"
+                    error = Exception(f"Không tìm thấy channel với {kind} {value}")
+                if error is None:
+                    channel_id = resp["items"][0]["id"]
+                    self._save_cache(f"channel_{value}", channel_id, resp.get("etag"))
+                for source in lookups[(param, value)]:
+                    results[source] = error or (channel_id, "channel")
+        return results
+
+    @staticmethod
+    def _playlist_video_id(item):
+        return item["videoId"]
+
+    def _upgrade_playlist_cache(self, cache_key, entry):
+        """Chuyển danh sách playlistItems đầy đủ (cache cũ) sang dạng gọn, ghi lại mà không đổi TTL/ETag"""
+        items = [compact_playlist_item(item) for item in entry["data"]]
         try:
-            if "watch?v=" in url_or_handle:
-                # Xử lý link video
-                video_id = url_or_handle.split("watch?v=")[-1].split("&")[0]
-                return video_id, "video"
-            if "shorts/" in url_or_handle:
-                # Xử lý link video Shorts
-                video_id = url_or_handle.split("shorts/")[-1].split("?")[0].split("/")[0]
-                return video_id, "video"
-            if "channel/" in url_or_handle:
-                return url_or_handle.split("channel/")[1].split("/")[0], "channel"
-            if "@" in url_or_handle:
-                handle = url_or_handle.split("@")[-1].strip("/")
-                cache_key = f"channel_{handle}"
-                cached_data, _ = self._load_cache(cache_key)
-                if cached_data:
-                    return cached_data, "channel"
-                resp = self.youtube.channels().list(
-                    part="id",
-                    forHandle=handle
-                ).execute()
-                if not resp.get("items"):
-                    raise Exception(f"Không tìm thấy channel với handle {handle}")
-                channel_id = resp["items"][0]["id"]
-                self._save_cache(cache_key, channel_id, resp.get("etag"))
-                return channel_id, "channel"
-            if "/c/" in url_or_handle:
-                custom_url = url_or_handle.split("/c/")[-1].strip("/")
-                cache_key = f"channel_{custom_url}"
-                cached_data, _ = self._load_cache(cache_key)
-                if cached_data:
-                    return cached_data, "channel"
-                resp = self.youtube.channels().list(
-                    part="id",
-                    forUsername=custom_url
-                ).execute()
-                if not resp.get("items"):
-                    raise Exception(f"Không tìm thấy channel với custom URL {custom_url}")
-                channel_id = resp["items"][0]["id"]
-                self._save_cache(cache_key, channel_id, resp.get("etag"))
-                return channel_id, "channel"
-            raise Exception("URL hoặc handle không hợp lệ")
-        except HttpError as e:
-            raise Exception(f"Lỗi API: {str(e)}")
+            entry["size"] = self.cache.update_data(cache_key, items) or entry["size"]
+            logger.info(f"Đã chuyển cache {cache_key} sang dạng gọn: {len(items)} video, {entry['size']} bytes")
+        except Exception as e:
+            logger.error(f"Lỗi khi ghi lại cache {cache_key}: {str(e)}")
+        entry["data"] = items
+        return entry
 
-    def fetch_all_videos(self, channel_id):
+    @instrumented
+    def fetch_all_videos(self, channel_id, full_resync=False, on_page=None):
+        """Danh sách video của kênh (mới nhất trước), mỗi video ở dạng gọn của compact_playlist_item.
+
+        on_page(items) được gọi trên luồng hiện tại với từng phần danh sách ngay khi có (mỗi trang API mới,
+        sau đó là phần đã có trong cache), để giao diện hiển thị trước khi đồng bộ xong.
+        """
+        on_page = on_page or (lambda items: None)
         cache_key = f"videos_{channel_id}"
-        cached_data, cached_etag = self._load_cache(cache_key)
-        if cached_data:
+        sync_key = f"sync_{channel_id}"
+        entry = self._load_cache_entry(cache_key)
+        if entry and entry["data"] and "videoId" not in entry["data"][0]:
+            entry = self._upgrade_playlist_cache(cache_key, entry)
+        if entry and entry["fresh"] and not full_resync:
             logger.info(f"Đã sử dụng cache cho danh sách video của channel {channel_id}")
-            return cached_data
+            on_page(entry["data"])
+            return entry["data"]
+
+        cursor, _ = self._load_cache(sync_key)
+        # Định kỳ đồng bộ lại toàn bộ để cập nhật video bị xóa/đổi tiêu đề
+        if (entry is None or cursor is None or
+                time.time() - cursor.get("last_full_sync", 0) > self.full_resync_interval):
+            full_resync = True
+        known = {} if full_resync else {self._playlist_video_id(it): it for it in entry["data"]}
 
-        items = []
+        new_items = []
         token = None
+        first_etag = None
+        reached_known = False
         retries = 3
         try:
-            channel_resp = self.youtube.channels().list(
-                part="contentDetails",
-                id=channel_id
-            ).execute()
-            if not channel_resp.get("items"):
-                raise Exception("Không tìm thấy kênh")
-            playlist_id = channel_resp["items"][0]["contentDetails"]["relatedPlaylists"]["uploads"]
+            playlist_id = self._get_uploads_playlist(channel_id)
 
             while True:
                 for attempt in range(retries):
                     try:
-                        resp = self.youtube.playlistItems().list(
+                        # Chỉ trang đầu được xác thực lại: video mới luôn xuất hiện ở đầu playlist
+                        etag = entry["etag"] if entry and token is None and not full_resync else None
+                        resp = self._execute(self.youtube.playlistItems().list(
                             part="snippet",
                             playlistId=playlist_id,
                             maxResults=50,
-                            pageToken=token
-                        ).execute()
-                        items += resp.get("items", [])
-                        token = resp.get("nextPageToken")
+                            pageToken=token,
+                            fields=PLAYLIST_ITEM_FIELDS
+                        ), etag)
                         break
                     except HttpError as e:
                         if attempt < retries - 1:
+                            self.metrics.inc("api_retries_total", {"endpoint": "playlistItems.list"})
                             time.sleep(2 ** attempt)
                             continue
                         raise Exception(f"Lỗi API sau {retries} lần thử: {str(e)}")
-                if not token:
+                if resp is None:
+                    pages = max(1, -(-len(entry["data"]) // 50))
+                    # Bỏ qua các trang còn lại và lệnh channels.list
+                    items = self._renew_cache(cache_key, entry, pages)
+                    on_page(items)
+                    return items
+                if token is None:
+                    first_etag = resp.get("etag")
+                page_items = []
+                for item in resp.get("items", []):
+                    item = compact_playlist_item(item)
+                    if self._playlist_video_id(item) in known:
+                        reached_known = True
+                        break
+                    page_items.append(item)
+                new_items += page_items
+                if page_items:
+                    on_page(page_items)
+                token = resp.get("nextPageToken")
+                if reached_known or not token:
                     break
-            self._save_cache(cache_key, items, resp.get("etag"))
         except HttpError as e:
             raise Exception(f"Lỗi API: {str(e)}")
+
+        # Gộp video mới vào đầu danh sách, giữ nguyên thứ tự các video đã có
+        new_ids = {self._playlist_video_id(it) for it in new_items}
+        old_items = [it for vid, it in known.items() if vid not in new_ids]
+        if old_items:
+            on_page(old_items)
+        items = new_items + old_items
+        self._save_cache(cache_key, items, first_etag)
+        now = time.time()
+        self._save_cache(sync_key, {
+            "playlist_id": playlist_id,
+            "head_video_id": self._playlist_video_id(items[0]) if items else None,
+            "count": len(items),
+            "last_sync": now,
+            "last_full_sync": now if full_resync else cursor["last_full_sync"],
+        }, ttl=self.sync_cursor_ttl)
+        logger.info(
+            f"Đồng bộ channel {channel_id}: {len(new_items)} video mới, tổng {len(items)}"
+            f"{' (đồng bộ toàn bộ)' if full_resync else ''}"
+        )
         return items
 
+    @instrumented
     def fetch_single_video(self, video_id):
         cache_key = f"video_{video_id}"
-        cached_data, cached_etag = self._load_cache(cache_key)
-        if cached_data:
+        entry = self._load_cache_entry(cache_key)
+        if entry and entry["fresh"]:
             logger.info(f"Đã sử dụng cache cho video {video_id}")
-            return cached_data
+            return entry["data"]
 
         try:
-            resp = self.youtube.videos().list(
+            resp = self._execute(self.youtube.videos().list(
                 part="snippet,statistics",
                 id=video_id,
-                maxResults=1
-            ).execute()
+                maxResults=1,
+                fields=VIDEO_FIELDS
+            ), entry["etag"] if entry else None)
+            if resp is None:
+                return self._renew_cache(cache_key, entry, 0)
             if not resp.get("items"):
                 raise Exception(f"Không tìm thấy video với ID {video_id}")
             item = resp["items"][0]
@@ -162,26 +646,76 @@ class YouTubeAPIWrapper:
         except HttpError as e:
             raise Exception(f"Lỗi API: {str(e)}")
 
-    def get_video_stats(self, video_ids):
-        cache_key = f"stats_{','.join(video_ids[:50])}"
-        cached_data, _ = self._load_cache(cache_key)
-        if cached_data:
-            return cached_data
+    def _fetch_stats_group(self, id_batches):
+        """viewCount cho nhiều batch 50 ID gửi chung một HTTP batch; batch lỗi tạm thời được thử lại riêng"""
+        view_counts = {}
+        retries = 3
+        for attempt in range(retries):
+            responses = self._execute_batch([
+                (self.youtube.videos().list(
+                    part="statistics", id=",".join(ids), maxResults=50, fields=STATS_FIELDS
+                ), None)
+                for ids in id_batches
+            ])
+            failed = []
+            for ids, (response, error) in zip(id_batches, responses):
+                if error is None:
+                    view_counts.update({
+                        item["id"]: int(item["statistics"].get("viewCount", 0))
+                        for item in response.get("items", [])
+                    })
+                elif isinstance(error, QuotaExceeded):
+                    logger.error(f"Bỏ qua viewCount cho batch {ids}: {str(error)}")
+                else:
+                    status = getattr(getattr(error, "resp", None), "status", None)
+                    if attempt < retries - 1 and (status is None or status == 429 or status >= 500):
+                        failed.append(ids)
+                    else:
+                        logger.error(f"Lỗi khi lấy viewCount cho batch {ids}: {str(error)}")
+            if not failed:
+                break
+            self.metrics.inc("api_retries_total", {"endpoint": "videos.list"}, len(failed))
+            time.sleep(2 ** attempt + random.random())
+            id_batches = failed
+        return view_counts
 
+    @instrumented
+    def get_video_stats(self, video_ids):
+        video_ids = list(dict.fromkeys(video_ids))
         view_counts = {}
-        for i in range(0, len(video_ids), 50):
-            batch_ids = video_ids[i:i + 50]
-            try:
-                response = self.youtube.videos().list(
-                    part="statistics",
-                    id=",".join(batch_ids),
-                    maxResults=50
-                ).execute()
-                for item in response.get("items", []):
-                    vid = item["id"]
-                    view_count = int(item["statistics"].get("viewCount", 0))
-                    view_counts[vid] = view_count
-                self._save_cache(cache_key, view_counts, response.get("etag"))
-            except Exception as e:
-                logger.error(f"Lỗi khi lấy viewCount cho batch {batch_ids}: {str(e)}")
-        return view_counts
\ No newline at end of file
+        try:
+            entries = self.cache.get_entries([f"stat_{vid}" for vid in video_ids])
+        except Exception as e:
+            logger.error(f"Lỗi khi đọc cache: {str(e)}")
+            entries = {}
+
+        # Chỉ gọi API cho các video chưa có hoặc đã hết hạn thống kê
+        missing = []
+        for vid in video_ids:
+            entry = entries.get(f"stat_{vid}")
+            if entry:
+                view_counts[vid] = entry["data"]
+            if not entry or not entry["fresh"]:
+                missing.append(vid)
+        stale = sum(1 for vid in missing if f"stat_{vid}" in entries)
+        self._count_cache("stat", "hit", len(video_ids) - len(missing))
+        self._count_cache("stat", "stale", stale)
+        self._count_cache("stat", "miss", len(missing) - stale)
+        if not missing:
+            return view_counts
+
+        batches = [missing[i:i + 50] for i in range(0, len(missing), 50)]
+        # Mỗi HTTP request mang tối đa batch_size lệnh videos.list, thay vì một round trip cho mỗi 50 video
+        groups = [batches[i:i + self.batch_size] for i in range(0, len(batches), self.batch_size)]
+        with ThreadPoolExecutor(max_workers=min(self.stats_workers, len(groups))) as executor:
+            for batch_counts in executor.map(self._fetch_stats_group, groups):
+                view_counts.update(batch_counts)
+                try:
+                    self.cache.set_many(
+                        [(f"stat_{vid}", count, None) for vid, count in batch_counts.items()],
+                        ttl=self.stats_ttl,
+                    )
+                except Exception as e:
+                    logger.error(f"Lỗi khi lưu cache: {str(e)}")
+        logger.info(f"Đã lấy viewCount cho {len(missing)}/{len(video_ids)} video trong {len(batches)} batch, {len(groups)} HTTP request")
+        return view_counts